@@ -0,0 +1,219 @@
+"""
+Benchmarks the hot paths of an update run on synthetic snapshots.
+
+For each scale (multiples of today's cable and landing point counts), two
+snapshots are generated with synthetic.py, the second with --churn of the
+cables added, removed or changed. Then each of
+
+    parse_data        parse the current snapshot
+    write_db          bulk load the parsed snapshot into a new database
+    write_db_incr     apply the current snapshot to the previous run's database
+    generate_diff     diff the previous and current snapshot files
+
+is timed --repeat times and run once more under tracemalloc for its peak
+Python memory. Results are written as JSON to --output:
+
+    {"started_at": ..., "environment": {...}, "settings": {...},
+     "results": [{"benchmark": "parse_data", "scale": 10, "cables": 7000,
+                  "landing_points": 12341, "seconds": {"min": ..., "median": ...,
+                  "max": ...}, "peak_memory": bytes}, ...]}
+
+Run from the project root:
+
+    python3 update/benchmark.py --scales 1 10 100
+
+With --compare OLD_RESULTS.json, benchmarks whose median time or peak
+memory grew by more than --threshold are reported and the script exits
+with status 1, so a regression can fail a CI job.
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from clean_data import parse_data
+from diff_generator import generate_diff
+from synthetic import churn_snapshot, make_snapshot
+from write_db import build_db, write_db
+
+
+def measure(func, repeat, setup=None):
+    """Time func() repeat times, then run it once more to record its peak memory.
+
+    setup(), if given, runs untimed before each call. Anything func() prints
+    is discarded.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "seconds": {"min": min(times), "median": statistics.median(times), "max": max(times)},
+        "peak_memory": peak,
+    }
+
+
+def fresh_dir(path):
+    """Empty the directory at path, creating it if needed."""
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+
+
+def benchmark_scale(scale, churn, repeat, work_dir, seed=0):
+    """Run every benchmark at one scale. Returns a list of result dicts."""
+    previous = make_snapshot(scale, seed)
+    current = churn_snapshot(previous, churn, seed + 1)
+
+    prev_path = work_dir / "previous.json"
+    curr_path = work_dir / "current.json"
+    for snapshot, path in ((previous, prev_path), (current, curr_path)):
+        with open(path, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, sort_keys=True, indent=4)
+
+    cleaned_data = parse_data(current)
+    prev_cleaned_data = parse_data(previous)
+    db_dir = work_dir / "write_db"
+    incr_db_dir = work_dir / "write_db_incr"
+
+    def incremental_setup():
+        fresh_dir(incr_db_dir)
+        build_db(incr_db_dir / "scn.db", prev_cleaned_data)
+
+    # name: (setup, benchmark). Each repeat writes into an empty directory,
+    # so the rebuild never carries over an earlier repeat's history or
+    # generations, and the incremental write starts from the previous run's
+    # database every time.
+    benchmarks = {
+        "parse_data": (None, lambda: parse_data(current)),
+        "write_db": (lambda: fresh_dir(db_dir),
+                     lambda: write_db(cleaned_data=cleaned_data, db_dir=db_dir)),
+        "write_db_incr": (incremental_setup,
+                          lambda: write_db(cleaned_data=cleaned_data, db_dir=incr_db_dir,
+                                           mode="incremental")),
+        "generate_diff": (None, lambda: generate_diff("diff.json", prev_path, curr_path,
+                                                      output_dir=work_dir)),
+    }
+
+    results = []
+    for name, (setup, func) in benchmarks.items():
+        result = measure(func, repeat, setup)
+        results.append({
+            "benchmark": name,
+            "scale": scale,
+            "cables": len(current),
+            "landing_points": len(cleaned_data["point"]),
+            **result,
+        })
+        print(f"{name:>14} x{scale:<5} {result['seconds']['median']:9.3f} s "
+              f"{result['peak_memory'] / 2**20:9.1f} MiB")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Benchmarks in results that got slower or bigger than in baseline by more than threshold.
+    """
+    old = {(r["benchmark"], r["scale"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        o = old.get((r["benchmark"], r["scale"]))
+        if o is None:
+            continue
+        for metric, new_value, old_value in (
+            ("median seconds", r["seconds"]["median"], o["seconds"]["median"]),
+            ("peak memory", r["peak_memory"], o["peak_memory"]),
+        ):
+            if old_value and new_value > old_value * (1 + threshold):
+                regressions.append(f"{r['benchmark']} x{r['scale']}: {metric} "
+                                   f"{old_value:.6g} -> {new_value:.6g} "
+                                   f"(+{(new_value / old_value - 1) * 100:.0f}%)")
+    return regressions
+
+
+def run_benchmarks(scales=(1, 10, 100), churn=0.05, repeat=3, output=None, seed=0):
+    """Run the benchmarks at each scale and write the results to output (JSON).
+
+    Returns the results dict.
+    """
+    started_at = datetime.datetime.utcnow().isoformat(timespec="milliseconds")
+    if output is None:
+        output = f"./update/data/benchmarks/benchmark_{started_at}.json"
+    output = Path(output).absolute()
+
+    report = {
+        "started_at": started_at,
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "settings": {"scales": list(scales), "churn": churn, "repeat": repeat, "seed": seed},
+        "results": [],
+    }
+
+    work_dir = Path(tempfile.mkdtemp(prefix="scn-benchmark-"))
+    try:
+        for scale in scales:
+            report["results"] += benchmark_scale(scale, churn, repeat, work_dir, seed)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "wt", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"Wrote benchmark results to {output}.")
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark parse_data, write_db and generate_diff.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100],
+                        help="multiples of today's cable and landing point counts")
+    parser.add_argument("--churn", type=float, default=0.05,
+                        help="fraction of cables added, removed or changed between the two snapshots")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default ./update/data/benchmarks/benchmark_<date>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed relative increase before --compare reports a regression")
+    args = parser.parse_args()
+
+    scales = [int(s) if s == int(s) else s for s in args.scales]
+    report = run_benchmarks(scales, args.churn, args.repeat, args.output, args.seed)
+
+    if args.compare:
+        with open(args.compare, "rt", encoding="utf-8") as f:
+            regressions = compare(report["results"], json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
@@ -1,12 +1,31 @@
 """Cleans the submarine cable data json data collected by scrape-cables.py.
 """
+from array import array
+from hashlib import sha1
+from itertools import chain, repeat
+from json import dumps
+from sys import intern
+from entities import split_names
+
+
+def cable_hash(cable_name, cable_data):
+    """Hash a cable's canonical JSON form (sorted keys, no whitespace).
+
+    Two snapshots of a cable hash the same exactly when nothing about it changed.
+    """
+    canonical = dumps([cable_name, cable_data], ensure_ascii=False,
+                      sort_keys=True, separators=(",", ":"))
+    return sha1(canonical.encode("utf-8")).hexdigest()
+
+
 class LandingPoint:
-    def __init__(self, p_id, code, name, country_id, cables=[]):
+    __slots__ = ("id", "code", "name", "country_id")
+
+    def __init__(self, p_id, code, name, country_id):
         self.id = p_id
         self.code = code
         self.name = name
         self.country_id = country_id
-        self.cables = cables
 
     def __eq__(self, other):
         return self.code == other.code
@@ -18,25 +37,160 @@ class LandingPoint:
         return hash(self.code)
 
 
-def parse_data(data):
-    cleaned_data = {"cable": [], "country": {}, "point": {},
-                    "supplier": {}, "owner": {}}
-    cable_id = 0
-    country_id = 0
-    p_id = 0
-    owner_id = 0
-    supplier_id = 0
+class Links:
+    """Links between cables and one kind of entity, as two flat integer arrays.
+
+    The ids of the entities linked to the i-th cable parsed are
+    entity_ids[offsets[i]:offsets[i + 1]], and its cable id is
+    cable_id_list[i] (i itself if there's no cable_id_list). Iterating gives
+    (entity id, cable id) pairs, the column order of the intersection
+    tables, so a Links can go straight to executemany().
+    """
+    __slots__ = ("entity_ids", "offsets", "cable_id_list")
+
+    def __init__(self, cable_id_list=None):
+        self.entity_ids = array("q")
+        self.offsets = array("q", [0])
+        self.cable_id_list = cable_id_list
+
+    def end_cable(self):
+        """Close the current cable's run of entity ids and start the next cable's."""
+        self.offsets.append(len(self.entity_ids))
+
+    def cable(self, i):
+        """Ids of the entities linked to the i-th cable parsed."""
+        return self.entity_ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def cable_ids(self):
+        """The cable id of each entry of entity_ids."""
+        offsets = self.offsets
+        ids = self.cable_id_list or range(len(offsets) - 1)
+        return chain.from_iterable(repeat(ids[i], offsets[i + 1] - offsets[i])
+                                   for i in range(len(offsets) - 1))
+
+    def __iter__(self):
+        return zip(self.entity_ids, self.cable_ids())
+
+    def __len__(self):
+        return len(self.entity_ids)
+
+
+LINK_TABLES = ("cable_point", "cable_owner", "cable_supplier")
+
+
+class CableParser:
+    """Parses cables one at a time, assigning ids as new entities appear.
+
+    If collect is True, parse_cable() adds each cable to cleaned_data, the
+    same structure parse_data() returns. If collect is False (streaming),
+    parse_cable() instead returns only the rows that cable adds, so a caller
+    can insert them right away instead of waiting for the whole snapshot:
+
+        {"cable": [...], "country": [...], "point": [...],
+         "owner": [...], "supplier": [...],
+         "owner_alias": [...], "supplier_alias": [...],
+         "cable_point": [...], "cable_owner": [...], "cable_supplier": [...],
+         "cable_hash": [...]}
+
+    and memory only grows with the number of distinct countries, points,
+    owners and suppliers.
+
+    If resolver (an entities.EntityResolver) is given, owners and suppliers
+    are linked by their canonical names, and each other name they appear
+    under is recorded in owner_alias/supplier_alias ({alias: canonical name}).
+
+    Without ids, cables, countries, points, owners and suppliers are
+    numbered 0, 1, 2, ... as they appear. ids (write_db.previous_ids())
+    carries the ids of the database being replaced,
+
+        {table: ({cable or point code, or name: id}, next id)}
+
+    and entities it has keep their id, while new ones are numbered from
+    its next id on, as upsert_db() does, so ids are stable across rebuilds.
+    """
+    def __init__(self, collect=True, resolver=None, ids=None):
+        self.collect = collect
+        self.resolver = resolver
+        self.known_ids = {table: dict(known) for table, (known, next_id) in (ids or {}).items()}
+        self.next_ids = {table: next_id for table, (known, next_id) in (ids or {}).items()}
+        # Cable id of each cable parsed, for the Links (streaming doesn't use them).
+        cable_id_list = array("q") if ids and collect else None
+        self.cleaned_data = {"cable": [], "country": {}, "point": {},
+                             "supplier": {}, "owner": {}, "cable_hash": [],
+                             "owner_alias": {}, "supplier_alias": {},
+                             "cable_point": Links(cable_id_list), "cable_owner": Links(cable_id_list),
+                             "cable_supplier": Links(cable_id_list)}
+        self.cable_id_list = cable_id_list
+        self.cable_count = 0
+
+    def new_id(self, table, key, count):
+        """The id for an entity of table not seen in this parse yet.
+
+        count is how many of them were seen so far (the id without ids).
+        """
+        known = self.known_ids.get(table)
+        if known is None:
+            return count
+        # Popped, so two cables with the same code can't share an id.
+        entity_id = known.pop(key, None)
+        if entity_id is None:
+            entity_id = self.next_ids[table]
+            self.next_ids[table] += 1
+        return entity_id
+
+    def link_entities(self, table, names, links, rows):
+        """Append the ids of the owners or suppliers in names to links, and return their names.
+
+        Unseen names get the next id (and a row in rows[table] when streaming).
+        Names are canonicalized first if there's a resolver, and a cable is
+        linked to each entity once, however many of its names it lists.
+        """
+        ids = self.cleaned_data[table]
+        aliases = self.cleaned_data[table + "_alias"]
+        resolver = self.resolver
+        linked = {}
+        for name in names:
+            if resolver is not None:
+                canonical = resolver.canonical(table, name)
+                if canonical != name:
+                    if name not in aliases:
+                        aliases[intern(name)] = canonical
+                        if rows:
+                            rows[table + "_alias"].append([name, canonical])
+                    name = canonical
+            entity_id = ids.get(name)
+            if entity_id is None:
+                entity_id = ids[intern(name)] = self.new_id(table, name, len(ids))
+                if rows:
+                    rows[table].append([entity_id, name])
+            if entity_id not in linked:
+                linked[entity_id] = name
+                links.append(entity_id)
+        return list(linked.values())
+
+    def parse_cable(self, cable_name, cable_data):
+        cleaned_data = self.cleaned_data
+        collect = self.collect
+        if collect:
+            rows = None
+            tables = cleaned_data
+            point_links, owner_links, supplier_links = (
+                cleaned_data[table].entity_ids for table in LINK_TABLES)
+        else:
+            rows = tables = {"cable": [], "country": [], "point": [], "owner": [],
+                             "supplier": [], "owner_alias": [], "supplier_alias": [],
+                             "cable_hash": []}
+            point_links, owner_links, supplier_links = [], [], []
 
-    # parse each cable's data and prep for insertion into different tables 
-    for cable_name in data:
-        cable_data = data[cable_name]  # dictionary of the cable's data
-        
         # Extract basic cable data
         cable_code = cable_data["id"]  # string (unique)
+        cable_id = self.new_id("cable", cable_code, self.cable_count)
+        if self.cable_id_list is not None:
+            self.cable_id_list.append(cable_id)
         in_progress = cable_data["is_planned"]  # boolean (true or false)
         length = cable_data["length"]  # none or string to integer
         if length:
-            length = int("".join(length.split()[0].split(",")))
+            length = int(length.split(None, 1)[0].replace(",", ""))
         notes = cable_data["notes"]  # none or string
         rfs_year = cable_data["rfs_year"]  # none or int
         rfs_string = cable_data["rfs"]  # none or string
@@ -44,60 +198,85 @@ def parse_data(data):
 
         # Parse more complicated data.
         lps = cable_data["landing_points"]  # list of dicts
-        owners = cable_data["owners"].split(", ")  # list of strings
+        owners = split_names(cable_data["owners"])  # list of strings
         suppliers =  cable_data["suppliers"]  # none or string to list of strings
         if suppliers:
-            suppliers = cable_data["suppliers"].split(", ")
+            suppliers = split_names(cable_data["suppliers"])
 
         # vals for cables table
-        cable_values = [cable_id, cable_name, cable_code, url,
-                        length, rfs_year, rfs_string, in_progress, notes]
-        cleaned_data["cable"].append(cable_values)
+        tables["cable"].append([cable_id, cable_name, cable_code, url,
+                                length, rfs_year, rfs_string, in_progress, notes])
 
         # vals for landing points and countries tables
+        countries = cleaned_data["country"]
+        points = cleaned_data["point"]
         for point in lps:
             point_code = point["id"]
+            landing_point = points.get(point_code)
             # record new LandingPoint for landingPoints table if it's unseen.
-            if point_code not in cleaned_data["point"]:
-                point_name = point["name"]
+            if landing_point is None:
+                point_name = intern(point["name"])
                 country_name = point["country"]
 
                 # record the country and assign it a new country_id if unseen.
-                if country_name not in cleaned_data["country"]:
-                    cleaned_data["country"][country_name] = country_id
-                    p_country_id = country_id
-                    country_id += 1
-                else:
-                    p_country_id = cleaned_data["country"][country_name]
-
-                new_point = LandingPoint(p_id=p_id, code=point_code,
-                                      name=point_name, country_id=p_country_id,
-                                      cables=[cable_id])
-                cleaned_data["point"][point_code] = new_point
-                p_id += 1
-            # if we've already seen it, add this cable to the point's seen
-            else:
-                cleaned_data["point"][point_code].cables.append(cable_id)
-
-
-        # vals for owners table
+                p_country_id = countries.get(country_name)
+                if p_country_id is None:
+                    p_country_id = countries[intern(country_name)] = self.new_id(
+                        "country", country_name, len(countries))
+                    if rows:
+                        rows["country"].append([p_country_id, country_name])
+
+                landing_point = LandingPoint(p_id=self.new_id("point", point_code, len(points)),
+                                             code=point_code,
+                                             name=point_name, country_id=p_country_id)
+                points[point_code] = landing_point
+                if rows:
+                    rows["point"].append([landing_point.id, point_code, point_name, p_country_id])
+            point_links.append(landing_point.id)
+
+        # vals for owners and suppliers tables
+        owner_names = supplier_names = []
         if owners:
-            for o in owners:
-                if o not in cleaned_data["owner"]:
-                    cleaned_data["owner"][o] = [owner_id, [cable_id]]
-                    owner_id += 1
-                else:
-                    cleaned_data["owner"][o][1].append(cable_id)
-
-        # vals for suppliers table
+            owner_names = self.link_entities("owner", owners, owner_links, rows)
         if suppliers:
-            for s in suppliers:
-                if s not in cleaned_data["supplier"]:
-                    cleaned_data["supplier"][s] = [supplier_id, [cable_id]]
-                    supplier_id += 1
-                else:
-                    cleaned_data["supplier"][s][1].append(cable_id)
+            supplier_names = self.link_entities("supplier", suppliers, supplier_links, rows)
+
+        digest = cable_hash(cable_name, cable_data)
+        if self.resolver is not None:
+            # The canonical names can change while the cable doesn't (a new
+            # pinned alias), and the cable's rows have to be rewritten then too.
+            digest = cable_hash(digest, [owner_names, supplier_names])
+        tables["cable_hash"].append([cable_id, digest])
+
+        # vals for the intersection tables
+        if collect:
+            for table in LINK_TABLES:
+                cleaned_data[table].end_cable()
+        else:
+            for table, entity_ids in zip(LINK_TABLES, (point_links, owner_links, supplier_links)):
+                rows[table] = [[entity_id, cable_id] for entity_id in entity_ids]
+
+        self.cable_count += 1
+        return rows
 
-        cable_id += 1
 
-    return cleaned_data
+def parse_data(data, resolver=None, ids=None):
+    """Parse a snapshot ({cable name: cable data}) into cleaned_data:
+
+        {"cable": [[id, name, code, url, length, rfs_year, rfs_text, planned, notes], ...],
+         "cable_hash": [[cable id, hash], ...],
+         "country": {name: id}, "owner": {name: id}, "supplier": {name: id},
+         "owner_alias": {alias: name}, "supplier_alias": {alias: name},
+         "point": {code: LandingPoint},
+         "cable_point": Links, "cable_owner": Links, "cable_supplier": Links}
+
+    With a resolver (see entities.py), owners and suppliers are canonicalized.
+    With ids (see CableParser), the ids of the database being replaced are kept.
+    """
+    parser = CableParser(resolver=resolver, ids=ids)
+
+    # parse each cable's data and prep for insertion into different tables 
+    for cable_name, cable_data in data.items():
+        parser.parse_cable(cable_name, cable_data)
+
+    return parser.cleaned_data
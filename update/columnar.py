@@ -0,0 +1,235 @@
+"""Columnar export of the cable database, for loading into analytics tools without SQLite.
+
+    from columnar import load_export
+
+    tables = load_export("./update/data/columnar/latest")
+    cable = tables["cable"]
+    cable["length"].values[cable["length"].valid].mean()
+    cable["name"].decode()                      # object array of str
+
+export_db() writes each table in EXPORT_TABLES, the intersection tables
+included, as one .npy file per column array,
+
+    <table>.<column>.npy                 ints (int64) and floats (float64)
+    <table>.<column>.valid.npy           bool mask of non-NULL rows, for nullable columns
+    <table>.<column>.codes.npy           text: int32 index into the sorted dictionary, -1 for NULL
+    <table>.<column>.offsets.npy         text: dictionary entry i is
+    <table>.<column>.data.npy                data[offsets[i]:offsets[i + 1]], UTF-8
+
+plus a manifest.json describing them, in rowid order. .npy files load with
+np.load(mmap_mode="r"), so reading an export maps it rather than copying
+it, and the intersection tables' id columns join against the entity
+tables' with np.searchsorted or plain indexing. The dictionaries are sorted, so
+comparing codes compares the strings.
+
+The export is read from the database after it is written, rather than from
+parse_data()'s output, so the ids match the database's in incremental mode
+too. update_db() writes one per run into columnar_dir/<run id>/ and points
+columnar_dir/latest at it.
+"""
+import os
+import shutil
+import sqlite3
+from bisect import bisect_left
+from json import dump, load
+from pathlib import Path
+import numpy as np
+
+
+COLUMNAR_DIR = "./update/data/columnar/"
+EXPORT_FORMAT_VERSION = 1
+# Tables exported, with their columns.
+EXPORT_TABLES = {
+    "cable": ("id", "name", "code", "url", "length", "rfs_year", "rfs_text", "planned", "notes"),
+    "country": ("id", "name"),
+    "point": ("id", "name", "code", "country_id"),
+    "owner": ("id", "name"),
+    "supplier": ("id", "name"),
+    "owner_alias": ("alias", "name"),
+    "supplier_alias": ("alias", "name"),
+    "cable_point": ("point_cable_id", "cable_id", "point_id"),
+    "cable_owner": ("owner_cable_id", "cable_id", "owner_id"),
+    "cable_supplier": ("supplier_cable_id", "cable_id", "supplier_id"),
+}
+# Column kind per SQLite declared type.
+KINDS = {"INTEGER": "int", "BOOLEAN": "bool", "REAL": "float", "TEXT": "text"}
+
+
+class DictionaryColumn:
+    """A dictionary-encoded text column: codes into a sorted dictionary of strings."""
+    def __init__(self, codes, offsets, data):
+        self.codes = codes
+        self.offsets = offsets
+        self.data = data
+        self._values = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def values(self):
+        """The dictionary, as a list of str (decoded on first use)."""
+        if self._values is None:
+            data = self.data.tobytes()
+            self._values = [data[start:end].decode("utf-8")
+                            for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+        return self._values
+
+    def code(self, value):
+        """The code of value, or -1 if it isn't in the column."""
+        values = self.values
+        i = bisect_left(values, value)
+        return i if i < len(values) and values[i] == value else -1
+
+    def decode(self):
+        """The column as an object array of str, with None for NULL."""
+        values = np.array(self.values + [None], dtype=object)
+        return values[self.codes]
+
+
+class Column:
+    """A numeric column; valid is a bool mask of its non-NULL rows, or None if it is NOT NULL."""
+    def __init__(self, values, valid=None):
+        self.values = values
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.values)
+
+
+def _column_kinds(db, table, columns):
+    """{column: (kind, nullable)} from the table's declared types."""
+    info = {name: (decl_type.upper(), notnull or pk)
+            for cid, name, decl_type, notnull, default, pk in db.execute(f"PRAGMA table_info({table})")}
+    return {column: (KINDS[info[column][0]], not info[column][1]) for column in columns}
+
+
+def _text_arrays(values):
+    """codes, offsets and data arrays for a text column."""
+    dictionary = sorted({v for v in values if v is not None})
+    index = {v: i for i, v in enumerate(dictionary)}
+    index[None] = -1
+    codes = np.fromiter((index[v] for v in values), dtype=np.int32, count=len(values))
+    encoded = [v.encode("utf-8") for v in dictionary]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return {"codes": codes, "offsets": offsets, "data": data}
+
+
+def _numeric_arrays(values, kind, nullable):
+    """The values array (and valid mask, if nullable) for an int, bool or float column."""
+    dtype = {"int": np.int64, "bool": np.bool_, "float": np.float64}[kind]
+    if not nullable:
+        return {"": np.array(values, dtype=dtype)}
+    valid = np.fromiter((v is not None for v in values), dtype=np.bool_, count=len(values))
+    filled = np.array([0 if v is None else v for v in values], dtype=dtype)
+    return {"": filled, "valid": valid}
+
+
+def export_db(db_path, export_dir, **metadata):
+    """Write the tables of the database at db_path to export_dir (see above) and return its path.
+
+    export_dir must not exist yet; the export is written next to it and
+    renamed into place, so it never appears half-written. metadata (e.g.
+    run_id, creation_time) is stored in the manifest.
+    """
+    export_dir = Path(export_dir).absolute()
+    tmp_dir = export_dir.with_name(export_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    manifest = {"format": EXPORT_FORMAT_VERSION, **metadata, "tables": {}}
+    # Plain connection: BOOLEAN columns come back as 0/1, not converted.
+    db = sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode=ro", uri=True)
+    try:
+        for table, columns in EXPORT_TABLES.items():
+            kinds = _column_kinds(db, table, columns)
+            rows = db.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid").fetchall()
+            column_values = list(zip(*rows)) if rows else [()] * len(columns)
+
+            table_manifest = {"rows": len(rows), "columns": {}}
+            for column, values in zip(columns, column_values):
+                kind, nullable = kinds[column]
+                if kind == "text":
+                    arrays = _text_arrays(values)
+                else:
+                    arrays = _numeric_arrays(values, kind, nullable)
+                files = {}
+                for part, array in arrays.items():
+                    name = ".".join(filter(None, (table, column, part))) + ".npy"
+                    np.save(tmp_dir / name, array, allow_pickle=False)
+                    files[part or "values"] = name
+                table_manifest["columns"][column] = {"kind": kind, "nullable": nullable, "files": files}
+            manifest["tables"][table] = table_manifest
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        db.close()
+
+    with open(tmp_dir / "manifest.json", "wt", encoding="utf-8") as f:
+        dump(manifest, f, ensure_ascii=False, indent=4)
+    os.rename(tmp_dir, export_dir)
+    return export_dir
+
+
+def _load_array(path, mmap):
+    try:
+        return np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    except ValueError:
+        # Older numpy can't map an empty array.
+        return np.load(path, allow_pickle=False)
+
+
+def load_manifest(export_dir):
+    with open(Path(export_dir).absolute() / "manifest.json", "rt", encoding="utf-8") as f:
+        return load(f)
+
+
+def load_export(export_dir, tables=None, mmap=True):
+    """{table: {column: Column or DictionaryColumn}} for an export.
+
+    tables limits it to some of the tables. With mmap, the arrays are
+    read-only memory maps of the files, so loading costs next to nothing
+    until the data is used.
+    """
+    export_dir = Path(export_dir).absolute()
+    manifest = load_manifest(export_dir)
+    loaded = {}
+    for table, table_manifest in manifest["tables"].items():
+        if tables is not None and table not in tables:
+            continue
+        loaded[table] = {}
+        for column, spec in table_manifest["columns"].items():
+            arrays = {part: _load_array(export_dir / name, mmap) for part, name in spec["files"].items()}
+            if spec["kind"] == "text":
+                loaded[table][column] = DictionaryColumn(arrays["codes"], arrays["offsets"], arrays["data"])
+            else:
+                loaded[table][column] = Column(arrays["values"], arrays.get("valid"))
+    return loaded
+
+
+def publish_export(db_path, run_id, columnar_dir=COLUMNAR_DIR, **metadata):
+    """Export the database at db_path as columnar_dir/<run_id> and point columnar_dir/latest at it.
+
+    The previous exports are deleted once latest has moved on (readers
+    that still have their files mapped keep them until they let go).
+    """
+    columnar_dir = Path(columnar_dir).absolute()
+    columnar_dir.mkdir(parents=True, exist_ok=True)
+    export_dir = columnar_dir / run_id
+    # A resumed run exports again.
+    shutil.rmtree(export_dir, ignore_errors=True)
+    export_db(db_path, export_dir, run_id=run_id, **metadata)
+
+    latest = columnar_dir / "latest"
+    tmp_link = columnar_dir / "latest.tmp"
+    tmp_link.unlink(missing_ok=True)
+    tmp_link.symlink_to(run_id)
+    os.replace(tmp_link, latest)
+
+    for path in columnar_dir.iterdir():
+        if path.is_dir() and not path.is_symlink() and path.name != run_id:
+            shutil.rmtree(path, ignore_errors=True)
+    return export_dir
@@ -1,5 +1,120 @@
-import json_delta as jd
+import json
 from pathlib import Path
+from clean_data import cable_hash
+from snapshot_format import load_snapshot
+
+
+def index_by_code(snapshot):
+    """Re-key a snapshot ({cable name: cable data}) on the cable's stable id.
+
+    Returns {cable id: (hash, cable name, cable data)}.
+    """
+    return {
+        cable_data["id"]: (cable_hash(cable_name, cable_data), cable_name, cable_data)
+        for cable_name, cable_data in snapshot.items()
+    }
+
+
+def diff_landing_points(prev_points, curr_points):
+    """Match landing points by id rather than by list position."""
+    prev_by_id = {p["id"]: p for p in prev_points}
+    curr_by_id = {p["id"]: p for p in curr_points}
+    changes = {}
+
+    added = [curr_by_id[p_id] for p_id in curr_by_id if p_id not in prev_by_id]
+    removed = [prev_by_id[p_id] for p_id in prev_by_id if p_id not in curr_by_id]
+    changed = {}
+    for p_id in prev_by_id.keys() & curr_by_id.keys():
+        fields = diff_fields(prev_by_id[p_id], curr_by_id[p_id])
+        if fields:
+            changed[p_id] = fields
+
+    if added:
+        changes["added"] = added
+    if removed:
+        changes["removed"] = removed
+    if changed:
+        changes["changed"] = changed
+    return changes
+
+
+def diff_fields(prev, curr):
+    """Field-level changes between two flat dicts: {field: {"old": ..., "new": ...}}."""
+    return {
+        field: {"old": prev.get(field), "new": curr.get(field)}
+        for field in sorted(prev.keys() | curr.keys())
+        if prev.get(field) != curr.get(field)
+    }
+
+
+def diff_cable(prev_name, prev, curr_name, curr):
+    """Field-level changes between two versions of one cable."""
+    changes = {}
+    if prev_name != curr_name:
+        changes["name"] = {"old": prev_name, "new": curr_name}
+
+    fields = diff_fields(
+        {k: v for k, v in prev.items() if k != "landing_points"},
+        {k: v for k, v in curr.items() if k != "landing_points"},
+    )
+    changes.update(fields)
+
+    landing_points = diff_landing_points(prev.get("landing_points") or [],
+                                         curr.get("landing_points") or [])
+    if landing_points:
+        changes["landing_points"] = landing_points
+    return changes
+
+
+def diff_snapshots(previous, current):
+    """Structured changelog between two snapshots.
+
+    Cables are matched on their id, and only cables whose canonical hash
+    differs are compared field by field, so the cost is linear in the
+    number of cables and nearly free for unchanged ones. Returns
+
+        {"added": {id: {"name": ..., "data": ...}},
+         "removed": {id: {"name": ..., "data": ...}},
+         "changed": {id: {"name": ..., "changes": {field: ...}}},
+         "summary": {"added": n, "removed": n, "changed": n, "unchanged": n}}
+    """
+    prev_index = index_by_code(previous)
+    curr_index = index_by_code(current)
+
+    added = {}
+    removed = {}
+    changed = {}
+    unchanged = 0
+
+    for code, (curr_hash, curr_name, curr_data) in curr_index.items():
+        if code not in prev_index:
+            added[code] = {"name": curr_name, "data": curr_data}
+            continue
+        prev_hash, prev_name, prev_data = prev_index[code]
+        if prev_hash == curr_hash:
+            unchanged += 1
+            continue
+        changed[code] = {
+            "name": curr_name,
+            "changes": diff_cable(prev_name, prev_data, curr_name, curr_data),
+        }
+
+    for code, (prev_hash, prev_name, prev_data) in prev_index.items():
+        if code not in curr_index:
+            removed[code] = {"name": prev_name, "data": prev_data}
+
+    return {
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "summary": {
+            "added": len(added),
+            "removed": len(removed),
+            "changed": len(changed),
+            "unchanged": unchanged,
+        },
+    }
+
 
 def generate_diff(diff_name,
                   prev_path="./update/data/previous",
@@ -8,6 +123,8 @@ def generate_diff(diff_name,
     """
     Create difference file in output_dir/diff_name
     Return path to difference file.
+
+    The file holds diff_snapshots()' changelog of added, removed and changed cables.
     """
     try:
         diff_name = Path(diff_name)
@@ -16,47 +133,39 @@ def generate_diff(diff_name,
         output_dir = Path(output_dir).absolute()
         output_path = (output_dir / diff_name).absolute()
 
-        if not prev_path.resolve().exists:
+        if not prev_path.resolve().exists():
             err_msg = "Path provided for previous data file does not exist."
             err_msg += f"\nprev_path = {prev_path}"
             err_msg += f"\nprev_path.resolve() = {prev_path.resolve()}"
-            raise FileNotFoundError
+            raise FileNotFoundError(err_msg)
 
-        if not curr_path.resolve().exists:
+        if not curr_path.resolve().exists():
             err_msg = "Path provided for current data file does not exist."
             err_msg += f"\ncurr_path = {curr_path}"
             err_msg += f"\ncurr_path.resolve() = {curr_path.resolve()}"
-            raise FileNotFoundError
+            raise FileNotFoundError(err_msg)
 
         prev_path = prev_path.resolve()
         curr_path = curr_path.resolve()
         output_dir.mkdir(parents=True, exist_ok=True)
 
-        with open(prev_path, "rt", encoding="utf-8") as prev:
-            previous = jd._util.json.load(prev)
-
-        with open(curr_path, "rt", encoding="utf-8") as curr:
-            current = jd._util.json.load(curr)
+        previous = load_snapshot(prev_path)
+        current = load_snapshot(curr_path)
 
-        diffs = jd.diff(left_struc=previous, right_struc=current)
-        assert jd._util.check_diff_structure(diffs)
+        diffs = diff_snapshots(previous, current)
 
         with open(output_path.resolve(), "wt", encoding="utf-8") as f:
-            try:
-                jd._util.json.dump(diffs, f, ensure_ascii=False, sort_keys=True, indent=4)
-                print(f"Wrote differences to {output_path.resolve()}.")
-                return output_path.resolve()
-            except Exception as e:
-                raise e
+            json.dump(diffs, f, ensure_ascii=False, sort_keys=True, indent=4)
+            print(f"Wrote differences to {output_path.resolve()}.")
+            return output_path.resolve()
 
     except FileNotFoundError as e:
-        print(err_msg)
         print(e)
 
-    except jd._util.json.decoder.JSONDecodeError as e:
-        # TODO: Handle empty files differently than this
+    except json.JSONDecodeError as e:
         print("Unable to generate diff")
-        return 
+        print(e)
+        return
 
 
 if __name__ == '__main__':
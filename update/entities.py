@@ -0,0 +1,339 @@
+"""Canonical owner and supplier names, remembered across runs in an alias index.
+
+submarinecablemap.com spells the same company several ways ("Telefónica
+S.A.", "Telefonica", "Tata Communications Ltd.", "Tata Communication"), so
+CableParser sends every owner and supplier name through an EntityResolver
+and links the cable to the canonical entity instead:
+
+    resolver = load_resolver()
+    resolver.canonical("owner", "Telefónica S.A.")    # "Telefónica S.A."
+    resolver.canonical("owner", "Telefonica")         # "Telefónica S.A."
+    save_resolver(resolver)
+
+A name is resolved, per kind, by the first of
+
+    1. the alias index: every name seen in an earlier run, with its entity
+    2. the pinned aliases in entity-aliases.txt ("Facebook = Meta"), for
+       renames no string comparison could find
+    3. its key (name_key()): accents folded, case and punctuation dropped,
+       legal suffixes (Inc., Ltd., S.A., ...) removed
+    4. fuzzy matching: the entity with a key whose character trigrams have
+       Jaccard similarity at least MATCH_THRESHOLD with the name's
+
+and a name none of them match becomes a new entity, named after it.
+Acronyms aren't matched: "NTT" could as well be "National Taiwan Telecom"
+as "Nippon Telegraph and Telephone", so acronyms are pinned instead
+("NTT = Nippon Telegraph and Telephone"). Step 4
+is blocked on the trigrams: a name is only compared with the keys that
+share one of its few rarest trigrams (prefix filtering), which can't miss a
+match above the threshold, rather than with every entity. Once resolved, a
+name is in the alias index, so later runs look it up in a dict.
+
+Entity ids are positions in the index's entity list and never change; the
+canonical name of an entity is the first name it was seen under (or its
+pinned name), so it doesn't change from run to run either.
+"""
+import math
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from json import JSONDecodeError, dump, load
+from pathlib import Path
+
+
+ENTITY_INDEX_PATH = "./update/cache/entity_index.json"
+ALIASES_PATH = "./update/entity-aliases.txt"
+KINDS = ("owner", "supplier")
+# Least trigram Jaccard similarity for two keys to be the same entity.
+MATCH_THRESHOLD = 0.8
+# Tokens dropped from the end of a key (company forms), and so also the
+# fragments split_names() puts back on the name before them.
+LEGAL_SUFFIXES = {
+    "ab", "ag", "as", "asa", "bhd", "bv", "co", "company", "corp", "corporation",
+    "gmbh", "inc", "incorporated", "kk", "limited", "llc", "llp", "lp", "ltd",
+    "nv", "oy", "oyj", "plc", "pte", "pty", "sa", "sal", "sarl", "sas", "sdn",
+    "spa", "srl", "tbk",
+}
+# Tokens dropped from the start of a key.
+LEADING_WORDS = {"the", "pt"}
+# Abbreviations spelled out in keys.
+ABBREVIATIONS = {
+    "intl": "international",
+    "natl": "national",
+    "comms": "communications",
+    "svcs": "services",
+    "telecomm": "telecommunications",
+}
+# The version of the alias index save_resolver() writes. Version 1 indexes
+# matched acronyms (see _acronym_match()).
+INDEX_VERSION = 2
+# Words left out of acronyms.
+ACRONYM_STOP_WORDS = {"and", "of", "the", "de", "da", "do", "des", "du", "la", "le", "el", "et", "y"}
+
+
+def _tokens(name):
+    """Words of name with accents folded, case, dots and apostrophes dropped and & spelled out."""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = re.sub(r"['’.]", "", text.replace("&", " and "))
+    return [ABBREVIATIONS.get(token, token) for token in re.split(r"[\W_]+", text) if token]
+
+
+def name_key(name):
+    """The comparison key of an owner or supplier name ("Telefónica, S.A." -> "telefonica")."""
+    tokens = _tokens(name)
+    while len(tokens) > 1 and tokens[0] in LEADING_WORDS:
+        tokens.pop(0)
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens) or name.casefold()
+
+
+@lru_cache(maxsize=65536)
+def _is_legal_suffix(part):
+    tokens = _tokens(part)
+    return bool(tokens) and all(token in LEGAL_SUFFIXES for token in tokens)
+
+
+def split_names(text):
+    """Split a comma-separated list of names, keeping a name's own ", Inc." etc. on it.
+
+    "Foo, Inc., Bar Ltd" -> ["Foo, Inc.", "Bar Ltd"]
+    """
+    names = []
+    for part in text.split(", "):
+        if names and _is_legal_suffix(part):
+            names[-1] += ", " + part
+        else:
+            names.append(part)
+    return names
+
+
+def _trigrams(key):
+    padded = f" {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _numbers(key):
+    return tuple(re.findall(r"\d+", key))
+
+
+def _prefix_length(grams):
+    """How many of a key's trigrams to index and probe (see AliasIndex._match())."""
+    return len(grams) - math.ceil(MATCH_THRESHOLD * len(grams) - 1e-9) + 1
+
+
+def _acronym(key):
+    letters = [token[0] for token in key.split() if token not in ACRONYM_STOP_WORDS]
+    return "".join(letters) if len(letters) >= 3 else None
+
+
+def _is_acronym(name, key):
+    """Whether name is written as an acronym ("NTT", not "Ntt" or "KDD 2")."""
+    return 3 <= len(key) <= 6 and key.isalpha() and " " not in key and name.isupper()
+
+
+def _acronym_match(name, other):
+    """Whether name is other's acronym or the other way round ("NTT", "Nippon Telegraph and Telephone")."""
+    key, other_key = name_key(name), name_key(other)
+    return ((_is_acronym(name, key) and _acronym(other_key) == key)
+            or (_is_acronym(other, other_key) and _acronym(key) == other_key))
+
+
+def read_aliases(aliases_path=ALIASES_PATH):
+    """{alias key: canonical name} from the "alias = canonical name" lines of aliases_path.
+
+    Blank lines and # comments are skipped; a missing file has no aliases.
+    """
+    aliases = {}
+    aliases_path = Path(aliases_path).absolute()
+    if not aliases_path.exists():
+        return aliases
+    with open(aliases_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            alias, sep, canonical = line.partition("=")
+            if not sep or not alias.strip() or not canonical.strip():
+                print(f"Skipping malformed alias line in {aliases_path}: {line}")
+                continue
+            aliases[name_key(alias.strip())] = canonical.strip()
+    return aliases
+
+
+class AliasIndex:
+    """The entities of one kind (owners or suppliers) and every name they were seen under.
+
+    entities is the list of canonical names (an entity's id is its
+    position), aliases {name: entity id}, and pinned {alias key: canonical
+    name} (see read_aliases()).
+
+    If acronym_aliases is False (a version 1 index), aliases that only an
+    acronym could have matched to their entity are dropped, so they are
+    resolved again the next time they are seen.
+    """
+    def __init__(self, entities=None, aliases=None, pinned=None, acronym_aliases=True):
+        self.entities = list(entities or [])
+        self.aliases = dict(aliases or {})
+        self.pinned = pinned or {}
+        if not acronym_aliases:
+            self._drop_acronym_aliases()
+        self.keys = {}
+        # The blocking index: trigram -> keys that have it, and each key's trigrams.
+        self.postings = defaultdict(list)
+        self.grams = {}
+        # Keys with numbers in them, by their numbers.
+        self.numbered = defaultdict(list)
+
+        for entity_id, name in enumerate(self.entities):
+            self._index(name, entity_id)
+        for name, entity_id in self.aliases.items():
+            self._index(name, entity_id)
+        # Pinned aliases added since the index was saved override what it says.
+        for name in list(self.aliases):
+            target = self.pinned.get(name_key(name))
+            if target is not None:
+                self.aliases[name] = self._entity_id(target)
+                self._index(name, self.aliases[name], replace=True)
+
+    def _index(self, name, entity_id, replace=False):
+        key = name_key(name)
+        if key in self.keys:
+            if replace:
+                self.keys[key] = entity_id
+            return
+        self.keys[key] = entity_id
+        self.grams[key] = grams = _trigrams(key)
+        for gram in grams:
+            self.postings[gram].append(key)
+        numbers = _numbers(key)
+        if numbers:
+            self.numbered[numbers].append(key)
+
+    def _drop_acronym_aliases(self):
+        names = defaultdict(list)
+        for name, entity_id in self.aliases.items():
+            names[entity_id].append(name)
+        dropped = set()
+        for name, entity_id in self.aliases.items():
+            key = name_key(name)
+            if key != name_key(self.entities[entity_id]) and any(
+                    _acronym_match(name, other) for other in names[entity_id] if other != name):
+                dropped.add(key)
+        # Spellings of a dropped alias ("N.T.T.") were matched through it.
+        for name in [name for name in self.aliases if name_key(name) in dropped]:
+            del self.aliases[name]
+
+    def _match(self, name, key):
+        """The id of the entity name is a variant of, or None."""
+        entity_id = self.keys.get(key)
+        if entity_id is not None:
+            return entity_id
+
+        # Names that differ in a number ("Cable 2", "Cable 3") are never the
+        # same entity, so keys with numbers are only compared with keys with
+        # the same numbers. Other keys: a key with trigram Jaccard similarity
+        # >= MATCH_THRESHOLD shares at least ceil(MATCH_THRESHOLD * n) of
+        # this key's n trigrams, so it has one of any n - that + 1 of them,
+        # and only the keys with one of the rarest few (the prefix) need
+        # comparing.
+        grams = _trigrams(key)
+        numbers = _numbers(key)
+        if numbers:
+            candidates = set(self.numbered.get(numbers, ()))
+        else:
+            postings = self.postings
+            rarest = sorted(grams, key=lambda gram: len(postings.get(gram, ())))[:_prefix_length(grams)]
+            candidates = {other for gram in rarest for other in postings.get(gram, ())
+                          if not _numbers(other)}
+
+        best, best_score = None, 0.0
+        size = len(grams)
+        min_size, max_size = MATCH_THRESHOLD * size, size / MATCH_THRESHOLD
+        for other in sorted(candidates):
+            other_grams = self.grams[other]
+            # Sets this different in size can't be similar enough.
+            if not min_size <= len(other_grams) <= max_size:
+                continue
+            shared = len(grams & other_grams)
+            score = shared / (size + len(other_grams) - shared)
+            if score >= MATCH_THRESHOLD and score > best_score:
+                best, best_score = self.keys[other], score
+        return best
+
+    def _entity_id(self, name, depth=0):
+        entity_id = self.aliases.get(name)
+        if entity_id is not None:
+            return entity_id
+        key = name_key(name)
+        target = self.pinned.get(key)
+        # A pinned name resolves like any other (up to a few hops, in case
+        # the aliases file has a cycle).
+        pinned = target is not None and target != name and depth < 8
+        if pinned:
+            entity_id = self._entity_id(target, depth + 1)
+        else:
+            entity_id = self._match(name, key)
+            if entity_id is None:
+                entity_id = len(self.entities)
+                self.entities.append(name)
+        self.aliases[name] = entity_id
+        self._index(name, entity_id, replace=pinned)
+        return entity_id
+
+    def canonical(self, name):
+        """The canonical name of the entity name refers to, adding name to the index."""
+        entity_id = self.aliases.get(name)
+        if entity_id is None:
+            entity_id = self._entity_id(name)
+        return self.entities[entity_id]
+
+    def state(self):
+        return {"entities": self.entities, "aliases": self.aliases}
+
+
+class EntityResolver:
+    """An AliasIndex per kind of entity (see KINDS)."""
+    def __init__(self, state=None, pinned=None):
+        state = state or {}
+        acronym_aliases = state.get("version", INDEX_VERSION) >= INDEX_VERSION
+        self.indexes = {kind: AliasIndex(pinned=pinned, acronym_aliases=acronym_aliases,
+                                         **state.get(kind, {}))
+                        for kind in KINDS}
+
+    def canonical(self, kind, name):
+        """The canonical name of the kind ("owner" or "supplier") of entity name refers to."""
+        return self.indexes[kind].canonical(name)
+
+    def state(self):
+        return {"version": INDEX_VERSION, **{kind: index.state() for kind, index in self.indexes.items()}}
+
+
+def load_resolver(index_path=ENTITY_INDEX_PATH, aliases_path=ALIASES_PATH):
+    """An EntityResolver with the alias index saved at index_path and the pinned aliases in aliases_path.
+
+    Starts an empty index if the file is missing or unreadable.
+    """
+    index_path = Path(index_path).absolute()
+    state = None
+    try:
+        with open(index_path, "rt", encoding="utf-8") as f:
+            state = load(f)
+    except FileNotFoundError:
+        pass
+    except (OSError, JSONDecodeError) as e:
+        print(f"Ignoring unreadable entity index {index_path}: {e}")
+    return EntityResolver(state, read_aliases(aliases_path))
+
+
+def save_resolver(resolver, index_path=ENTITY_INDEX_PATH):
+    """Write resolver's alias index to index_path (atomically, like the scraper's cache)."""
+    index_path = Path(index_path).absolute()
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(index_path.name + ".tmp")
+    with open(tmp_path, "wt", encoding="utf-8") as f:
+        dump(resolver.state(), f, ensure_ascii=False)
+    os.replace(tmp_path, index_path)
@@ -0,0 +1,162 @@
+"""Generation-numbered databases, published by swapping a symlink.
+
+update/db/scn.db is a symlink into update/db/generations/:
+
+    scn.db -> generations/scn.000042.db
+    generations/scn.000041.db           the previous generation
+    generations/scn.000041.db.readers   its reader lock file
+    generations/scn.000042.db
+    generations/scn.000042.db.readers
+
+write_db() and the streaming pipeline build every new database in a scratch
+file, never in the one readers have open. publish_generation() then gives
+the file the next generation number and atomically points the symlink at it,
+so a reader opening scn.db gets either the old database or the new one,
+complete. Published databases are in WAL mode, so writes made in place
+afterwards (query.ensure_indexes(), snapshot_store.rebuild_history()) don't
+block their readers.
+
+Readers that keep a generation open (query.py's connection pools) hold a
+shared flock on its .readers file (hold_generation()). collect_garbage()
+deletes old generations, keeping the newest few, but only once it can take
+that lock exclusively, i.e. once their last reader has let go.
+
+run_lock() keeps two updates from running at once.
+"""
+import fcntl
+import os
+import re
+from pathlib import Path
+from uuid import uuid4
+
+
+GENERATIONS_DIR = "generations"
+# Newest generations collect_garbage() keeps, the current one included.
+KEEP_GENERATIONS = 2
+
+
+def generations_dir(db_path):
+    return Path(db_path).absolute().parent / GENERATIONS_DIR
+
+
+def readers_path(generation_path):
+    """The reader lock file of a generation."""
+    return generation_path.with_name(generation_path.name + ".readers")
+
+
+def list_generations(db_path):
+    """[(number, path)] of db_path's generations, oldest first."""
+    db_path = Path(db_path).absolute()
+    pattern = re.compile(re.escape(db_path.stem) + r"\.(\d+)" + re.escape(db_path.suffix) + "$")
+    directory = generations_dir(db_path)
+    if not directory.is_dir():
+        return []
+    generations = []
+    for path in directory.iterdir():
+        match = pattern.match(path.name)
+        if match:
+            generations.append((int(match.group(1)), path))
+    return sorted(generations)
+
+
+def current_generation(db_path):
+    """The file db_path points at (itself if it isn't a symlink), or None if there's none."""
+    path = Path(os.path.realpath(Path(db_path).absolute()))
+    return path if path.exists() else None
+
+
+def publish_generation(db_path, built_path):
+    """Move the database built at built_path in as db_path's next generation and point db_path at it.
+
+    built_path must be closed and on the same filesystem as db_path. If
+    db_path is still a plain database file (from before generations),
+    it is replaced by the symlink; readers that have it open keep reading it.
+    Returns the new generation's path.
+    """
+    db_path = Path(db_path).absolute()
+    directory = generations_dir(db_path)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Hard linking fails if the name is taken, so two writers can't both
+    # claim a number.
+    number = max((n for n, path in list_generations(db_path)), default=0) + 1
+    while True:
+        generation_path = directory / f"{db_path.stem}.{number:06d}{db_path.suffix}"
+        try:
+            os.link(built_path, generation_path)
+            break
+        except FileExistsError:
+            number += 1
+    os.unlink(built_path)
+    readers_path(generation_path).touch()
+
+    tmp_link = db_path.with_name(f".{db_path.name}.{uuid4().hex[:8]}.link")
+    tmp_link.symlink_to(generation_path.relative_to(db_path.parent))
+    os.replace(tmp_link, db_path)
+    return generation_path
+
+
+def hold_generation(db_path):
+    """Resolve db_path to its current generation and take a shared lock against its collection.
+
+    Returns (generation path, lock file); closing the lock file releases
+    it. The lock file is None for a database that isn't a generation.
+    Raises FileNotFoundError if there's no database at db_path.
+    """
+    for attempt in range(8):
+        path = Path(os.path.realpath(Path(db_path).absolute()))
+        try:
+            lock = open(readers_path(path), "rb")
+        except FileNotFoundError:
+            if path.exists():
+                return path, None
+            # Collected between resolving db_path and opening its lock.
+            continue
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        if path.exists():
+            return path, lock
+        lock.close()
+    raise FileNotFoundError(f"No database at {db_path}")
+
+
+def collect_garbage(db_path, keep=KEEP_GENERATIONS):
+    """Delete db_path's generations but the newest keep (and the current one) that have no readers.
+
+    Generations still being read are skipped, to be collected by a later
+    call. Returns the paths deleted.
+    """
+    current = current_generation(db_path)
+    removed = []
+    for number, path in list_generations(db_path)[:-keep or None]:
+        if path == current:
+            continue
+        with open(readers_path(path), "ab") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            for suffix in ("", "-wal", "-shm"):
+                Path(str(path) + suffix).unlink(missing_ok=True)
+            readers_path(path).unlink(missing_ok=True)
+        removed.append(path)
+    return removed
+
+
+def run_lock(lock_path):
+    """Take the exclusive update lock at lock_path, or return None if another process has it.
+
+    Returns the open lock file, which holds the lock until it is closed
+    (or the process exits). The holder's pid is written to it.
+    """
+    lock_path = Path(lock_path).absolute()
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    lock = open(lock_path, "a+")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return None
+    lock.truncate(0)
+    lock.write(f"{os.getpid()}\n")
+    lock.flush()
+    return lock
@@ -0,0 +1,220 @@
+"""Landing point and cable geometry, with R*Tree indexes for spatial queries.
+
+The scraper fetches submarinecablemap.com's two GeoJSON files,
+
+    /api/v3/landing-point/landing-point-geo.json   a Point per landing point
+    /api/v3/cable/cable-geo.json                   (Multi)LineStrings per cable
+
+and write_geo() stores them as
+
+    point_geo                id, code, name, longitude, latitude
+    cable_segment            id, cable_code, coordinates (JSON [[lon, lat], ...])
+    point_rtree              R*Tree over point_geo, by id
+    cable_segment_rtree      R*Tree over cable_segment bounding boxes, by id
+
+Rows are keyed on point and cable codes, like the history tables, so a
+rebuild without new geometry can carry the old tables over (carry_geo).
+
+Cable lines are cut into segments of at most SEGMENT_POINTS vertices and
+SEGMENT_DEGREES of longitude or latitude, and wherever they jump across the
+antimeridian, so each segment's bounding box is small and a box query only
+looks at the segments near it.
+Coordinates are WGS 84 degrees; distances are great-circle kilometres.
+"""
+import math
+from json import JSONEncoder, loads
+from history import carry_tables
+
+
+# Most vertices, and degrees of extent, per cable segment. A single edge
+# longer than SEGMENT_DEGREES gets a segment of its own.
+SEGMENT_POINTS = 16
+SEGMENT_DEGREES = 5.0
+EARTH_RADIUS_KM = 6371.0088
+
+# Encodes segment coordinates compactly (json.dumps() rebuilds an encoder per call).
+_encode_coordinates = JSONEncoder(separators=(",", ":")).encode
+
+GEO_TABLE_SQL = [
+    """CREATE TABLE IF NOT EXISTS point_geo(
+                id INTEGER NOT NULL PRIMARY KEY,
+                code TEXT NOT NULL,
+                name TEXT,
+                longitude REAL NOT NULL,
+                latitude REAL NOT NULL
+                )""",
+    """CREATE TABLE IF NOT EXISTS cable_segment(
+                id INTEGER NOT NULL PRIMARY KEY,
+                cable_code TEXT NOT NULL,
+                coordinates TEXT NOT NULL
+                )""",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS point_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS cable_segment_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat)",
+]
+
+GEO_TABLES = ("point_geo", "cable_segment", "point_rtree", "cable_segment_rtree")
+
+GEO_INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS point_geo_code_idx ON point_geo(code)",
+    "CREATE INDEX IF NOT EXISTS cable_segment_cable_idx ON cable_segment(cable_code)",
+]
+
+
+def create_geo_tables(cur):
+    for sql in GEO_TABLE_SQL:
+        cur.execute(sql)
+
+
+def _lines(geometry):
+    """The line strings of a LineString or MultiLineString geometry."""
+    if not geometry:
+        return []
+    if geometry["type"] == "LineString":
+        return [geometry["coordinates"]]
+    if geometry["type"] == "MultiLineString":
+        return geometry["coordinates"]
+    return []
+
+
+def parse_geo(geo):
+    """Turn the scraped GeoJSON into {"points": {code: (name, lon, lat)}, "cables": {code: [line, ...]}}.
+
+    geo is {"landing_points": <landing-point-geo.json>, "cables": <cable-geo.json>}.
+    A cable can have several features; their lines are collected together.
+    """
+    points = {}
+    for feature in (geo.get("landing_points") or {}).get("features", []):
+        geometry = feature.get("geometry") or {}
+        properties = feature.get("properties") or {}
+        if geometry.get("type") == "Point" and properties.get("id"):
+            lon, lat = geometry["coordinates"][:2]
+            points[properties["id"]] = (properties.get("name"), lon, lat)
+
+    cables = {}
+    for feature in (geo.get("cables") or {}).get("features", []):
+        properties = feature.get("properties") or {}
+        if properties.get("id"):
+            cables.setdefault(properties["id"], []).extend(_lines(feature.get("geometry")))
+    return {"points": points, "cables": cables}
+
+
+def segments(line, size=SEGMENT_POINTS, degrees=SEGMENT_DEGREES):
+    """Cut a line ([[lon, lat], ...]) into runs of at most size vertices and degrees of extent.
+
+    Consecutive runs share their end vertex, except where the line jumps
+    more than 180 degrees of longitude (crosses the antimeridian), which
+    starts a new run so no bounding box spans the whole globe.
+    """
+    run = []
+    for vertex in line:
+        vertex = vertex[:2]
+        if run and abs(vertex[0] - run[-1][0]) > 180:
+            if len(run) > 1:
+                yield run
+            run = []
+        elif len(run) > 1 and (abs(vertex[0] - run[0][0]) > degrees or abs(vertex[1] - run[0][1]) > degrees):
+            yield run
+            run = [run[-1]]
+        run.append(vertex)
+        if len(run) == size:
+            yield run
+            run = [run[-1]]
+    if len(run) > 1:
+        yield run
+
+
+def write_geo(db, geo):
+    """Replace the geometry tables' contents with the scraped GeoJSON in geo.
+
+    Returns the number of points and segments written.
+    """
+    parsed = parse_geo(geo)
+    point_rows = [(p_id, code, name, lon, lat)
+                  for p_id, (code, (name, lon, lat)) in enumerate(sorted(parsed["points"].items()))]
+    segment_rows = []
+    box_rows = []
+    for code, lines in sorted(parsed["cables"].items()):
+        for line in lines:
+            for run in segments(line):
+                lons = [v[0] for v in run]
+                lats = [v[1] for v in run]
+                segment_rows.append((len(segment_rows), code, _encode_coordinates(run)))
+                box_rows.append((len(box_rows), min(lons), max(lons), min(lats), max(lats)))
+
+    with db:
+        for table in GEO_TABLES:
+            db.execute(f"DELETE FROM {table}")
+        db.executemany("INSERT INTO point_geo (id, code, name, longitude, latitude) VALUES (?,?,?,?,?)",
+                       point_rows)
+        db.executemany("INSERT INTO point_rtree VALUES (?,?,?,?,?)",
+                       ((p_id, lon, lon, lat, lat) for p_id, code, name, lon, lat in point_rows))
+        db.executemany("INSERT INTO cable_segment (id, cable_code, coordinates) VALUES (?,?,?)",
+                       segment_rows)
+        db.executemany("INSERT INTO cable_segment_rtree VALUES (?,?,?,?,?)", box_rows)
+    return len(point_rows), len(segment_rows)
+
+
+def carry_geo(db, previous_db_path):
+    """Copy the geometry tables of the database at previous_db_path into db's."""
+    carry_tables(db, previous_db_path, GEO_TABLES)
+
+
+#### Spatial helpers, also registered as SQL functions by query.py ####
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    """Great-circle distance in kilometres between two points given in degrees."""
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_boxes(lon, lat, km):
+    """Bounding boxes (min_lon, min_lat, max_lon, max_lat) covering a circle of km around (lon, lat).
+
+    Usually one box; two when the circle crosses the antimeridian, and a
+    full band of longitudes when it reaches a pole.
+    """
+    d_lat = math.degrees(km / EARTH_RADIUS_KM)
+    min_lat, max_lat = lat - d_lat, lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return [(-180.0, max(min_lat, -90.0), 180.0, min(max_lat, 90.0))]
+    # Widest longitude offset of the circle (at the latitude of tangency).
+    d_lon = math.degrees(math.asin(min(1.0, math.sin(km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    min_lon, max_lon = lon - d_lon, lon + d_lon
+    if min_lon < -180:
+        return [(min_lon + 360, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    if max_lon > 180:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
+def _clip(p, q, t0, t1):
+    """One Liang-Barsky step: narrow [t0, t1] by the boundary p*t <= q, or None if empty."""
+    if p == 0:
+        return (t0, t1) if q >= 0 else None
+    t = q / p
+    if p < 0:
+        t0 = max(t0, t)
+    else:
+        t1 = min(t1, t)
+    return (t0, t1) if t0 <= t1 else None
+
+
+def line_hits_box(coordinates, min_lon, min_lat, max_lon, max_lat):
+    """1 if any edge of the segment (JSON [[lon, lat], ...]) passes through the box, else 0.
+
+    Edges are treated as straight in longitude/latitude, which is how the
+    map draws them.
+    """
+    line = loads(coordinates)
+    for (x1, y1), (x2, y2) in zip(line, line[1:]):
+        dx, dy = x2 - x1, y2 - y1
+        span = (0.0, 1.0)
+        for p, q in ((-dx, x1 - min_lon), (dx, max_lon - x1), (-dy, y1 - min_lat), (dy, max_lat - y1)):
+            span = _clip(p, q, *span)
+            if span is None:
+                break
+        if span is not None:
+            return 1
+    return 0
@@ -0,0 +1,495 @@
+"""Graph queries over the cable network in the database written by write_db().
+
+    from graph import country_path, critical_cables, failure_impact, min_cable_cut
+
+    print(country_path("Portugal", "Singapore"))      # fewest cable hops
+    for cable in critical_cables()[:10]:              # single points of failure
+        print(cable.name, cable.stranded_points)
+    print(failure_impact(cable_codes=["2africa"]))    # what a cut disconnects
+    print(min_cable_cut("Portugal", "Brazil"))        # fewest cables to cut them off
+
+The network is the bipartite graph of landing points and the cables that
+land at them (cable_point). load_graph() reads it into CSR arrays, both
+ways round,
+
+    cable_indptr, cable_points    the points of cable c are
+                                  cable_points[cable_indptr[c]:cable_indptr[c + 1]]
+    point_indptr, point_cables    the cables of point p, likewise
+
+plus the country graph (two countries are adjacent if a cable lands in
+both), over dense 0-based indices rather than database ids. Graphs are
+cached per database generation, like query.py's results, so they are
+only rebuilt after the database changes.
+
+Connected components are found by min-label propagation over the
+bipartite arrays, the articulation points (critical cables and landing
+points) by one iterative Tarjan depth-first search, and minimum cable
+cut-sets by max-flow with unit-capacity cables.
+"""
+import sqlite3
+import threading
+from collections import deque, namedtuple
+from functools import cached_property
+from pathlib import Path
+import numpy as np
+from query import DEFAULT_DB_PATH, db_generation
+
+
+Hop = namedtuple("Hop", ["country", "cable"])
+Component = namedtuple("Component", ["points", "countries", "cables"])
+Critical = namedtuple("Critical", ["code", "name", "stranded_points", "pieces"])
+FailureImpact = namedtuple("FailureImpact", ["cut_off_points", "disconnected_countries"])
+CableCut = namedtuple("CableCut", ["size", "cables"])
+
+# Per database path: (generation, CableGraph).
+_graphs = {}
+_graphs_lock = threading.Lock()
+
+
+def _csr(rows, cols, n_rows):
+    """CSR (indptr, indices) of the (row, col) pairs, with each row's cols sorted."""
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(n_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_rows), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32)
+
+
+def _segment_min(values, indptr, empty):
+    """Minimum of values over each CSR row; empty for rows without values."""
+    result = np.full(len(indptr) - 1, empty, dtype=values.dtype)
+    nonempty = indptr[:-1] < indptr[1:]
+    if values.size:
+        result[nonempty] = np.minimum.reduceat(values, indptr[:-1][nonempty])
+    return result
+
+
+class CableGraph:
+    """The cable network of one database generation, as CSR arrays.
+
+    Points, cables and countries are numbered 0.. in database id order;
+    point_codes, cable_codes etc. map the indices back.
+    """
+    def __init__(self, points, cables, countries, links):
+        # points: [(id, code, name, country_id)], cables: [(id, code, name)],
+        # countries: [(id, name)], links: [(cable_id, point_id)], each sorted by id.
+        point_ids = np.array([p[0] for p in points], dtype=np.int64)
+        cable_ids = np.array([c[0] for c in cables], dtype=np.int64)
+        country_ids = np.array([k[0] for k in countries], dtype=np.int64)
+        self.point_codes = [p[1] for p in points]
+        self.point_names = [p[2] for p in points]
+        self.cable_codes = [c[1] for c in cables]
+        self.cable_names = [c[2] for c in cables]
+        self.country_names = [k[1] for k in countries]
+        self.point_country = np.searchsorted(country_ids, [p[3] for p in points]).astype(np.int32)
+        self.n_points, self.n_cables, self.n_countries = len(points), len(cables), len(countries)
+
+        links = np.array(links, dtype=np.int64).reshape(-1, 2)
+        link_cables = np.searchsorted(cable_ids, links[:, 0])
+        link_points = np.searchsorted(point_ids, links[:, 1])
+        self.cable_indptr, self.cable_points = _csr(link_cables, link_points, self.n_cables)
+        self.point_indptr, self.point_cables = _csr(link_points, link_cables, self.n_points)
+        self._country_graph(link_cables, link_points)
+
+        self.point_index = {code: i for i, code in enumerate(self.point_codes)}
+        self.cable_index = {code: i for i, code in enumerate(self.cable_codes)}
+        self.country_index = {name: i for i, name in enumerate(self.country_names)}
+
+    def _country_graph(self, link_cables, link_points):
+        """Country adjacency CSR, with one connecting cable per edge (country_via)."""
+        # The distinct (cable, country) pairs, grouped by cable.
+        pairs = np.unique(np.stack([link_cables, self.point_country[link_points]], axis=1), axis=0)
+        cable_of, country_of = pairs[:, 0], pairs[:, 1]
+        counts = np.bincount(cable_of, minlength=self.n_cables)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        # Every ordered pair of countries within each cable's group.
+        n = counts[cable_of]
+        left = np.repeat(country_of, n)
+        first = np.repeat(starts[cable_of], n)
+        offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        right = country_of[first + offset]
+        via = np.repeat(cable_of, n)
+        keep = left != right
+        left, right, via = left[keep], right[keep], via[keep]
+        # One edge per country pair, via the first cable found.
+        _, first_edge = np.unique(left * self.n_countries + right, return_index=True)
+        left, right, via = left[first_edge], right[first_edge], via[first_edge]
+        self.country_indptr = np.zeros(self.n_countries + 1, dtype=np.int64)
+        np.cumsum(np.bincount(left, minlength=self.n_countries), out=self.country_indptr[1:])
+        # np.unique returned the edges sorted by (left, right) already.
+        self.country_neighbors = right.astype(np.int32)
+        self.country_via = via.astype(np.int32)
+
+    @classmethod
+    def from_db(cls, db_path):
+        db = sqlite3.connect(f"{Path(db_path).as_uri()}?mode=ro", uri=True)
+        try:
+            points = db.execute("SELECT id, code, name, country_id FROM point ORDER BY id").fetchall()
+            cables = db.execute("SELECT id, code, name FROM cable ORDER BY id").fetchall()
+            countries = db.execute("SELECT id, name FROM country ORDER BY id").fetchall()
+            links = db.execute("SELECT DISTINCT cable_id, point_id FROM cable_point").fetchall()
+        finally:
+            db.close()
+        return cls(points, cables, countries, links)
+
+    def labels(self, dead_cables=None, dead_points=None):
+        """Component label of every point (its smallest point index), -1 for dead points.
+
+        dead_cables and dead_points are boolean masks of failed cables and points.
+        """
+        none = self.n_points  # larger than any label
+        labels = np.arange(self.n_points, dtype=np.int64)
+        if dead_points is not None:
+            labels[dead_points] = none
+        while True:
+            cable_min = _segment_min(labels[self.cable_points], self.cable_indptr, none)
+            if dead_cables is not None:
+                cable_min[dead_cables] = none
+            new = np.minimum(labels, _segment_min(cable_min[self.point_cables], self.point_indptr, none))
+            if dead_points is not None:
+                new[dead_points] = none
+            # Pointer jumping: a label's own label is at least as small.
+            alive = new < none
+            new[alive] = new[new[alive]]
+            if np.array_equal(new, labels):
+                break
+            labels = new
+        labels[labels == none] = -1
+        return labels
+
+    @cached_property
+    def point_labels(self):
+        return self.labels()
+
+    @cached_property
+    def articulation(self):
+        """{node: sizes of the pieces its failure splits its component into}.
+
+        Nodes 0..n_points-1 are points and n_points.. cables; sizes count
+        landing points. Only nodes that split off at least one landing
+        point are included. Found with one iterative Tarjan DFS over the
+        bipartite graph.
+        """
+        P = self.n_points
+        n = P + self.n_cables
+        point_indptr, point_cables = self.point_indptr.tolist(), (self.point_cables + P).tolist()
+        cable_indptr, cable_points = self.cable_indptr.tolist(), self.cable_points.tolist()
+
+        def neighbors(v):
+            if v < P:
+                return point_cables[point_indptr[v]:point_indptr[v + 1]]
+            c = v - P
+            return cable_points[cable_indptr[c]:cable_indptr[c + 1]]
+
+        disc = [-1] * n
+        low = [0] * n
+        size = [0] * n  # landing points in the DFS subtree
+        cut_off = {}    # node: sizes of the subtrees only it connects to the rest
+        clock = 0
+        for root in range(n):
+            if disc[root] != -1:
+                continue
+            disc[root] = low[root] = clock
+            clock += 1
+            size[root] = int(root < P)
+            stack = [(root, -1, iter(neighbors(root)))]
+            while stack:
+                v, parent, it = stack[-1]
+                for u in it:
+                    if disc[u] == -1:
+                        disc[u] = low[u] = clock
+                        clock += 1
+                        size[u] = int(u < P)
+                        stack.append((u, v, iter(neighbors(u))))
+                        break
+                    if u != parent:
+                        low[v] = min(low[v], disc[u])
+                else:
+                    stack.pop()
+                    if parent != -1:
+                        low[parent] = min(low[parent], low[v])
+                        size[parent] += size[v]
+                        # The root's children are always cut off from each other.
+                        if low[v] >= disc[parent]:
+                            cut_off.setdefault(parent, []).append(size[v])
+
+        pieces = {}
+        component_points = np.bincount(self.point_labels, minlength=P)
+        for v, sizes in cut_off.items():
+            if v < P:
+                total = component_points[self.point_labels[v]] - 1
+            else:
+                c = v - P
+                total = component_points[self.point_labels[self.cable_points[self.cable_indptr[c]]]]
+            # The rest of the component is one more piece (empty for the DFS root).
+            sizes = [s for s in sizes + [total - sum(sizes)] if s]
+            if len(sizes) > 1:
+                pieces[v] = sorted(sizes, reverse=True)
+        return pieces
+
+    def critical(self, cables):
+        """Critical cables (or landing points), the most points stranded first."""
+        P = self.n_points
+        result = []
+        for v, sizes in self.articulation.items():
+            if (v >= P) != cables:
+                continue
+            if cables:
+                code, name = self.cable_codes[v - P], self.cable_names[v - P]
+            else:
+                code, name = self.point_codes[v], self.point_names[v]
+            result.append(Critical(code, name, int(sum(sizes) - sizes[0]), tuple(int(s) for s in sizes)))
+        return tuple(sorted(result, key=lambda c: (-c.stranded_points, c.code)))
+
+    def country_path(self, source, target):
+        """Fewest-hop path between two country indices, as [(country, via cable)], or None."""
+        previous = {source: (None, None)}
+        queue = deque([source])
+        while queue:
+            k = queue.popleft()
+            if k == target:
+                break
+            start, end = self.country_indptr[k], self.country_indptr[k + 1]
+            for neighbor, via in zip(self.country_neighbors[start:end].tolist(),
+                                     self.country_via[start:end].tolist()):
+                if neighbor not in previous:
+                    previous[neighbor] = (k, via)
+                    queue.append(neighbor)
+        if target not in previous:
+            return None
+        path = []
+        k = target
+        while k is not None:
+            k_previous, via = previous[k]
+            path.append((k, via))
+            k = k_previous
+        return path[::-1]
+
+    @cached_property
+    def flow_network(self):
+        """Residual network for max_flow_cut(): (arc heads, capacities, arcs out of each node).
+
+        Points are nodes 0..n_points-1; cable c is split into an in node
+        (n_points + c) and an out node (n_points + n_cables + c) joined by a
+        unit-capacity arc, so cutting a cable costs 1 and passing through a
+        landing point nothing. Arc a's reverse arc is a ^ 1.
+        """
+        P, C = self.n_points, self.n_cables
+        unlimited = C + 1
+        to, capacity, adjacency = [], [], [[] for _ in range(P + 2 * C)]
+
+        def arc(u, v, cap):
+            adjacency[u].append(len(to))
+            to.append(v)
+            capacity.append(cap)
+            adjacency[v].append(len(to))
+            to.append(u)
+            capacity.append(0)
+
+        cable_indptr, cable_points = self.cable_indptr.tolist(), self.cable_points.tolist()
+        for c in range(C):
+            arc(P + c, P + C + c, 1)
+            for p in cable_points[cable_indptr[c]:cable_indptr[c + 1]]:
+                arc(p, P + c, unlimited)
+                arc(P + C + c, p, unlimited)
+        return to, capacity, adjacency
+
+    def max_flow_cut(self, sources, sinks):
+        """Indices of a minimum set of cables separating the source from the sink points.
+
+        Dinic's max-flow over flow_network, from all sources at once to any
+        sink; every augmenting path crosses a cable, so carries one unit.
+        Raises ValueError if a point is both a source and a sink, since no
+        cut separates it from itself.
+        """
+        to, capacity, adjacency = self.flow_network
+        capacity = list(capacity)
+        n = len(adjacency)
+        is_sink = bytearray(n)
+        for p in sinks:
+            is_sink[p] = 1
+        if any(is_sink[p] for p in sources):
+            raise ValueError("The source and sink points overlap.")
+
+        def levels():
+            """BFS distance from the sources in the residual network, -1 if unreachable."""
+            level = [-1] * n
+            for p in sources:
+                level[p] = 0
+            queue = deque(sources)
+            while queue:
+                u = queue.popleft()
+                for a in adjacency[u]:
+                    if capacity[a] and level[to[a]] < 0:
+                        level[to[a]] = level[u] + 1
+                        queue.append(to[a])
+            return level
+
+        while True:
+            level = levels()
+            if not any(level[p] >= 0 for p in sinks):
+                break
+            # Blocking flow: augment along shortest paths until none is left,
+            # advancing each node's next arc past the ones that lead nowhere.
+            next_arc = [0] * n
+            for source in sources:
+                path = []
+                u = source
+                while True:
+                    if is_sink[u]:
+                        for a in path:
+                            capacity[a] -= 1
+                            capacity[a ^ 1] += 1
+                        path = []
+                        u = source
+                        continue
+                    arcs = adjacency[u]
+                    i = next_arc[u]
+                    while i < len(arcs) and not (capacity[arcs[i]] and level[to[arcs[i]]] == level[u] + 1):
+                        i += 1
+                    next_arc[u] = i
+                    if i < len(arcs):
+                        path.append(arcs[i])
+                        u = to[arcs[i]]
+                    elif path:
+                        # Dead end: retreat and don't come back.
+                        level[u] = -1
+                        u = to[path.pop() ^ 1]
+                    else:
+                        break
+
+        # The cut: cables entered but not left by what the sources still reach.
+        P, C = self.n_points, self.n_cables
+        reachable = levels()
+        return [c for c in range(C) if reachable[P + c] >= 0 and reachable[P + C + c] < 0]
+
+
+def load_graph(db_path=DEFAULT_DB_PATH):
+    """The CableGraph of the database at db_path, rebuilt only when the database changes."""
+    # Not resolved, so a newly published generation is picked up.
+    db_path = Path(db_path).absolute()
+    generation = db_generation(db_path)
+    with _graphs_lock:
+        entry = _graphs.get(db_path)
+        if entry is None or entry[0] != generation:
+            entry = (generation, CableGraph.from_db(db_path))
+            _graphs[db_path] = entry
+    return entry[1]
+
+
+def clear_graph_cache():
+    with _graphs_lock:
+        _graphs.clear()
+
+
+def _country(graph, name):
+    """The index of the country called name, or ValueError if the network has no such country."""
+    try:
+        return graph.country_index[name]
+    except KeyError:
+        raise ValueError(f"No landing points in {name!r}.") from None
+
+
+def country_path(country_a, country_b, db_path=DEFAULT_DB_PATH):
+    """Fewest-hop path from country_a to country_b (by name) as Hops, or None.
+
+    Each Hop is a country and the cable reaching it from the previous one
+    (None for the first).
+    """
+    graph = load_graph(db_path)
+    path = graph.country_path(_country(graph, country_a), _country(graph, country_b))
+    if path is None:
+        return None
+    return tuple(Hop(graph.country_names[k], None if via is None else graph.cable_codes[via])
+                 for k, via in path)
+
+
+def components(db_path=DEFAULT_DB_PATH):
+    """Connected components of the network, largest first.
+
+    Each Component has the codes of its landing points, the names of its
+    countries and the codes of its cables.
+    """
+    graph = load_graph(db_path)
+    labels = graph.point_labels
+    cable_labels = np.full(graph.n_cables, -1)
+    has_points = graph.cable_indptr[:-1] < graph.cable_indptr[1:]
+    cable_labels[has_points] = labels[graph.cable_points[graph.cable_indptr[:-1][has_points]]]
+    result = []
+    for label in np.unique(labels):
+        points = np.flatnonzero(labels == label)
+        result.append(Component(
+            tuple(graph.point_codes[p] for p in points),
+            tuple(sorted({graph.country_names[k] for k in graph.point_country[points]})),
+            tuple(graph.cable_codes[c] for c in np.flatnonzero(cable_labels == label)),
+        ))
+    return tuple(sorted(result, key=lambda c: (-len(c.points), c.points)))
+
+
+def critical_cables(db_path=DEFAULT_DB_PATH):
+    """Cables whose failure alone cuts landing points off, the most stranded first.
+
+    stranded_points counts the points no longer connected to the largest
+    piece of their component; pieces are the sizes of all the pieces.
+    """
+    return load_graph(db_path).critical(cables=True)
+
+
+def critical_points(db_path=DEFAULT_DB_PATH):
+    """Landing points whose failure alone cuts other landing points off (as critical_cables())."""
+    return load_graph(db_path).critical(cables=False)
+
+
+def failure_impact(cable_codes=(), point_codes=(), db_path=DEFAULT_DB_PATH):
+    """What failing the given cables and landing points together disconnects.
+
+    cut_off_points are the codes of the surviving points no longer
+    connected to the largest surviving piece of their component, and
+    disconnected_countries the pairs of country names (each pair sorted)
+    that were connected before and aren't any more.
+    """
+    graph = load_graph(db_path)
+    dead_cables = np.zeros(graph.n_cables, dtype=bool)
+    dead_cables[[graph.cable_index[code] for code in cable_codes]] = True
+    dead_points = np.zeros(graph.n_points, dtype=bool)
+    dead_points[[graph.point_index[code] for code in point_codes]] = True
+    before = graph.point_labels
+    after = graph.labels(dead_cables, dead_points)
+
+    # Within each old component, keep the biggest new piece; the rest is cut off.
+    alive = np.flatnonzero(after >= 0)
+    pairs, counts = np.unique(np.stack([before[alive], after[alive]], axis=1), axis=0, return_counts=True)
+    order = np.lexsort((-counts, pairs[:, 0]))
+    first = np.unique(pairs[order, 0], return_index=True)[1]
+    kept = np.zeros(graph.n_points, dtype=bool)
+    kept[pairs[order[first], 1]] = True
+    cut_off = alive[~kept[after[alive]]]
+
+    def connected(labels):
+        # Country x component incidence; two countries are connected if they share a component.
+        live = labels >= 0
+        component = np.unique(labels[live], return_inverse=True)[1]
+        incidence = np.zeros((graph.n_countries, component.max(initial=-1) + 1), dtype=np.float32)
+        incidence[graph.point_country[live], component] = 1
+        return (incidence @ incidence.T) > 0
+
+    lost = np.argwhere(np.triu(connected(before) & ~connected(after), 1))
+    return FailureImpact(
+        tuple(sorted(graph.point_codes[p] for p in cut_off)),
+        tuple(sorted(tuple(sorted((graph.country_names[a], graph.country_names[b]))) for a, b in lost)),
+    )
+
+
+def min_cable_cut(country_a, country_b, db_path=DEFAULT_DB_PATH):
+    """The fewest cables whose failure disconnects country_a from country_b (by name).
+
+    Returns a CableCut with their number and codes; size is 0 if the two
+    aren't connected to begin with. Raises ValueError for an unknown
+    country or if country_a and country_b are the same.
+    """
+    graph = load_graph(db_path)
+    a, b = _country(graph, country_a), _country(graph, country_b)
+    if a == b:
+        raise ValueError(f"Can't cut {country_a!r} off from itself.")
+    cut = graph.max_flow_cut(np.flatnonzero(graph.point_country == a).tolist(),
+                             np.flatnonzero(graph.point_country == b).tolist())
+    return CableCut(len(cut), tuple(sorted(graph.cable_codes[c] for c in cut)))
@@ -0,0 +1,228 @@
+"""Versioned history of the cable data, kept in the database next to the current tables.
+
+Every write records what changed since the last one in five history tables,
+
+    cable_history             code, name, url, length, ..., notes, hash
+    point_history             code, name, country
+    cable_point_history       cable_code, point_code
+    cable_owner_history       cable_code, owner
+    cable_supplier_history    cable_code, supplier
+
+each row carrying the half-open interval [valid_from, valid_to) during which
+it was true. Rows are keyed on codes and names rather than ids, since a
+rebuild renumbers the ids. Rows that are still true have valid_to =
+OPEN_ENDED rather than NULL, so both ends of the interval can be compared
+with plain, indexable range conditions:
+
+    valid_from <= :when AND valid_to > :when
+
+A cable version is one version of the scraped cable record, identified by
+its cable_hash, so a cable whose landing points, owners or suppliers change
+gets a new version too. Comparing hashes first also means only the cables
+that changed are diffed row by row.
+
+Timestamps are ISO 8601 UTC strings (the run's start datetime), which sort
+in time order as text. A rebuild copies the history of the database it
+replaces into the new one (carry_history) before recording the new data.
+See query.py for the as-of and between queries.
+"""
+import datetime
+
+
+# valid_to of the rows that are still current. Sorts after any timestamp.
+OPEN_ENDED = "9999-12-31T23:59:59.999"
+
+# History table: (key columns, other columns, SELECT of the current rows,
+# whether the rows belong to a cable). A key has at most one open row; a
+# change to any other column closes it and opens a new one. The rows of a
+# cable's tables are keyed on the cable code first, and their SELECTs call
+# the cable table c so they can be limited to the changed cables.
+HISTORY_TABLES = {
+    "cable_history": (
+        ("code",),
+        ("name", "url", "length", "rfs_year", "rfs_text", "planned", "notes", "hash"),
+        """SELECT c.code, c.name, c.url, c.length, c.rfs_year, c.rfs_text, c.planned, c.notes, h.hash
+           FROM main.cable c LEFT JOIN main.cable_hash h ON h.cable_id = c.id""",
+        True),
+    "point_history": (
+        ("code",),
+        ("name", "country"),
+        """SELECT p.code, p.name, k.name FROM main.point p
+           JOIN main.country k ON k.id = p.country_id""",
+        False),
+    "cable_point_history": (
+        ("cable_code", "point_code"),
+        (),
+        """SELECT DISTINCT c.code, p.code FROM main.cable_point x
+           JOIN main.cable c ON c.id = x.cable_id JOIN main.point p ON p.id = x.point_id""",
+        True),
+    "cable_owner_history": (
+        ("cable_code", "owner"),
+        (),
+        """SELECT DISTINCT c.code, o.name FROM main.cable_owner x
+           JOIN main.cable c ON c.id = x.cable_id JOIN main.owner o ON o.id = x.owner_id""",
+        True),
+    "cable_supplier_history": (
+        ("cable_code", "supplier"),
+        (),
+        """SELECT DISTINCT c.code, s.name FROM main.cable_supplier x
+           JOIN main.cable c ON c.id = x.cable_id JOIN main.supplier s ON s.id = x.supplier_id""",
+        True),
+}
+
+# Codes of the cables added, removed or changed (by hash) since the open
+# cable_history rows were written. A cable without a hash counts as changed.
+CHANGED_CABLES_SQL = f"""
+    INSERT INTO temp.changed_cables
+    SELECT c.code FROM main.cable c LEFT JOIN main.cable_hash h ON h.cable_id = c.id
+    WHERE h.hash IS NULL OR NOT EXISTS (
+        SELECT 1 FROM main.cable_history ch
+        WHERE ch.valid_to = '{OPEN_ENDED}' AND ch.code = c.code AND ch.hash = h.hash)
+    UNION
+    SELECT ch.code FROM main.cable_history ch
+    WHERE ch.valid_to = '{OPEN_ENDED}' AND ch.code NOT IN (SELECT code FROM main.cable)"""
+
+HISTORY_TABLE_SQL = [
+    """CREATE TABLE IF NOT EXISTS cable_history(
+                code TEXT NOT NULL,
+                name TEXT NOT NULL,
+                url TEXT,
+                length INTEGER,
+                rfs_year INTEGER,
+                rfs_text TEXT,
+                planned BOOLEAN,
+                notes TEXT,
+                hash TEXT,
+                valid_from TEXT NOT NULL,
+                valid_to TEXT NOT NULL
+                )""",
+    """CREATE TABLE IF NOT EXISTS point_history(
+                code TEXT NOT NULL,
+                name TEXT NOT NULL,
+                country TEXT NOT NULL,
+                valid_from TEXT NOT NULL,
+                valid_to TEXT NOT NULL
+                )""",
+    """CREATE TABLE IF NOT EXISTS cable_point_history(
+                cable_code TEXT NOT NULL,
+                point_code TEXT NOT NULL,
+                valid_from TEXT NOT NULL,
+                valid_to TEXT NOT NULL
+                )""",
+    """CREATE TABLE IF NOT EXISTS cable_owner_history(
+                cable_code TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                valid_from TEXT NOT NULL,
+                valid_to TEXT NOT NULL
+                )""",
+    """CREATE TABLE IF NOT EXISTS cable_supplier_history(
+                cable_code TEXT NOT NULL,
+                supplier TEXT NOT NULL,
+                valid_from TEXT NOT NULL,
+                valid_to TEXT NOT NULL
+                )""",
+]
+
+# Per table, (valid_to, key) finds the open row of a key and serves the
+# "valid at" range scans, and (key, valid_from) walks one key's versions.
+HISTORY_INDEX_SQL = [
+    sql
+    for table, (key, columns, select, by_cable) in HISTORY_TABLES.items()
+    for sql in (
+        f"CREATE INDEX IF NOT EXISTS {table}_open_idx ON {table}(valid_to, {', '.join(key)})",
+        f"CREATE INDEX IF NOT EXISTS {table}_key_idx ON {table}({', '.join(key)}, valid_from)",
+    )
+] + [
+    # Lookups by country, landing point and owner for the as-of queries.
+    "CREATE INDEX IF NOT EXISTS point_history_country_idx ON point_history(country, valid_from)",
+    "CREATE INDEX IF NOT EXISTS cable_point_history_point_idx ON cable_point_history(point_code, valid_from)",
+    "CREATE INDEX IF NOT EXISTS cable_owner_history_owner_idx ON cable_owner_history(owner, valid_from)",
+]
+
+
+def create_history_tables(cur):
+    for sql in HISTORY_TABLE_SQL:
+        cur.execute(sql)
+
+
+def carry_history(db, previous_db_path):
+    """Copy the history tables of the database at previous_db_path into db's.
+
+    Used when a rebuild replaces that database with a freshly loaded one
+    (see write_db.update_history()).
+    Does nothing if there is no previous database or it has no history yet.
+    db must not be in a transaction (SQLite can't ATTACH inside one).
+    """
+    carry_tables(db, previous_db_path, HISTORY_TABLES)
+
+
+def carry_tables(db, previous_db_path, tables):
+    """Copy the rows of tables from the database at previous_db_path into db's.
+
+    Tables the previous database doesn't have yet are skipped.
+    """
+    if previous_db_path is None or not previous_db_path.exists():
+        return
+    # The previous database is live, in WAL mode, and may have readers, so
+    # it's attached with normal locking even if db's own is exclusive (a
+    # bulk load's).
+    locking_mode, = db.execute("PRAGMA main.locking_mode").fetchone()
+    db.execute("PRAGMA locking_mode = NORMAL")
+    db.execute("ATTACH DATABASE ? AS previous", [str(previous_db_path)])
+    db.execute(f"PRAGMA main.locking_mode = {locking_mode}")
+    try:
+        existing = {name for name, in db.execute(
+            "SELECT name FROM previous.sqlite_master WHERE type = 'table'")}
+        for table in tables:
+            if table in existing:
+                db.execute(f"INSERT INTO main.{table} SELECT * FROM previous.{table}")
+        db.commit()
+    finally:
+        db.execute("DETACH DATABASE previous")
+
+
+def record_history(db, as_of=None):
+    """Close the history rows that no longer match the current tables and open new ones.
+
+    as_of is the ISO timestamp the current data is valid from (default
+    now). The cables whose hash changed are found first; the cable and link
+    tables are then diffed for those cables only, the points in full. Each
+    diff is a pair of set operations between the history table's open rows
+    and the current rows. Returns {table: (rows closed, rows opened)}.
+    """
+    if as_of is None:
+        as_of = datetime.datetime.utcnow().isoformat(timespec="milliseconds")
+    counts = {}
+    with db:
+        for sql in HISTORY_INDEX_SQL:
+            db.execute(sql)
+        db.execute("CREATE TEMP TABLE changed_cables (code TEXT PRIMARY KEY)")
+        db.execute(CHANGED_CABLES_SQL)
+
+        for table, (key, columns, select, by_cable) in HISTORY_TABLES.items():
+            all_columns = key + columns
+            names = ", ".join(all_columns)
+            # IS rather than = so NULLs (missing urls, lengths, ...) compare equal.
+            same = " AND ".join(f"{table}.{c} IS n.{c}" for c in all_columns)
+            only_changed = ""
+            if by_cable:
+                select += " WHERE c.code IN temp.changed_cables"
+                only_changed = f"AND {key[0]} IN temp.changed_cables"
+
+            db.execute(f"CREATE TEMP TABLE new_rows ({names})")
+            db.execute(f"INSERT INTO temp.new_rows {select}")
+            db.execute(f"CREATE INDEX temp.new_rows_idx ON new_rows({', '.join(key)})")
+
+            closed = db.execute(f"""UPDATE {table} SET valid_to = ?
+                WHERE valid_to = ? {only_changed} AND NOT EXISTS (
+                    SELECT 1 FROM temp.new_rows n WHERE {same})""",
+                [as_of, OPEN_ENDED]).rowcount
+            opened = db.execute(f"""INSERT INTO {table} ({names}, valid_from, valid_to)
+                SELECT {names}, ?, ? FROM temp.new_rows n
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {table} WHERE {table}.valid_to = ? AND {same})""",
+                [as_of, OPEN_ENDED, OPEN_ENDED]).rowcount
+            db.execute("DROP TABLE temp.new_rows")
+            counts[table] = (closed, opened)
+        db.execute("DROP TABLE temp.changed_cables")
+    return counts
@@ -0,0 +1,102 @@
+"""
+Load tests the scraper against a local stand-in for submarinecablemap.com.
+
+Starts scm_stub_server.py's server on a free port, runs scm_scraper() against
+it and reports
+
+    throughput     server requests per second and cables per second
+    latency        p50/p90/p95/p99/max server-side response times
+                   (injected delay included)
+    faults         status codes served and faults injected
+    completeness   cables requested, fetched, lost and identical to the
+                   served snapshot, plus the scraper's retry and limiter counts
+
+Run from the project root, e.g.
+
+    python3 update/load_test_scraper.py --scale 10 --p429 0.02 --p503 0.01 \\
+        --truncate 0.005 --reset 0.005 --output load_test.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from scm_stub_server import add_server_arguments, server_options, start_stub_server
+from scrapers.scm_scraper import scm_scraper
+
+
+def load_test(snapshot, scraper_options=None, **options):
+    """Scrape snapshot from a local stub server and return the load test report.
+
+    options go to StubServer (latency, p429, ...) and scraper_options to
+    scm_scraper() (max_concurrency, retry_budget, ...).
+    """
+    server = start_stub_server(snapshot, **options)
+    scrape_report = {}
+    try:
+        start = time.perf_counter()
+        cables = scm_scraper(base_url=server.base_url, report=scrape_report,
+                             **(scraper_options or {}))
+        elapsed = time.perf_counter() - start
+        server_stats = server.stats()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    identical = sum(1 for name, data in cables.items() if snapshot.get(name) == data)
+    missing = sorted(set(snapshot) - set(cables))
+    return {
+        "elapsed": elapsed,
+        "cables_per_second": len(cables) / elapsed if elapsed else 0.0,
+        "server": server_stats,
+        "completeness": {
+            "served": len(snapshot),
+            "requested": scrape_report.get("requested", 0),
+            "fetched": scrape_report.get("fetched", 0),
+            "lost": scrape_report.get("lost", 0),
+            "identical": identical,
+            "complete": identical == len(snapshot),
+            "missing": missing[:20],
+        },
+        "scraper": {key: scrape_report.get(key) for key in (
+            "retried", "retries", "final_concurrency", "peak_concurrency",
+            "final_rate", "rate_decreases", "cable_request_time")},
+        "server_options": dict(options),
+    }
+
+
+def print_report(report):
+    server = report["server"]
+    completeness = report["completeness"]
+    print(f"Scraped {completeness['fetched']} of {completeness['served']} cables "
+          f"in {report['elapsed']:.2f} s ({report['cables_per_second']:.1f} cables/s).")
+    print(f"Server: {server['requests']} requests, {server['requests_per_second']:.1f} requests/s, "
+          f"status {server['status']}, faults {server['faults']}.")
+    print("Latency: " + ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in server["latency"].items()))
+    print(f"Scraper: {report['scraper']}")
+    if completeness["complete"]:
+        print("Complete: every served cable was scraped unchanged.")
+    else:
+        print(f"INCOMPLETE: {completeness['served'] - completeness['identical']} cables "
+              f"missing or different, e.g. {completeness['missing']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test the scraper against a local SCM stub server.")
+    add_server_arguments(parser)
+    parser.add_argument("--max-concurrency", type=int, default=250)
+    parser.add_argument("--max-rate", type=float, default=250)
+    parser.add_argument("--retry-budget", type=float, default=120)
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    snapshot, options = server_options(args)
+    report = load_test(snapshot, {"max_concurrency": args.max_concurrency,
+                                  "max_rate": args.max_rate,
+                                  "retry_budget": args.retry_budget}, **options)
+    print_report(report)
+    if args.output:
+        output = Path(args.output).absolute()
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "wt", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"Wrote load test report to {output}.")
@@ -0,0 +1,196 @@
+"""Streams scraped cables straight into the database.
+
+update_db() normally runs in phases: scrape everything, dump it to JSON,
+re-read and parse it, then write the database. stream_update() instead runs
+three stages at once, connected by bounded queues:
+
+    scrape_stream() --> parse (CableParser) --> write (SQLite + snapshot file)
+
+The writer runs in a worker thread, so SQLite inserts overlap with the
+network fan-out, and the bounded queues keep memory flat no matter how
+many cables there are.
+"""
+import asyncio
+import time
+from json import dumps
+from pathlib import Path
+from clean_data import CableParser
+from generations import publish_generation
+from snapshot_format import SnapshotWriter, is_ndjson
+from scrapers.registry import check_complete, scrape_stream
+from search import index_cables
+from write_db import (create_tables, finish_bulk_load, insert_rows, open_db, previous_ids,
+                      scratch_path, set_bulk_load_pragmas, update_geo, update_history, write_meta)
+
+
+# Marks the end of a queue.
+_DONE = object()
+
+
+class SnapshotStreamWriter:
+    """Writes the cables dict to a JSON file one cable at a time.
+
+    The output loads with json.load() into the same dict scm_scraper()
+    returns, though keys are in arrival order rather than sorted.
+    """
+    def __init__(self, path):
+        self.path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "wt", encoding="utf-8")
+        self.file.write("{")
+        self.first = True
+
+    def write(self, cable_name, cable_data):
+        if not self.first:
+            self.file.write(",")
+        self.first = False
+        self.file.write("\n    " + dumps(cable_name, ensure_ascii=False)
+                        + ": " + dumps(cable_data, ensure_ascii=False, sort_keys=True))
+
+    def close(self):
+        self.file.write("\n}\n")
+        self.file.close()
+
+
+async def _stream_update(db_path, snapshot_path, manifest, as_of, queue_size, batch_size, resolver,
+                         scraper_kwargs, stats):
+    # Build into a temporary file so readers never see a half-written database.
+    tmp_db_path = scratch_path(db_path)
+    db = open_db(tmp_db_path, check_same_thread=False)
+    cur = db.cursor()
+    snapshot = None
+
+    parse_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    # Cables and entities the replaced database has keep their ids.
+    parser = CableParser(collect=False, resolver=resolver, ids=previous_ids(db_path))
+
+    async def scrape():
+        async for cable in scrape_stream(**scraper_kwargs):
+            await parse_queue.put(cable)
+        await parse_queue.put(_DONE)
+
+    async def parse():
+        # Group parsed cables into batches so each trip to the writer
+        # thread carries enough work to be worth it.
+        batch = []
+        while (cable := await parse_queue.get()) is not _DONE:
+            cable_name, cable_data = cable
+            batch.append((cable_name, cable_data, parser.parse_cable(cable_name, cable_data)))
+            if len(batch) >= batch_size:
+                await write_queue.put(batch)
+                batch = []
+        if batch:
+            await write_queue.put(batch)
+        await write_queue.put(_DONE)
+
+    def write_batch(batch):
+        for cable_name, cable_data, rows in batch:
+            insert_rows(cur, rows)
+            for table, table_rows in rows.items():
+                stats["rows"][table] = stats["rows"].get(table, 0) + len(table_rows)
+            if snapshot:
+                snapshot.write(cable_name, cable_data)
+            if manifest:
+                manifest.add(cable_name, cable_data)
+        db.commit()
+
+    # The batch the writer thread is inserting, if any.
+    writing = None
+
+    async def write():
+        nonlocal writing
+        loop = asyncio.get_running_loop()
+        while (batch := await write_queue.get()) is not _DONE:
+            # Shielded: cancelling write() can't stop the thread, so the
+            # batch is left to finish and awaited before db is closed.
+            writing = loop.run_in_executor(None, write_batch, batch)
+            await asyncio.shield(writing)
+            stats["cables"] += len(batch)
+
+    stages = []
+    try:
+        set_bulk_load_pragmas(db)
+        create_tables(cur)
+        if snapshot_path:
+            # Compact snapshots append natively; JSON ones are streamed as one object.
+            writer = SnapshotWriter if is_ndjson(snapshot_path) else SnapshotStreamWriter
+            snapshot = writer(snapshot_path)
+
+        stages = [asyncio.create_task(stage()) for stage in (scrape, parse, write)]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            # If a stage failed, stop the others and let the writer thread
+            # finish with the connection.
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            if writing:
+                await asyncio.gather(writing, return_exceptions=True)
+        report = scraper_kwargs["report"]
+        # Lost cables would be recorded as removed; don't publish without them.
+        check_complete(report)
+
+        # Carry over the replaced database's history and add this run to it.
+        update_history(db, db_path, as_of)
+        update_geo(db, db_path, scraper_kwargs.get("geo"))
+        with db:
+            index_cables(db.cursor())
+        write_meta(db, creation_time=report.get("creation_time"))
+        # Indexes are built once at the end, not maintained during the load.
+        finish_bulk_load(db)
+        db.close()
+        if manifest:
+            manifest.close(creation_time=report.get("creation_time"))
+        publish_generation(db_path, tmp_db_path)
+    except BaseException:
+        db.close()
+        tmp_db_path.unlink(missing_ok=True)
+        raise
+    finally:
+        if snapshot:
+            snapshot.close()
+
+
+def stream_update(
+    db_path="./update/db/scn.db",
+    snapshot_path=None,
+    manifest=None,
+    as_of=None,
+    queue_size=64,
+    batch_size=32,
+    resolver=None,
+    **scraper_kwargs
+    ):
+    """Scrape, parse and write the database in one overlapping pass.
+
+    Publishes the new database as db_path's next generation (see
+    generations.py) once every cable is written. If
+    snapshot_path is given, the scraped cables are also written there, in
+    the compact format if it ends in .ndjson.gz and as JSON otherwise. If
+    manifest (a snapshot_store.ManifestWriter) is given, the cables are
+    added to the snapshot store as well. The replaced database's history
+    tables are carried over, with this run recorded in them as of as_of
+    (default now). Owners and suppliers are canonicalized with resolver, if
+    given (see entities.py). scraper_kwargs are passed on to
+    scrapers.registry.scrape_stream(), e.g. sites, logger, incremental,
+    report, metrics or geo; the geometry fetched into geo replaces the old
+    database's.
+
+    If any cable couldn't be fetched, raises
+    scrapers.registry.IncompleteScrapeError instead of publishing the
+    database or storing the snapshot.
+
+    Returns a dict with the number of cables written, the number of rows
+    written to each table and the elapsed time.
+    """
+    db_path = Path(db_path).absolute()
+    if scraper_kwargs.get("report") is None:
+        scraper_kwargs["report"] = {}
+    stats = {"cables": 0, "rows": {}}
+    start = time.perf_counter()
+    asyncio.run(_stream_update(db_path, snapshot_path, manifest, as_of, queue_size, batch_size,
+                               resolver, scraper_kwargs, stats))
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
@@ -0,0 +1,746 @@
+"""Read API over the cable database written by write_db().
+
+    from query import cables_by_country, landing_points
+
+    for cable in cables_by_country("Portugal"):
+        print(cable.name, [p.name for p in landing_points(cable.code)])
+
+Every function takes an optional db_path and returns a tuple of named
+tuples. Connections are opened read-only and pooled (up to POOL_SIZE per
+database, so that many queries can run at once from different threads),
+and the SQL strings are constants so sqlite3's statement cache keeps them
+prepared. Results are kept in an LRU cache that is dropped as soon as the
+database file is replaced or modified (a new "generation").
+
+The *_as_of() functions answer the same questions for any past moment, and
+cable_history()/cables_between()/cable_changes_between() look across time,
+all from the history tables (see history.py). Times are datetimes, dates or
+ISO strings in UTC; versions that are still current have valid_to None.
+
+    for cable in cables_by_country_as_of("Portugal", "2025-06-01"):
+        print(cable.name, cable.valid_from)
+
+The spatial queries use the R*Trees over the landing point and cable
+geometry (see geo.py). Boxes are (min_lon, min_lat, max_lon, max_lat) in
+degrees, with min_lon > max_lon for a box across the antimeridian; radii
+are great-circle kilometres.
+
+    for point in points_within(-9.14, 38.72, 200):    # near Lisbon
+        print(point.name, round(point.distance_km))
+
+search_cables() is ranked full-text search over cable names, codes,
+owners, suppliers, landing points, countries and notes (see search.py).
+Every word is matched as a word prefix:
+
+    for hit in search_cables("atlantic tele"):
+        print(hit.cable.name, hit.score, dict(hit.matches))
+
+Owners and suppliers are stored under their canonical names (see
+entities.py), but the lookups by owner or supplier name take any of their
+aliases too, and owner_totals()/supplier_totals() count each entity once.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from generations import hold_generation
+from geo import haversine_km, line_hits_box, radius_boxes
+from history import OPEN_ENDED
+from search import SEARCH_FIELDS, ensure_indexed, match_query
+from write_db import create_indexes, create_tables, open_db
+
+
+DEFAULT_DB_PATH = "./update/db/scn.db"
+CACHE_SIZE = 1024
+# Most read-only connections open at once per database.
+POOL_SIZE = 4
+
+Cable = namedtuple("Cable", ["id", "name", "code", "url", "length",
+                             "rfs_year", "rfs_text", "planned", "notes"])
+Point = namedtuple("Point", ["id", "code", "name", "country"])
+Country = namedtuple("Country", ["id", "name"])
+Owner = namedtuple("Owner", ["id", "name"])
+Supplier = namedtuple("Supplier", ["id", "name"])
+# An owner's or supplier's number of cables and their total length in km.
+EntityTotals = namedtuple("EntityTotals", ["id", "name", "cables", "length"])
+Alias = namedtuple("Alias", ["alias", "name"])
+DbInfo = namedtuple("DbInfo", ["generation", "creation_time"])
+_MetaValue = namedtuple("_MetaValue", ["value"])
+CableVersion = namedtuple("CableVersion", ["code", "name", "url", "length", "rfs_year", "rfs_text",
+                                           "planned", "notes", "valid_from", "valid_to"])
+PointVersion = namedtuple("PointVersion", ["code", "name", "country", "valid_from", "valid_to"])
+PointLocation = namedtuple("PointLocation", ["code", "name", "longitude", "latitude"])
+NearbyPoint = namedtuple("NearbyPoint", ["code", "name", "longitude", "latitude", "distance_km"])
+SearchHit = namedtuple("SearchHit", ["cable", "score", "matches"])
+# A search result row: the cable, its score and each field highlighted.
+_SearchRow = namedtuple("_SearchRow", Cable._fields + ("score",)
+                        + tuple("matched_" + field for field in SEARCH_FIELDS))
+
+def _canonical(kind, name="?1"):
+    """SQL for the canonical name of the owner or supplier (kind) called name (see entities.py)."""
+    return f"coalesce((SELECT name FROM {kind}_alias WHERE alias = {name}), {name})"
+
+
+def _all_names(kind, name="?1"):
+    """SQL for every name (canonical or alias) of the owner or supplier called name."""
+    return f"(SELECT {_canonical(kind, name)} UNION SELECT alias FROM {kind}_alias WHERE name = {_canonical(kind, name)})"
+
+
+CABLE_COLUMNS = "c.id, c.name, c.code, c.url, c.length, c.rfs_year, c.rfs_text, c.planned, c.notes"
+
+CABLES_BY_COUNTRY_SQL = f"""
+    SELECT DISTINCT {CABLE_COLUMNS}
+    FROM country k
+    JOIN point p ON p.country_id = k.id
+    JOIN cable_point cp ON cp.point_id = p.id
+    JOIN cable c ON c.id = cp.cable_id
+    WHERE k.name = ?
+    ORDER BY c.name"""
+
+LANDING_POINTS_SQL = """
+    SELECT DISTINCT p.id, p.code, p.name, k.name
+    FROM cable c
+    JOIN cable_point cp ON cp.cable_id = c.id
+    JOIN point p ON p.id = cp.point_id
+    JOIN country k ON k.id = p.country_id
+    WHERE c.code = ?
+    ORDER BY p.name"""
+
+CABLES_BY_OWNER_SQL = f"""
+    SELECT DISTINCT {CABLE_COLUMNS}
+    FROM owner o
+    JOIN cable_owner co ON co.owner_id = o.id
+    JOIN cable c ON c.id = co.cable_id
+    WHERE o.name = {_canonical("owner")}
+    ORDER BY c.name"""
+
+CABLES_BY_SUPPLIER_SQL = f"""
+    SELECT DISTINCT {CABLE_COLUMNS}
+    FROM supplier s
+    JOIN cable_supplier cs ON cs.supplier_id = s.id
+    JOIN cable c ON c.id = cs.cable_id
+    WHERE s.name = {_canonical("supplier")}
+    ORDER BY c.name"""
+
+COUNTRIES_OF_CABLE_SQL = """
+    SELECT DISTINCT k.id, k.name
+    FROM cable c
+    JOIN cable_point cp ON cp.cable_id = c.id
+    JOIN point p ON p.id = cp.point_id
+    JOIN country k ON k.id = p.country_id
+    WHERE c.code = ?
+    ORDER BY k.name"""
+
+CABLE_SQL = f"""
+    SELECT {CABLE_COLUMNS}
+    FROM cable c
+    WHERE c.code = ?"""
+
+OWNERS_OF_CABLE_SQL = """
+    SELECT DISTINCT o.id, o.name
+    FROM cable c
+    JOIN cable_owner co ON co.cable_id = c.id
+    JOIN owner o ON o.id = co.owner_id
+    WHERE c.code = ?
+    ORDER BY o.name"""
+
+SUPPLIERS_OF_CABLE_SQL = """
+    SELECT DISTINCT s.id, s.name
+    FROM cable c
+    JOIN cable_supplier cs ON cs.cable_id = c.id
+    JOIN supplier s ON s.id = cs.supplier_id
+    WHERE c.code = ?
+    ORDER BY s.name"""
+
+POINT_SQL = """
+    SELECT p.id, p.code, p.name, k.name
+    FROM point p
+    JOIN country k ON k.id = p.country_id
+    WHERE p.code = ?"""
+
+CABLES_AT_POINT_SQL = f"""
+    SELECT DISTINCT {CABLE_COLUMNS}
+    FROM point p
+    JOIN cable_point cp ON cp.point_id = p.id
+    JOIN cable c ON c.id = cp.cable_id
+    WHERE p.code = ?
+    ORDER BY c.name"""
+
+POINTS_IN_COUNTRY_SQL = """
+    SELECT p.id, p.code, p.name, k.name
+    FROM country k
+    JOIN point p ON p.country_id = k.id
+    WHERE k.name = ?
+    ORDER BY p.name"""
+
+# Whole tables, in name order.
+ALL_CABLES_SQL = f"SELECT {CABLE_COLUMNS} FROM cable c ORDER BY c.name"
+ALL_POINTS_SQL = """
+    SELECT p.id, p.code, p.name, k.name
+    FROM point p
+    JOIN country k ON k.id = p.country_id
+    ORDER BY p.name"""
+ALL_COUNTRIES_SQL = "SELECT id, name FROM country ORDER BY name"
+ALL_OWNERS_SQL = "SELECT id, name FROM owner ORDER BY name"
+ALL_SUPPLIERS_SQL = "SELECT id, name FROM supplier ORDER BY name"
+
+
+def _totals(kind, link_table):
+    """SQL for each owner's or supplier's number of cables and their total length, most cables first."""
+    return f"""
+    SELECT e.id, e.name, count(*), total(c.length)
+    FROM {kind} e
+    JOIN (SELECT DISTINCT {kind}_id, cable_id FROM {link_table}) x ON x.{kind}_id = e.id
+    JOIN cable c ON c.id = x.cable_id
+    GROUP BY e.id
+    ORDER BY count(*) DESC, e.name"""
+
+
+OWNER_TOTALS_SQL = _totals("owner", "cable_owner")
+SUPPLIER_TOTALS_SQL = _totals("supplier", "cable_supplier")
+ALIASES_SQL = {kind: f"""
+    SELECT alias, name FROM {kind}_alias
+    WHERE name = {_canonical(kind)}
+    ORDER BY alias""" for kind in ("owner", "supplier")}
+
+DB_META_SQL = "SELECT value FROM db_meta WHERE key = ?"
+
+# History queries. ?1 is the time (or the start of the time range), ?2 the
+# name or code looked up, or the end of the range.
+CABLE_VERSION_COLUMNS = f"""c.code, c.name, c.url, c.length, c.rfs_year, c.rfs_text, c.planned,
+    c.notes, c.valid_from, NULLIF(c.valid_to, '{OPEN_ENDED}')"""
+
+
+def _valid_at(alias, when="?1"):
+    return f"{alias}.valid_from <= {when} AND {alias}.valid_to > {when}"
+
+
+CABLES_AS_OF_SQL = f"""
+    SELECT {CABLE_VERSION_COLUMNS}
+    FROM cable_history c
+    WHERE {_valid_at("c")}
+    ORDER BY c.name"""
+
+CABLE_AS_OF_SQL = f"""
+    SELECT {CABLE_VERSION_COLUMNS}
+    FROM cable_history c
+    WHERE c.code = ?2 AND {_valid_at("c")}"""
+
+LANDING_POINTS_AS_OF_SQL = f"""
+    SELECT DISTINCT p.code, p.name, p.country, p.valid_from, NULLIF(p.valid_to, '{OPEN_ENDED}')
+    FROM cable_point_history x
+    JOIN point_history p ON p.code = x.point_code AND {_valid_at("p")}
+    WHERE x.cable_code = ?2 AND {_valid_at("x")}
+    ORDER BY p.name"""
+
+CABLES_BY_COUNTRY_AS_OF_SQL = f"""
+    SELECT DISTINCT {CABLE_VERSION_COLUMNS}
+    FROM point_history p
+    JOIN cable_point_history x ON x.point_code = p.code AND {_valid_at("x")}
+    JOIN cable_history c ON c.code = x.cable_code AND {_valid_at("c")}
+    WHERE p.country = ?2 AND {_valid_at("p")}
+    ORDER BY c.name"""
+
+CABLES_BY_OWNER_AS_OF_SQL = f"""
+    SELECT DISTINCT {CABLE_VERSION_COLUMNS}
+    FROM cable_owner_history o
+    JOIN cable_history c ON c.code = o.cable_code AND {_valid_at("c")}
+    WHERE o.owner IN {_all_names("owner", "?2")} AND {_valid_at("o")}
+    ORDER BY c.name"""
+
+CABLE_HISTORY_SQL = f"""
+    SELECT {CABLE_VERSION_COLUMNS}
+    FROM cable_history c
+    WHERE c.code = ?
+    ORDER BY c.valid_from"""
+
+CABLES_BETWEEN_SQL = f"""
+    SELECT {CABLE_VERSION_COLUMNS}
+    FROM cable_history c
+    WHERE c.valid_from < ?2 AND c.valid_to > ?1
+    ORDER BY c.code, c.valid_from"""
+
+CABLE_CHANGES_BETWEEN_SQL = f"""
+    SELECT {CABLE_VERSION_COLUMNS}
+    FROM cable_history c
+    WHERE c.valid_from >= ?1 AND c.valid_from < ?2
+    UNION
+    SELECT {CABLE_VERSION_COLUMNS}
+    FROM cable_history c
+    WHERE c.valid_to >= ?1 AND c.valid_to < ?2
+    ORDER BY 1, 9"""
+
+
+# Spatial queries. ?1-?4 are the box (min_lon, min_lat, max_lon, max_lat)
+# the R*Tree narrows the search to; ?5-?7 the longitude, latitude and
+# radius the candidates are then checked against.
+def _in_box(alias):
+    return f"{alias}.min_lon <= ?3 AND {alias}.max_lon >= ?1 AND {alias}.min_lat <= ?4 AND {alias}.max_lat >= ?2"
+
+
+_DISTANCE = "haversine_km(?5, ?6, g.longitude, g.latitude)"
+
+POINT_LOCATION_SQL = """
+    SELECT g.code, g.name, g.longitude, g.latitude
+    FROM point_geo g
+    WHERE g.code = ?"""
+
+POINTS_IN_BOX_SQL = f"""
+    SELECT g.code, g.name, g.longitude, g.latitude
+    FROM point_rtree r
+    JOIN point_geo g ON g.id = r.id
+    WHERE {_in_box("r")}"""
+
+POINTS_WITHIN_SQL = f"""
+    SELECT g.code, g.name, g.longitude, g.latitude, {_DISTANCE}
+    FROM point_rtree r
+    JOIN point_geo g ON g.id = r.id
+    WHERE {_in_box("r")} AND {_DISTANCE} <= ?7"""
+
+CABLES_IN_BOX_SQL = f"""
+    SELECT {CABLE_COLUMNS}
+    FROM cable c
+    WHERE c.code IN (
+        SELECT s.cable_code
+        FROM cable_segment_rtree r
+        JOIN cable_segment s ON s.id = r.id
+        WHERE {_in_box("r")} AND line_hits_box(s.coordinates, ?1, ?2, ?3, ?4))"""
+
+CABLES_LANDING_WITHIN_SQL = f"""
+    SELECT DISTINCT {CABLE_COLUMNS}
+    FROM point_rtree r
+    JOIN point_geo g ON g.id = r.id
+    JOIN point p ON p.code = g.code
+    JOIN cable_point cp ON cp.point_id = p.id
+    JOIN cable c ON c.id = cp.cable_id
+    WHERE {_in_box("r")} AND {_DISTANCE} <= ?7"""
+
+
+# Full-text search. ?1 is the FTS5 query, ?2 the number of results and ?3
+# the text searched for, so a cable it names exactly comes first. Matches
+# are highlighted between the \x02 and \x03 control characters, which
+# search_cables() swaps for the caller's markers.
+SEARCH_SQL = f"""
+    SELECT {CABLE_COLUMNS}, -bm25(cable_fts, {", ".join(map(str, SEARCH_FIELDS.values()))}) AS score,
+        {", ".join(f"highlight(cable_fts, {i}, char(2), char(3))" for i in range(len(SEARCH_FIELDS)))}
+    FROM cable_fts
+    JOIN cable c ON c.id = cable_fts.rowid
+    WHERE cable_fts MATCH ?1
+    ORDER BY c.code = ?3 OR c.name = ?3 COLLATE NOCASE DESC, score DESC, c.name
+    LIMIT ?2"""
+
+
+# Per database path: the _Pool of connections to its current generation.
+_pools = {}
+_pools_lock = threading.Lock()
+# (db_path, sql, args) -> result, in least- to most-recently used order.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def db_generation(db_path):
+    """Identify the current generation of the database file at db_path.
+
+    write_db() publishes every update as a new file (new inode, see
+    generations.py), so that changes the generation. Writes made in place
+    go to the -wal file first and only reach the database file at a
+    checkpoint, so the -wal file's mtime and size are part of it too (an
+    empty one, as readers leave, counts as none).
+    """
+    db_file = os.path.realpath(db_path)
+    st = os.stat(db_file)
+    try:
+        wal = os.stat(db_file + "-wal")
+    except FileNotFoundError:
+        wal = None
+    if not wal or not wal.st_size:
+        return (st.st_ino, st.st_mtime_ns, st.st_size, None, None)
+    return (st.st_ino, st.st_mtime_ns, st.st_size, wal.st_mtime_ns, wal.st_size)
+
+
+def _open_read_only(db_path):
+    sqlite3.register_converter("BOOLEAN", lambda v: v != b'0')
+    db = sqlite3.connect(
+        f"{db_path.as_uri()}?mode=ro",
+        uri=True,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,
+        cached_statements=256,
+        )
+    # The exact tests applied to the spatial queries' R*Tree candidates.
+    db.create_function("haversine_km", 4, haversine_km, deterministic=True)
+    db.create_function("line_hits_box", 5, line_hits_box, deterministic=True)
+    return db
+
+
+class _Pool:
+    """Read-only connections to one generation of a database, one per running query.
+
+    Connections are opened as needed, up to size; past that, acquire()
+    waits for one to be released. Once the pool is closed (the database
+    has a new generation), released connections are closed instead of
+    being reused.
+
+    The pool resolves db_path to the generation file once, so all its
+    connections read the same one, and holds that generation's reader lock
+    until its last connection is closed, so generations.collect_garbage()
+    leaves the file alone until then.
+    """
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path, self.reader_lock = hold_generation(db_path)
+        self.generation = db_generation(self.db_path)
+        self.size = size
+        self.idle = []
+        self.opened = 0
+        self.closed = False
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            self._condition.wait_for(lambda: self.idle or self.opened < self.size)
+            if self.idle:
+                return self.idle.pop()
+            self.opened += 1
+        try:
+            return _open_read_only(self.db_path)
+        except BaseException:
+            self._forget()
+            raise
+
+    def release(self, db):
+        with self._condition:
+            if not self.closed:
+                self.idle.append(db)
+                self._condition.notify()
+                return
+        db.close()
+        self._forget()
+
+    def _forget(self):
+        with self._condition:
+            self.opened -= 1
+            self._condition.notify()
+        self._release_if_drained()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.opened -= len(idle)
+            self._condition.notify_all()
+        for db in idle:
+            db.close()
+        self._release_if_drained()
+
+    def _release_if_drained(self):
+        with self._condition:
+            if not self.closed or self.opened or self.reader_lock is None:
+                return
+            lock, self.reader_lock = self.reader_lock, None
+        lock.close()
+
+
+def _pool(db_path):
+    """Return the _Pool for db_path's current generation, replacing the pool of an older one."""
+    generation = db_generation(db_path)
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None or pool.generation != generation:
+            if pool is not None:
+                pool.close()
+            # If db_path moved on again since the stat above, the pool's
+            # generation won't match the next one and it is replaced then.
+            pool = _Pool(db_path)
+            _pools[db_path] = pool
+            _invalidate(db_path)
+    return pool
+
+
+def _invalidate(db_path):
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == db_path]:
+            del _cache[key]
+
+
+def clear_cache():
+    """Drop every cached result and close every idle connection."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+    with _cache_lock:
+        _cache.clear()
+
+
+def _run(db_path, sql, args, row_type):
+    # Not resolved: db_path is a symlink to the current generation.
+    db_path = Path(db_path).absolute()
+    pool = _pool(db_path)
+    # Keyed by the generation the result is read from, so a result read
+    # while the database moves on is never served for the newer generation.
+    key = (db_path, pool.generation, sql, args)
+
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    db = pool.acquire()
+    try:
+        result = tuple(row_type._make(row) for row in db.execute(sql, args))
+    finally:
+        pool.release(db)
+
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def ensure_indexes(db_path=DEFAULT_DB_PATH):
+    """Add the query and search indexes to a database written before they existed.
+
+    Databases written by write_db() already have them.
+    """
+    db = open_db(db_path)
+    with db:
+        # The history indexes need the history tables.
+        create_tables(db.cursor())
+        create_indexes(db.cursor())
+        ensure_indexed(db.cursor())
+    db.close()
+
+
+def cables_by_country(country, db_path=DEFAULT_DB_PATH):
+    """Cables with at least one landing point in country (by name)."""
+    return _run(db_path, CABLES_BY_COUNTRY_SQL, (country,), Cable)
+
+
+def landing_points(cable_code, db_path=DEFAULT_DB_PATH):
+    """Landing points of the cable with code cable_code."""
+    return _run(db_path, LANDING_POINTS_SQL, (cable_code,), Point)
+
+
+def cables_by_owner(owner, db_path=DEFAULT_DB_PATH):
+    """Cables owned (at least partly) by owner (by name or any of its aliases)."""
+    return _run(db_path, CABLES_BY_OWNER_SQL, (owner,), Cable)
+
+
+def cables_by_supplier(supplier, db_path=DEFAULT_DB_PATH):
+    """Cables built by supplier (by name or any of its aliases)."""
+    return _run(db_path, CABLES_BY_SUPPLIER_SQL, (supplier,), Cable)
+
+
+def countries_connected_by(cable_code, db_path=DEFAULT_DB_PATH):
+    """Countries the cable with code cable_code lands in."""
+    return _run(db_path, COUNTRIES_OF_CABLE_SQL, (cable_code,), Country)
+
+
+def get_cable(cable_code, db_path=DEFAULT_DB_PATH):
+    """The cable with code cable_code, or None."""
+    result = _run(db_path, CABLE_SQL, (cable_code,), Cable)
+    return result[0] if result else None
+
+
+def owners_of(cable_code, db_path=DEFAULT_DB_PATH):
+    """Owners of the cable with code cable_code."""
+    return _run(db_path, OWNERS_OF_CABLE_SQL, (cable_code,), Owner)
+
+
+def suppliers_of(cable_code, db_path=DEFAULT_DB_PATH):
+    """Suppliers of the cable with code cable_code."""
+    return _run(db_path, SUPPLIERS_OF_CABLE_SQL, (cable_code,), Supplier)
+
+
+def get_point(point_code, db_path=DEFAULT_DB_PATH):
+    """The landing point with code point_code, or None."""
+    result = _run(db_path, POINT_SQL, (point_code,), Point)
+    return result[0] if result else None
+
+
+def cables_at_point(point_code, db_path=DEFAULT_DB_PATH):
+    """Cables landing at the landing point with code point_code."""
+    return _run(db_path, CABLES_AT_POINT_SQL, (point_code,), Cable)
+
+
+def points_in_country(country, db_path=DEFAULT_DB_PATH):
+    """Landing points in country (by name)."""
+    return _run(db_path, POINTS_IN_COUNTRY_SQL, (country,), Point)
+
+
+def all_cables(db_path=DEFAULT_DB_PATH):
+    """Every cable, by name."""
+    return _run(db_path, ALL_CABLES_SQL, (), Cable)
+
+
+def all_points(db_path=DEFAULT_DB_PATH):
+    """Every landing point, by name."""
+    return _run(db_path, ALL_POINTS_SQL, (), Point)
+
+
+def all_countries(db_path=DEFAULT_DB_PATH):
+    """Every country, by name."""
+    return _run(db_path, ALL_COUNTRIES_SQL, (), Country)
+
+
+def all_owners(db_path=DEFAULT_DB_PATH):
+    """Every owner, by name."""
+    return _run(db_path, ALL_OWNERS_SQL, (), Owner)
+
+
+def all_suppliers(db_path=DEFAULT_DB_PATH):
+    """Every supplier, by name."""
+    return _run(db_path, ALL_SUPPLIERS_SQL, (), Supplier)
+
+
+def owner_totals(db_path=DEFAULT_DB_PATH):
+    """Every owner with its number of cables and their total length, most cables first."""
+    return _run(db_path, OWNER_TOTALS_SQL, (), EntityTotals)
+
+
+def supplier_totals(db_path=DEFAULT_DB_PATH):
+    """Every supplier with its number of cables and their total length, most cables first."""
+    return _run(db_path, SUPPLIER_TOTALS_SQL, (), EntityTotals)
+
+
+def aliases_of(kind, name, db_path=DEFAULT_DB_PATH):
+    """The other names the owner or supplier (kind, "owner" or "supplier") called name was seen under."""
+    return _run(db_path, ALIASES_SQL[kind], (name,), Alias)
+
+
+def db_info(db_path=DEFAULT_DB_PATH):
+    """The database's generation and the creation_time of the data in it.
+
+    creation_time is the upstream data version the scraper saw (see
+    write_db.write_meta()); None for databases written without one.
+    """
+    generation = db_generation(Path(db_path).absolute())
+    try:
+        rows = _run(db_path, DB_META_SQL, ("creation_time",), _MetaValue)
+    except sqlite3.OperationalError:
+        # A database from before db_meta existed.
+        rows = ()
+    return DbInfo(generation, rows[0].value if rows else None)
+
+
+def _timestamp(when):
+    """An ISO string comparable with the history tables' valid_from/valid_to."""
+    if isinstance(when, datetime.datetime):
+        return when.isoformat(timespec="milliseconds")
+    if isinstance(when, datetime.date):
+        return when.isoformat()
+    return str(when)
+
+
+def cables_as_of(when, db_path=DEFAULT_DB_PATH):
+    """Every cable as it was at when."""
+    return _run(db_path, CABLES_AS_OF_SQL, (_timestamp(when),), CableVersion)
+
+
+def get_cable_as_of(cable_code, when, db_path=DEFAULT_DB_PATH):
+    """The cable with code cable_code as it was at when, or None."""
+    result = _run(db_path, CABLE_AS_OF_SQL, (_timestamp(when), cable_code), CableVersion)
+    return result[0] if result else None
+
+
+def landing_points_as_of(cable_code, when, db_path=DEFAULT_DB_PATH):
+    """Landing points of the cable with code cable_code at when."""
+    return _run(db_path, LANDING_POINTS_AS_OF_SQL, (_timestamp(when), cable_code), PointVersion)
+
+
+def cables_by_country_as_of(country, when, db_path=DEFAULT_DB_PATH):
+    """Cables with a landing point in country (by name) at when."""
+    return _run(db_path, CABLES_BY_COUNTRY_AS_OF_SQL, (_timestamp(when), country), CableVersion)
+
+
+def cables_by_owner_as_of(owner, when, db_path=DEFAULT_DB_PATH):
+    """Cables owned (at least partly) by owner (by name or any of its aliases) at when."""
+    return _run(db_path, CABLES_BY_OWNER_AS_OF_SQL, (_timestamp(when), owner), CableVersion)
+
+
+def cable_history(cable_code, db_path=DEFAULT_DB_PATH):
+    """Every version of the cable with code cable_code, oldest first."""
+    return _run(db_path, CABLE_HISTORY_SQL, (cable_code,), CableVersion)
+
+
+def cables_between(start, end, db_path=DEFAULT_DB_PATH):
+    """Every cable version that was valid at some time in [start, end)."""
+    return _run(db_path, CABLES_BETWEEN_SQL, (_timestamp(start), _timestamp(end)), CableVersion)
+
+
+def cable_changes_between(start, end, db_path=DEFAULT_DB_PATH):
+    """Cable versions that began or ended in [start, end): additions, edits and removals.
+    """
+    return _run(db_path, CABLE_CHANGES_BETWEEN_SQL, (_timestamp(start), _timestamp(end)), CableVersion)
+
+
+def _boxes(min_lon, min_lat, max_lon, max_lat):
+    """Split a box across the antimeridian (min_lon > max_lon) in two."""
+    if min_lon > max_lon:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+
+def _run_boxes(db_path, sql, boxes, args, row_type, key):
+    """Run sql once per box and merge the results, sorted by key."""
+    rows = set()
+    for box in boxes:
+        rows.update(_run(db_path, sql, tuple(box) + args, row_type))
+    return tuple(sorted(rows, key=key))
+
+
+def point_location(point_code, db_path=DEFAULT_DB_PATH):
+    """Where the landing point with code point_code is, or None."""
+    result = _run(db_path, POINT_LOCATION_SQL, (point_code,), PointLocation)
+    return result[0] if result else None
+
+
+def points_in_box(min_lon, min_lat, max_lon, max_lat, db_path=DEFAULT_DB_PATH):
+    """Landing points inside the box, by name."""
+    return _run_boxes(db_path, POINTS_IN_BOX_SQL, _boxes(min_lon, min_lat, max_lon, max_lat), (),
+                      PointLocation, lambda p: (p.name or "", p.code))
+
+
+def points_within(longitude, latitude, km, db_path=DEFAULT_DB_PATH):
+    """Landing points within km of (longitude, latitude), nearest first."""
+    return _run_boxes(db_path, POINTS_WITHIN_SQL, radius_boxes(longitude, latitude, km),
+                      (longitude, latitude, km), NearbyPoint, lambda p: (p.distance_km, p.code))
+
+
+def cables_in_box(min_lon, min_lat, max_lon, max_lat, db_path=DEFAULT_DB_PATH):
+    """Cables whose route passes through the box, by name."""
+    return _run_boxes(db_path, CABLES_IN_BOX_SQL, _boxes(min_lon, min_lat, max_lon, max_lat), (),
+                      Cable, lambda c: (c.name, c.code))
+
+
+def cables_landing_within(longitude, latitude, km, db_path=DEFAULT_DB_PATH):
+    """Cables with a landing point within km of (longitude, latitude), by name."""
+    return _run_boxes(db_path, CABLES_LANDING_WITHIN_SQL, radius_boxes(longitude, latitude, km),
+                      (longitude, latitude, km), Cable, lambda c: (c.name, c.code))
+
+
+def search_cables(text, fields=None, limit=20, mark=("[", "]"), db_path=DEFAULT_DB_PATH):
+    """Cables matching every word of text (as a word prefix), best match first.
+
+    A cable whose name or code is exactly text comes before the rest.
+    fields limits the search to some of search.SEARCH_FIELDS. Each
+    SearchHit has the Cable, its bm25 score (higher is better, name and
+    code weigh most) and matches: (field, text) pairs for the fields that
+    matched, with the matching words between the two mark strings.
+    A negative limit is a ValueError (SQLite would take it as no limit).
+    """
+    if limit < 0:
+        raise ValueError(f"Bad limit {limit}: must be 0 or more")
+    query = match_query(text, fields)
+    if query is None:
+        return ()
+    hits = []
+    for row in _run(db_path, SEARCH_SQL, (query, limit, text.strip()), _SearchRow):
+        matches = tuple((field, value.replace("\x02", mark[0]).replace("\x03", mark[1]))
+                        for field, value in zip(SEARCH_FIELDS, row[len(Cable._fields) + 1:])
+                        if value and "\x02" in value)
+        hits.append(SearchHit(Cable._make(row[:len(Cable._fields)]), row.score, matches))
+    return tuple(hits)
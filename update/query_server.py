@@ -0,0 +1,380 @@
+"""
+Local, read-only HTTP API over the cable database, for dashboards.
+
+Run it from the project root with
+
+    python3 update/query_server.py --db update/db/scn.db --port 8780
+
+It serves JSON at
+
+    /                               the database's generation and data creation_time
+    /cables                         every cable; filter with ?country=, ?owner= or ?supplier=,
+                                    or search with ?q= (and ?fields=name,owners&limit=20)
+    /cables/<code>                  a cable with its landing points, countries, owners and suppliers
+    /points                         every landing point; filter with ?country=
+    /points/<code>                  a landing point with the cables landing there
+    /countries                      every country
+    /countries/<name>               a country with its landing points and cables
+    /owners, /suppliers             every owner or supplier
+    /owners/<name>, /suppliers/<name>   an owner or supplier with its cables
+
+Queries go through query.py, on its pooled read-only connections, in
+worker threads so the event loop keeps serving while SQLite works.
+
+Every response from one generation of the database (query.db_generation())
+carries the same ETag, derived from the generation and the data's
+creation_time (query.db_info()). Response bodies are cached in memory by
+request target, so a repeat request is answered from the cache, and one
+with a matching If-None-Match gets a 304; neither reaches SQLite. Only
+targets that would return 200 get a 304, so a 404 or 400 is always sent in
+full. An endpoint failing in any other way gets a 500, with the error. A rebuild or incremental write makes a new generation, which changes
+the ETag and empties the cache. Concurrent requests for the same uncached target share
+one query. Bodies are gzipped for clients that accept it.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import re
+import sqlite3
+from collections import OrderedDict
+from json import dumps
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+import query
+
+
+DEFAULT_PORT = 8780
+# Response bodies kept in memory, by request target.
+CACHE_SIZE = 512
+# Bodies smaller than this are sent uncompressed.
+GZIP_MIN_SIZE = 1024
+# Longest request or header line accepted, in bytes.
+MAX_LINE = 8192
+# Seconds an idle keep-alive connection stays open.
+KEEPALIVE_TIMEOUT = 15.0
+
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+
+class NotFound(Exception):
+    """The cable, landing point, country, owner or supplier asked for doesn't exist."""
+
+
+def _rows(rows):
+    return [row._asdict() for row in rows]
+
+
+def _param(params, name, default=None):
+    """The last value of query parameter name."""
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+#### Endpoints: (db_path, query parameters, path parts) -> JSON-able result ####
+
+def index(db_path, params):
+    info = query.db_info(db_path)
+    return {"generation": list(info.generation), "creation_time": info.creation_time}
+
+
+def cables(db_path, params):
+    if "q" in params:
+        fields = _param(params, "fields")
+        hits = query.search_cables(_param(params, "q"), fields.split(",") if fields else None,
+                                   limit=int(_param(params, "limit", 20)), db_path=db_path)
+        return [{**hit.cable._asdict(), "score": hit.score, "matches": dict(hit.matches)}
+                for hit in hits]
+    for name, lookup in (("country", query.cables_by_country),
+                         ("owner", query.cables_by_owner),
+                         ("supplier", query.cables_by_supplier)):
+        if name in params:
+            return _rows(lookup(_param(params, name), db_path=db_path))
+    return _rows(query.all_cables(db_path))
+
+
+def cable(db_path, params, code):
+    found = query.get_cable(code, db_path)
+    if found is None:
+        raise NotFound(f"No cable with code {code!r}")
+    return {
+        **found._asdict(),
+        "landing_points": _rows(query.landing_points(code, db_path)),
+        "countries": _rows(query.countries_connected_by(code, db_path)),
+        "owners": _rows(query.owners_of(code, db_path)),
+        "suppliers": _rows(query.suppliers_of(code, db_path)),
+    }
+
+
+def points(db_path, params):
+    if "country" in params:
+        return _rows(query.points_in_country(_param(params, "country"), db_path))
+    return _rows(query.all_points(db_path))
+
+
+def point(db_path, params, code):
+    found = query.get_point(code, db_path)
+    if found is None:
+        raise NotFound(f"No landing point with code {code!r}")
+    return {**found._asdict(), "cables": _rows(query.cables_at_point(code, db_path))}
+
+
+def countries(db_path, params):
+    return _rows(query.all_countries(db_path))
+
+
+def country(db_path, params, name):
+    country_points = query.points_in_country(name, db_path)
+    if not country_points:
+        raise NotFound(f"No country named {name!r}")
+    return {"name": name, "points": _rows(country_points),
+            "cables": _rows(query.cables_by_country(name, db_path))}
+
+
+def owners(db_path, params):
+    return _rows(query.all_owners(db_path))
+
+
+def owner(db_path, params, name):
+    owned = query.cables_by_owner(name, db_path)
+    if not owned:
+        raise NotFound(f"No owner named {name!r}")
+    return {"name": name, "cables": _rows(owned)}
+
+
+def suppliers(db_path, params):
+    return _rows(query.all_suppliers(db_path))
+
+
+def supplier(db_path, params, name):
+    supplied = query.cables_by_supplier(name, db_path)
+    if not supplied:
+        raise NotFound(f"No supplier named {name!r}")
+    return {"name": name, "cables": _rows(supplied)}
+
+
+# (path pattern, endpoint). Groups are passed to the endpoint, URL-decoded.
+ROUTES = [(re.compile(pattern), endpoint) for pattern, endpoint in (
+    (r"/", index),
+    (r"/cables", cables),
+    (r"/cables/([^/]+)", cable),
+    (r"/points", points),
+    (r"/points/([^/]+)", point),
+    (r"/countries", countries),
+    (r"/countries/([^/]+)", country),
+    (r"/owners", owners),
+    (r"/owners/([^/]+)", owner),
+    (r"/suppliers", suppliers),
+    (r"/suppliers/([^/]+)", supplier),
+)]
+
+
+def _encode(result):
+    return dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _etags(header):
+    """The entity tags in an If-None-Match header, weak or not."""
+    if not header:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+class QueryServer:
+    """Answers HTTP requests for the database at db_path; see start()."""
+    def __init__(self, db_path=query.DEFAULT_DB_PATH, cache_size=CACHE_SIZE):
+        self.db_path = Path(db_path).absolute()
+        self.cache_size = cache_size
+        # target -> [etag, body, gzipped body or None], least recently used first.
+        self.cache = OrderedDict()
+        # target -> Future of (status, cache entry), for requests being answered.
+        self.pending = {}
+        self.generation = None
+        self.etag = None
+        self.server = None
+        self.stats = {"requests": 0, "cache_hits": 0, "not_modified": 0, "queries": 0}
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Start listening (port=0 picks a free port) and return the asyncio.Server."""
+        self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return self.server
+
+    @property
+    def base_url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def current_etag(self):
+        """The ETag of the database's current generation, emptying the cache on a new one.
+
+        Costs one stat() per request; SQLite is only asked for the
+        creation_time when the generation changes.
+        """
+        generation = query.db_generation(self.db_path)
+        if generation != self.generation:
+            info = await asyncio.to_thread(query.db_info, self.db_path)
+            digest = hashlib.sha1(repr((generation, info.creation_time)).encode("utf-8")).hexdigest()
+            # Weak, since the gzipped and plain bodies share it.
+            self.generation, self.etag = generation, 'W/"' + digest[:20] + '"'
+            self.cache.clear()
+        return self.etag
+
+    def run_endpoint(self, target):
+        """Answer target from SQLite: (status, body). Runs in a worker thread."""
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        for pattern, endpoint in ROUTES:
+            match = pattern.fullmatch(path)
+            if match:
+                break
+        else:
+            return 404, _encode({"error": f"No endpoint {path}"})
+        try:
+            params = parse_qs(url.query)
+            return 200, _encode(endpoint(self.db_path, params, *map(unquote, match.groups())))
+        except NotFound as e:
+            return 404, _encode({"error": str(e)})
+        except ValueError as e:
+            # A bad limit or an unknown search field.
+            return 400, _encode({"error": str(e)})
+        except (OSError, sqlite3.Error):
+            # respond() answers these with a 503.
+            raise
+        except Exception as e:
+            print(f"Error answering {target}: {e!r}")
+            return 500, _encode({"error": f"Internal error: {e!r}"})
+
+    async def load(self, target, etag):
+        """(status, body) for target, from the cache or a single shared query."""
+        entry = self.cache.get(target)
+        if entry and entry[0] == etag:
+            self.cache.move_to_end(target)
+            self.stats["cache_hits"] += 1
+            return 200, entry
+        if target in self.pending:
+            return await asyncio.shield(self.pending[target])
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[target] = future
+        try:
+            self.stats["queries"] += 1
+            status, body = await asyncio.to_thread(self.run_endpoint, target)
+            entry = [etag, body, None]
+            if status == 200 and etag == self.etag:
+                self.cache[target] = entry
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            future.set_result((status, entry))
+            return status, entry
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved, in case no other request was waiting on it.
+            future.exception()
+            raise
+        finally:
+            del self.pending[target]
+
+    async def respond(self, method, target, headers):
+        """(status, response headers, body) for one request."""
+        self.stats["requests"] += 1
+        if method not in ("GET", "HEAD"):
+            return 405, [("Allow", "GET, HEAD")], _encode({"error": f"{method} not allowed"})
+        try:
+            etag = await self.current_etag()
+            status, entry = await self.load(target, etag)
+        except (OSError, sqlite3.Error) as e:
+            return 503, [], _encode({"error": f"Database unavailable: {e}"})
+
+        response_headers = [("Content-Type", "application/json; charset=utf-8")]
+        if status != 200:
+            return status, response_headers, entry[1]
+        # Only after routing and validation, so a 404 or 400 is never a 304.
+        if entry[0].removeprefix("W/") in _etags(headers.get("if-none-match")):
+            self.stats["not_modified"] += 1
+            return 304, [("ETag", entry[0])], b""
+        response_headers += [("ETag", entry[0]), ("Cache-Control", "no-cache"), ("Vary", "Accept-Encoding")]
+        body = entry[1]
+        if len(body) >= GZIP_MIN_SIZE and "gzip" in headers.get("accept-encoding", ""):
+            if entry[2] is None:
+                entry[2] = gzip.compress(body, compresslevel=6)
+            body = entry[2]
+            response_headers.append(("Content-Encoding", "gzip"))
+        return status, response_headers, body
+
+    async def handle(self, reader, writer):
+        """Serve the requests on one (keep-alive) connection."""
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                # Requests have no use for a body; skip any.
+                if headers.get("content-length"):
+                    await reader.readexactly(int(headers["content-length"]))
+
+                parts = request_line.decode("latin-1").split()
+                if len(parts) == 3:
+                    method, target, version = parts
+                    status, response_headers, body = await self.respond(method, target, headers)
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  if version == "HTTP/1.1"
+                                  else headers.get("connection", "").lower() == "keep-alive")
+                else:
+                    method = None
+                    status, response_headers, body = 400, [], _encode({"error": "Bad request line"})
+                    keep_alive = False
+
+                head = [f"HTTP/1.1 {status} {REASONS[status]}"]
+                head += [f"{name}: {value}" for name, value in response_headers]
+                if status != 304:
+                    head.append(f"Content-Length: {len(body)}")
+                head.append("Connection: " + ("keep-alive" if keep_alive else "close"))
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # A dropped connection, a line over MAX_LINE or a bad Content-Length.
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(db_path=query.DEFAULT_DB_PATH, host="127.0.0.1", port=DEFAULT_PORT, cache_size=CACHE_SIZE):
+    """Serve db_path on host:port until cancelled."""
+    queries = QueryServer(db_path, cache_size)
+    server = await queries.start(host, port)
+    print(f"Serving {queries.db_path} at {queries.base_url}/")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the cable database as a read-only JSON API.")
+    parser.add_argument("--db", default=query.DEFAULT_DB_PATH, help="database to serve (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE,
+                        help="response bodies to keep in memory (default: %(default)s)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.cache_size))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,237 @@
+"""Per-run metrics and timing spans for update_db() runs.
+
+    metrics = RunMetrics(run_id)
+    with metrics.span("parse"):
+        cleaned_data = parse_data(scm_data)
+    metrics.count("rows_written_total", 123, table="cable")
+    metrics.observe("http_request_duration_seconds", 0.042, endpoint="cable")
+    metrics.write_json("./update/data/metrics/run_<run_id>.json")
+    metrics.write_prometheus("./update/data/metrics/scn_update.prom")
+
+Spans are flat (name, start offset, duration); nesting can be read off their
+time ranges. Counters and gauges are keyed by name and labels. Histograms
+use fixed buckets, as Prometheus does. The Prometheus file is in the text
+exposition format, for node_exporter's textfile collector, and is replaced
+atomically so the collector never reads half a file.
+"""
+import bisect
+import datetime
+import os
+import sys
+import time
+from contextlib import contextmanager
+from json import dump
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+PROMETHEUS_PREFIX = "scn_update_"
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper bound, observations <= it), ..., (inf, count)]"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (an overestimate)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {("+Inf" if bound == float("inf") else f"{bound:g}"): total
+                        for bound, total in self.cumulative()},
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+class RunMetrics:
+    """Collects the spans, counters, gauges and histograms of one run."""
+    def __init__(self, run_id=None):
+        self.run_id = run_id
+        self.started_at = datetime.datetime.utcnow().isoformat(timespec="milliseconds")
+        self.start = time.perf_counter()
+        self.finished_at = None
+        self.finished_timestamp = None
+        self.duration = None
+        self.spans = []
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the with block as the span name, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            attributes["error"] = repr(e)
+            raise
+        finally:
+            self.add_span(name, start, time.perf_counter(), **attributes)
+
+    def add_span(self, name, start, end, **attributes):
+        """Record a span timed elsewhere; start and end are time.perf_counter() values."""
+        self.spans.append({"name": name, "start": start - self.start,
+                           "seconds": end - start, **attributes})
+
+    def count(self, name, value=1, **labels):
+        key = _key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = _key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def finish(self):
+        """Stop the run clock and record peak memory. Safe to call more than once."""
+        self.finished_at = datetime.datetime.utcnow().isoformat(timespec="milliseconds")
+        self.finished_timestamp = time.time()
+        self.duration = time.perf_counter() - self.start
+        rss = peak_rss()
+        if rss is not None:
+            self.gauge("peak_rss_bytes", rss)
+
+    def phase_seconds(self):
+        """Total seconds per span name."""
+        phases = {}
+        for span in self.spans:
+            phases[span["name"]] = phases.get(span["name"], 0.0) + span["seconds"]
+        return phases
+
+    def report(self):
+        if self.duration is None:
+            self.finish()
+        return {
+            "run_id": self.run_id,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration": self.duration,
+            "phases": self.phase_seconds(),
+            "spans": self.spans,
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(self.counters.items())],
+            "gauges": [{"name": name, "labels": dict(labels), "value": value}
+                       for (name, labels), value in sorted(self.gauges.items())],
+            "histograms": [{"name": name, "labels": dict(labels), **histogram.as_dict()}
+                           for (name, labels), histogram in sorted(self.histograms.items())],
+        }
+
+    def write_json(self, path):
+        path = Path(path).absolute()
+        _write_atomic(path, lambda f: dump(self.report(), f, indent=4, default=str))
+        return path
+
+    def prometheus_lines(self):
+        """The run's metrics in the Prometheus text exposition format."""
+        if self.duration is None:
+            self.finish()
+        lines = []
+
+        def metric(name, kind, samples):
+            name = PROMETHEUS_PREFIX + name
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{name}{suffix}{_labels(labels)} {value}")
+
+        # The run id goes on an info metric only, so the other series stay
+        # the same from run to run.
+        metric("run_info", "gauge", [("", (("run_id", self.run_id or ""),), 1)])
+        metric("run_duration_seconds", "gauge", [("", (), self.duration)])
+        metric("run_finished_timestamp_seconds", "gauge", [("", (), self.finished_timestamp)])
+        metric("phase_duration_seconds", "gauge",
+               [("", (("phase", phase),), float(seconds))
+                for phase, seconds in sorted(self.phase_seconds().items())])
+
+        for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+            by_name = {}
+            for (name, labels), value in sorted(values.items()):
+                by_name.setdefault(name, []).append(("", labels, value))
+            for name, samples in by_name.items():
+                metric(name, kind, samples)
+
+        by_name = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            samples = by_name.setdefault(name, [])
+            for bound, total in histogram.cumulative():
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                samples.append(("_bucket", labels + (("le", le),), total))
+            samples.append(("_sum", labels, float(histogram.sum)))
+            samples.append(("_count", labels, histogram.count))
+        for name, samples in by_name.items():
+            metric(name, "histogram", samples)
+        return lines
+
+    def write_prometheus(self, path):
+        path = Path(path).absolute()
+        _write_atomic(path, lambda f: f.write("\n".join(self.prometheus_lines()) + "\n"))
+        return path
+
+
+def _key(name, labels):
+    """Metric key: the name and its labels, sorted, with values as strings."""
+    return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+               for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def _write_atomic(path, write):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wt", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp_path, path)
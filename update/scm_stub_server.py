@@ -0,0 +1,312 @@
+"""
+Local stand-in for the submarinecablemap.com API, for load testing the scraper.
+
+Serves the endpoints scm_scraper() uses,
+
+    /api/v3/config.json                          {"creation_time": ...}
+    /api/v3/cable/all.json                       [{"id": ..., "name": ...}, ...]
+    /api/v3/cable/<id>.json                      one cable, with ETag/If-None-Match support
+    /api/v3/landing-point/landing-point-geo.json landing point GeoJSON
+    /api/v3/cable/cable-geo.json                 cable GeoJSON
+
+from a recorded snapshot file (either format) or a synthetic snapshot, so
+the scraper can be pointed at it through base_url:
+
+    from scm_stub_server import start_stub_server
+    from synthetic import make_snapshot
+
+    server = start_stub_server(make_snapshot(10), latency="lognormal:0.05:0.5", p429=0.02)
+    cables = scm_scraper(base_url=server.base_url)
+    print(server.stats())
+    server.shutdown()
+
+Every response is delayed by a draw from the latency distribution
+("fixed:S", "uniform:LO:HI", "exponential:MEAN", "lognormal:MEDIAN:SIGMA"
+or "pareto:MIN:ALPHA", in seconds). Cable requests can also be made to
+fail: a rate limit (429 with Retry-After once more than rate_limit requests
+per second arrive), random 429s and 503s with Retry-After, bodies truncated
+mid-transfer, and connection resets. config.json, all.json and the
+geometry are never faulted, since the scraper fetches them only once,
+without retries. The geometry is synthetic (see synthetic.make_geo()).
+
+Run it standalone from the project root with
+
+    python3 update/scm_stub_server.py --scale 10 --port 8765 --p503 0.01
+
+and scrape http://127.0.0.1:8765. See load_test_scraper.py for a harness
+that runs the scraper against it and reports throughput and completeness.
+"""
+import argparse
+import hashlib
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps
+from snapshot_format import load_snapshot
+from synthetic import make_geo, make_snapshot
+
+
+API = "/api/v3/"
+# Endpoints the scraper fetches once per run. These are never faulted.
+SINGLE_FETCHES = ("config.json", "cable/all.json", "landing-point/landing-point-geo.json",
+                  "cable/cable-geo.json")
+
+
+def parse_latency(spec):
+    """Turn a latency spec like "lognormal:0.05:0.5" into a function rng -> seconds.
+    """
+    if spec is None or spec in ("", "0", "none"):
+        return lambda rng: 0.0
+    kind, *params = spec.split(":")
+    try:
+        params = [float(p) for p in params]
+        if kind == "fixed":
+            seconds, = params
+            return lambda rng: seconds
+        if kind == "uniform":
+            low, high = params
+            return lambda rng: rng.uniform(low, high)
+        if kind == "exponential":
+            mean, = params
+            return lambda rng: rng.expovariate(1.0 / mean)
+        if kind == "lognormal":
+            median, sigma = params
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+        if kind == "pareto":
+            minimum, alpha = params
+            return lambda rng: minimum * rng.paretovariate(alpha)
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec {spec!r}; expected e.g. fixed:0.1, uniform:0.01:0.2, "
+                     + "exponential:0.05, lognormal:0.05:0.5 or pareto:0.02:2.5")
+
+
+class StubServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer holding the snapshot, the fault settings and the stats."""
+    daemon_threads = True
+    # The scraper opens up to a few hundred connections at once.
+    request_queue_size = 1024
+
+    def __init__(self, snapshot, host="127.0.0.1", port=0, creation_time="2025-01-01T00:00:00.000Z",
+                 latency=None, rate_limit=None, p429=0.0, p503=0.0, retry_after=1.0,
+                 truncate=0.0, reset=0.0, seed=None):
+        super().__init__((host, port), StubHandler)
+        self.latency = parse_latency(latency)
+        self.rate_limit = rate_limit
+        self.p429 = p429
+        self.p503 = p503
+        self.retry_after = retry_after
+        self.truncate = truncate
+        self.reset = reset
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+        # Encode every response body once up front.
+        geo = make_geo(snapshot)
+        self.bodies = {
+            "landing-point/landing-point-geo.json": dumps(geo["landing_points"]).encode("utf-8"),
+            "cable/cable-geo.json": dumps(geo["cables"]).encode("utf-8"),
+            "config.json": dumps({"creation_time": creation_time}).encode("utf-8"),
+            "cable/all.json": dumps([{"id": data["id"], "name": name}
+                                     for name, data in snapshot.items()]).encode("utf-8"),
+        }
+        for name, data in snapshot.items():
+            self.bodies[f"cable/{data['id']}.json"] = dumps({**data, "name": name}).encode("utf-8")
+        self.etags = {path: '"' + hashlib.sha1(body).hexdigest() + '"'
+                      for path, body in self.bodies.items()}
+
+        # Token bucket for rate_limit, allowing one second's worth of burst.
+        self.tokens = rate_limit or 0.0
+        self.tokens_at = time.monotonic()
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.started = time.perf_counter()
+            self.requests = 0
+            self.status = {}
+            self.faults = {}
+            self.latencies = []
+
+    def record(self, status, latency, fault=None):
+        """Count one response. status is the HTTP status, or "reset" if none was sent.
+        """
+        status = str(status)
+        with self.lock:
+            self.requests += 1
+            self.status[status] = self.status.get(status, 0) + 1
+            if fault:
+                self.faults[fault] = self.faults.get(fault, 0) + 1
+            self.latencies.append(latency)
+
+    def stats(self):
+        """Requests, status and fault counts, and service-time percentiles so far."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            elapsed = time.perf_counter() - self.started
+            return {
+                "requests": self.requests,
+                "elapsed": elapsed,
+                "requests_per_second": self.requests / elapsed if elapsed else 0.0,
+                "status": dict(sorted(self.status.items())),
+                "faults": dict(sorted(self.faults.items())),
+                "latency": percentiles(latencies),
+            }
+
+    def draw(self):
+        """Draw a latency and decide which fault (if any) a cable request gets."""
+        with self.lock:
+            latency = self.latency(self.rng)
+            if self.rate_limit:
+                now = time.monotonic()
+                self.tokens = min(self.rate_limit, self.tokens + (now - self.tokens_at) * self.rate_limit)
+                self.tokens_at = now
+                if self.tokens < 1:
+                    return latency, "rate_limited"
+                self.tokens -= 1
+            x = self.rng.random()
+            for fault, p in (("429", self.p429), ("503", self.p503),
+                             ("truncate", self.truncate), ("reset", self.reset)):
+                if x < p:
+                    return latency, fault
+                x -= p
+            return latency, None
+
+
+def percentiles(sorted_values, points=(50, 90, 95, 99)):
+    """{"p50": ..., "p90": ..., "max": ...} of an already sorted list."""
+    if not sorted_values:
+        return {}
+    result = {f"p{p}": sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+              for p in points}
+    result["max"] = sorted_values[-1]
+    return result
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body=b"", headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        start = time.perf_counter()
+        server = self.server
+        path = self.path.split("?", 1)[0]
+        body = server.bodies.get(path[len(API):]) if path.startswith(API) else None
+        if body is None:
+            self.send_body(404, b"Not found")
+            server.record(404, time.perf_counter() - start)
+            return
+
+        is_cable = path[len(API):] not in SINGLE_FETCHES and path.startswith(API + "cable/")
+        latency, fault = server.draw() if is_cable else (server.latency(server.rng), None)
+        time.sleep(latency)
+        etag = server.etags[path[len(API):]]
+
+        if fault == "rate_limited":
+            retry_after = max(1, math.ceil(1.0 / server.rate_limit))
+            self.send_body(429, b"Rate limit exceeded", [("Retry-After", str(retry_after))])
+            status = 429
+        elif fault in ("429", "503"):
+            status = int(fault)
+            self.send_body(status, b"Try again later", [("Retry-After", f"{server.retry_after:g}")])
+        elif fault == "truncate":
+            # Promise the whole body, send half of it and hang up.
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            status = 200
+        elif fault == "reset":
+            # SO_LINGER with a zero timeout makes close() send a RST.
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+            self.connection.close()
+            self.close_connection = True
+            status = "reset"
+        elif self.headers.get("If-None-Match") == etag:
+            self.send_body(304, headers=[("ETag", etag)])
+            status = 304
+        else:
+            self.send_body(200, body, [("Content-Type", "application/json"), ("ETag", etag)])
+            status = 200
+        server.record(status, time.perf_counter() - start, fault)
+
+
+def start_stub_server(snapshot, host="127.0.0.1", port=0, **options):
+    """Start a StubServer for snapshot in a background thread and return it.
+
+    port=0 picks a free port; use server.base_url as the scraper's base_url.
+    options are StubServer's keyword arguments. Call server.shutdown() when done.
+    """
+    server = StubServer(snapshot, host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_server_arguments(parser):
+    """The snapshot and fault options, shared with load_test_scraper.py."""
+    parser.add_argument("--snapshot", help="recorded snapshot file to serve (JSON or .ndjson.gz)")
+    parser.add_argument("--scale", type=float, default=1,
+                        help="serve a synthetic snapshot this many times today's size (if no --snapshot)")
+    parser.add_argument("--latency", default="lognormal:0.05:0.5",
+                        help="response delay distribution, e.g. fixed:0.1 or lognormal:0.05:0.5")
+    parser.add_argument("--rate-limit", type=float, help="cable requests per second before 429s")
+    parser.add_argument("--p429", type=float, default=0.0, help="fraction of cable requests answered 429")
+    parser.add_argument("--p503", type=float, default=0.0, help="fraction of cable requests answered 503")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on 429/503")
+    parser.add_argument("--truncate", type=float, default=0.0, help="fraction of cable bodies cut short")
+    parser.add_argument("--reset", type=float, default=0.0, help="fraction of cable requests reset")
+    parser.add_argument("--seed", type=int)
+
+
+def server_options(args):
+    """Load or generate the snapshot and pick out StubServer's options from parsed args.
+    """
+    snapshot = load_snapshot(args.snapshot) if args.snapshot else make_snapshot(args.scale)
+    options = {
+        "latency": args.latency,
+        "rate_limit": args.rate_limit,
+        "p429": args.p429,
+        "p503": args.p503,
+        "retry_after": args.retry_after,
+        "truncate": args.truncate,
+        "reset": args.reset,
+        "seed": args.seed,
+    }
+    return snapshot, options
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a snapshot as a local submarinecablemap.com API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    snapshot, options = server_options(args)
+    server = StubServer(snapshot, args.host, args.port, **options)
+    print(f"Serving {len(snapshot)} cables at {server.base_url}{API}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(server.stats())
@@ -0,0 +1,112 @@
+"""Crash-safe journal of the cables a scrape has already fetched.
+
+A journal is an NDJSON file per scraper and run id,
+
+    {"creation_time": ...}                                   header
+    ["<cable url>", {"etag", "last_modified", "body"}]       one per cable
+
+appended to as cable responses arrive. If the run dies partway through, a
+new run with the same run id reads the journal back, reuses those cables
+and only requests the rest. Lines are flushed at least every
+JOURNAL_FLUSH_INTERVAL seconds, so a crash loses at most that much work;
+a line torn by the crash is dropped when the journal is read back.
+
+The journal is kept until the whole update run that made it finishes, so
+a run that fails after the scrape (writing the database, say) also
+resumes without sending a single cable request.
+"""
+import os
+import time
+from json import dumps, loads
+from pathlib import Path
+
+
+JOURNAL_DIR = "./update/data/journal/"
+# Seconds between flushes of newly journaled cables to disk.
+JOURNAL_FLUSH_INTERVAL = 1.0
+
+
+def journal_path(run_id, journal_dir=JOURNAL_DIR, scraper_name="scm_scraper"):
+    return Path(journal_dir).absolute() / (scraper_name + "_" + run_id + ".ndjson")
+
+
+def run_journals(run_id, journal_dir=JOURNAL_DIR):
+    """The journals of every scraper in run run_id."""
+    return sorted(Path(journal_dir).absolute().glob("*_" + run_id + ".ndjson"))
+
+
+def remove_journal(run_id, journal_dir=JOURNAL_DIR):
+    for path in run_journals(run_id, journal_dir):
+        path.unlink(missing_ok=True)
+
+
+class ScrapeJournal:
+    """Reads back, then appends to, one run's journal.
+
+        journal = ScrapeJournal(journal_path(run_id), creation_time)
+        journal.entries                  # {url: entry} from before a crash
+        journal.record(url, entry)
+        journal.close()
+
+    Cables journaled under a different creation_time are stale (the data
+    changed upstream in between), so the journal starts over instead.
+    """
+    def __init__(self, path, creation_time=None):
+        self.path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.entries = {}
+        self.stale = False
+
+        end = self._read(creation_time)
+        if end:
+            # Drop any torn last line before appending after it.
+            self.file = open(self.path, "r+b")
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(self.path, "wb")
+            self._write([{"creation_time": creation_time}])
+            self.file.flush()
+        self.next_flush = time.monotonic() + JOURNAL_FLUSH_INTERVAL
+
+    def _read(self, creation_time):
+        """Load the entries of an existing journal; return the offset after the last good line.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return 0
+        end = 0
+        with f:
+            for number, line in enumerate(f):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = loads(line)
+                except ValueError:
+                    break
+                if number == 0:
+                    if record.get("creation_time") != creation_time:
+                        self.stale = True
+                        return 0
+                else:
+                    url, entry = record
+                    self.entries[url] = entry
+                end += len(line)
+        return end
+
+    def _write(self, records):
+        self.file.write(b"".join(dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                                 + b"\n" for record in records))
+
+    def record(self, url, entry):
+        """Journal one fetched cable; entry is {"etag", "last_modified", "body"}."""
+        self._write([[url, entry]])
+        if time.monotonic() >= self.next_flush:
+            self.file.flush()
+            self.next_flush = time.monotonic() + JOURNAL_FLUSH_INTERVAL
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
@@ -0,0 +1,207 @@
+"""Adaptive concurrency and rate control for the scrapers' request fan-out.
+
+AdaptiveLimiter uses additive-increase/multiplicative-decrease (AIMD), the
+same scheme TCP uses for congestion control:
+
+    - until the first sign of congestion, every window of successful, fast
+      responses doubles the concurrency limit and the request rate
+      ("slow start"),
+    - after that, every window raises the concurrency limit by one and the
+      request rate by rate_step,
+    - a 429, a 5xx, a transport error or a slow response halves both,
+    - a Retry-After header that comes with a decrease also pauses all new
+      requests, for at most one window (the time it takes to start
+      concurrency requests at the current rate).
+
+The request that got the Retry-After waits it out in full before it is
+retried (see scm_scraper's fetch()); the rest of the pool only pauses
+briefly, so one stray 429 among many successes can't stall the host for
+seconds at a time. A host that keeps rate limiting keeps getting its limits
+halved instead.
+
+backoff_delay() gives the jittered exponential delay between retries.
+
+HostBudgets hands out one shared limiter per host, so scrapers that run at
+the same time and hit the same host share its budget instead of each
+ramping up to the full limits on their own.
+"""
+import asyncio
+import datetime
+import email.utils
+import random
+import time
+from urllib.parse import urlsplit
+
+
+# Status codes that mean "slow down", not "this cable is broken".
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """Return the number of seconds a Retry-After header asks us to wait.
+
+    Retry-After is either a number of seconds or an HTTP date.
+    Returns None if value is missing or unparseable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (retry_at - now).total_seconds())
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveLimiter:
+    """AIMD limiter on both in-flight requests and request starts per second.
+
+    Use it around each request:
+
+        await limiter.acquire()
+        try:
+            response = await client.get(url)
+        finally:
+            await limiter.release(status, latency, retry_after)
+    """
+    def __init__(
+        self,
+        initial_concurrency=32,
+        min_concurrency=1,
+        max_concurrency=250,
+        initial_rate=64.0,
+        min_rate=1.0,
+        max_rate=250.0,
+        rate_step=5.0,
+        target_latency=2.0,
+        ):
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.rate = float(initial_rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate_step = rate_step
+        self.target_latency = target_latency
+
+        self.in_flight = 0
+        # Successes since the last increase.
+        self.window_successes = 0
+        # Earliest time the next request may start (rate limiting and Retry-After).
+        self.next_start = 0.0
+        self.paused_until = 0.0
+        # Avoid halving once per in-flight request when a whole burst fails.
+        self.last_decrease = 0.0
+        self.slow_start = True
+
+        # Counters for the run report.
+        self.decreases = 0
+        self.peak_concurrency = int(self.concurrency)
+
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait for a free concurrency slot and the next rate-limited start time."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.concurrency))
+            self.in_flight += 1
+
+        # Space out request starts to at most self.rate per second.
+        try:
+            while True:
+                now = time.monotonic()
+                start_at = max(self.next_start, self.paused_until)
+                if start_at <= now:
+                    self.next_start = now + 1.0 / self.rate
+                    return
+                await asyncio.sleep(start_at - now)
+        except BaseException:
+            # Cancelled while waiting to start: the caller never got the
+            # slot, so it won't release it either.
+            async with self._condition:
+                self.in_flight -= 1
+                self._condition.notify_all()
+            raise
+
+    async def release(self, status=None, latency=0.0, retry_after=None):
+        """Free a slot and adapt the limits to how the request went.
+
+        status is the HTTP status code, or None if the request failed in
+        transport. latency is the request's duration in seconds.
+        """
+        now = time.monotonic()
+
+        congested = (
+            status is None
+            or status in RETRYABLE_STATUS
+            or latency > self.target_latency
+        )
+        if congested:
+            self._decrease(now, retry_after)
+        else:
+            self._increase()
+
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _increase(self):
+        self.window_successes += 1
+        if self.window_successes >= int(self.concurrency):
+            self.window_successes = 0
+            if self.slow_start:
+                self.concurrency = min(self.max_concurrency, self.concurrency * 2)
+                self.rate = min(self.max_rate, self.rate * 2)
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self.rate = min(self.max_rate, self.rate + self.rate_step)
+            self.peak_concurrency = max(self.peak_concurrency, int(self.concurrency))
+
+    def _decrease(self, now, retry_after=None):
+        self.window_successes = 0
+        # One decrease per target_latency; responses still in flight from
+        # before the decrease describe the old limit.
+        if now - self.last_decrease < self.target_latency:
+            return
+        self.last_decrease = now
+        self.slow_start = False
+        self.decreases += 1
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+        self.rate = max(self.min_rate, self.rate / 2)
+        if retry_after is not None:
+            window = self.concurrency / self.rate
+            self.paused_until = max(self.paused_until, now + min(retry_after, window))
+
+
+class HostBudgets:
+    """One AdaptiveLimiter per host, shared by every request to that host.
+
+        budgets = HostBudgets({"www.submarinecablemap.com": {"max_concurrency": 100}})
+        limiter = budgets.limiter("https://www.submarinecablemap.com/api/v3/")
+
+    limits holds AdaptiveLimiter arguments per host; hosts without an entry
+    get the defaults passed as keyword arguments here. Limiters are made on
+    first use, so inside the event loop that uses them.
+    """
+    def __init__(self, limits=None, **defaults):
+        self.limits = limits or {}
+        self.defaults = defaults
+        self.limiters = {}
+
+    def limiter(self, url):
+        """The limiter for url's host (url may also be a bare host name)."""
+        host = urlsplit(url).hostname or url
+        if host not in self.limiters:
+            self.limiters[host] = AdaptiveLimiter(**{**self.defaults, **self.limits.get(host, {})})
+        return self.limiters[host]
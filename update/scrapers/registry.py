@@ -0,0 +1,233 @@
+"""The sites update_db() can scrape, and scraping several of them at once.
+
+Each site is registered with an async stream function that has
+scm_stream()'s interface,
+
+    stream(base_url=..., logger=None, incremental=False, report=None,
+           metrics=None, journal_file=None, limiter=None, ...)
+
+iterating over (cable_name, cable_data) pairs in submarinecablemap.com's
+cable format, which is what clean_data.py parses. A stream needn't take all
+of these arguments: it is passed only the ones its signature names.
+
+scrape_stream() runs the selected sites' streams at the same time. Requests
+to the same host share one AIMD limiter (rate_control.HostBudgets), so a
+run with several sources takes about as long as its slowest site, not the
+sum of them, and sources that share a host can't overload it together.
+
+update_db() scrapes the sites listed in cable-sites.txt, one per line, or
+DEFAULT_SITES if that file doesn't exist (see select_sites()).
+"""
+import asyncio
+import inspect
+from collections import namedtuple
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Support both running this file directly and importing it as scrapers.registry.
+if __package__:
+    from .journal import journal_path
+    from .rate_control import HostBudgets
+    from .scm_scraper import SCM_BASE_URL, scm_stream
+else:
+    from journal import journal_path
+    from rate_control import HostBudgets
+    from scm_scraper import SCM_BASE_URL, scm_stream
+
+
+SITES_PATH = "./update/cable-sites.txt"
+# Scraped when there's no cable-sites.txt.
+DEFAULT_SITES = ("submarinecablemap.com",)
+# AdaptiveLimiter limits per host (see rate_control.HostBudgets).
+HOST_LIMITS = {
+    "www.submarinecablemap.com": {"max_concurrency": 250, "max_rate": 250.0},
+}
+# Counts in each site's report that are summed into the run's.
+REPORT_COUNTS = ("requested", "fetched", "not_modified", "resumed", "retried", "retries", "lost")
+
+# Marks the end of a site's stream on the merge queue.
+_DONE = object()
+
+# name labels the scraper's log and journal files.
+Scraper = namedtuple("Scraper", ["site", "name", "base_url", "stream"])
+
+SCRAPERS = {}
+
+
+class IncompleteScrapeError(Exception):
+    """Some cables couldn't be fetched, so the scrape isn't a complete snapshot."""
+
+
+def register(site, name, base_url, stream):
+    """Register stream (see above) as the scraper for site."""
+    SCRAPERS[site] = Scraper(site, name, base_url, stream)
+
+
+register("submarinecablemap.com", "scm_scraper", SCM_BASE_URL, scm_stream)
+
+
+def site_name(site):
+    """The registry name for a site given as a name, host or URL ("https://www.x.com/" -> "x.com")."""
+    if "://" in site:
+        site = urlsplit(site).hostname or site
+    return site.lower().removeprefix("www.")
+
+
+def read_sites(sites_path=SITES_PATH):
+    """The sites listed in sites_path, one per line. Blank lines and # comments are skipped."""
+    with open(Path(sites_path).absolute(), "rt", encoding="utf-8") as f:
+        lines = (line.split("#", 1)[0].strip() for line in f)
+        return [site_name(line) for line in lines if line]
+
+
+def select_sites(sites=None, plus=None, sites_path=SITES_PATH):
+    """The sites to scrape, given update_db.py's -w (sites) and --plus (plus) lists.
+
+    sites replaces the default sites: those in sites_path, or DEFAULT_SITES
+    if there's no such file. plus adds to the sites in sites_path, which
+    then has to exist (FileNotFoundError otherwise). Sites are kept in the
+    order given, which is their priority in scrape_stream(). Raises
+    ValueError for a site with no registered scraper.
+    """
+    if sites:
+        selected = [site_name(site) for site in sites]
+    elif plus or Path(sites_path).absolute().exists():
+        selected = read_sites(sites_path)
+    else:
+        selected = list(DEFAULT_SITES)
+    selected += [site_name(site) for site in plus or ()]
+    selected = list(dict.fromkeys(selected))
+
+    unknown = [site for site in selected if site not in SCRAPERS]
+    if unknown:
+        raise ValueError(f"No scraper for {', '.join(unknown)}. "
+                         + f"Known sites: {', '.join(sorted(SCRAPERS))}.")
+    if not selected:
+        raise ValueError("No sites to scrape.")
+    return selected
+
+
+def _accepted(stream, arguments):
+    """The arguments stream's signature takes."""
+    parameters = inspect.signature(stream).parameters
+    if any(p.kind == p.VAR_KEYWORD for p in parameters.values()):
+        return arguments
+    return {name: value for name, value in arguments.items() if name in parameters}
+
+
+def _merge_reports(report, site_reports, duplicates):
+    for count in REPORT_COUNTS:
+        report[count] = sum(r.get(count, 0) for r in site_reports.values())
+    report["errors"] = [e for r in site_reports.values() for e in r.get("errors", [])]
+    report["duplicates"] = duplicates
+    report["sites"] = site_reports
+    # The first site's data version (see snapshot_store's creation_time).
+    for r in site_reports.values():
+        if r.get("creation_time"):
+            report["creation_time"] = r["creation_time"]
+            break
+
+
+def check_complete(report):
+    """Raise IncompleteScrapeError if report (a scrape report) counts lost cables."""
+    if report.get("lost"):
+        raise IncompleteScrapeError(f"{report['lost']} of {report['requested']} cables "
+                                    + "could not be fetched; the snapshot would be incomplete.")
+
+
+async def scrape_stream(
+    sites=DEFAULT_SITES,
+    budgets=None,
+    report=None,
+    run_id=None,
+    journal_dir=None,
+    site_options=None,
+    queue_size=64,
+    **kwargs
+    ):
+    """Async iterator over the cables of all of sites, scraped at the same time.
+
+    kwargs (logger, incremental, metrics, geo, ...) go to every site's
+    stream that takes them, and site_options[site] to that site's only
+    (a base_url, say). budgets is the rate_control.HostBudgets the streams
+    get their limiters from; by default, one with HOST_LIMITS. If run_id and
+    journal_dir are given, each site journals its cables under
+    journal_path(run_id, journal_dir, <scraper name>).
+
+    A cable that several sites have is taken from the first of them in
+    sites; the other copies are dropped and counted as duplicates. To make
+    that choice independent of which response comes first, a site's cables
+    are held back until every site before it has finished (they are still
+    fetched in the meantime).
+
+    report gets each site's report under "sites", their counts summed and
+    the first site's creation_time. If a site fails, the others are stopped
+    and its error is raised.
+    """
+    sites = list(sites)
+    budgets = budgets if budgets is not None else HostBudgets(HOST_LIMITS)
+    site_options = site_options or {}
+    run_report = report if report is not None else {}
+    site_reports = {site: {} for site in sites}
+    queue = asyncio.Queue(maxsize=queue_size)
+
+    async def run(rank, site):
+        scraper = SCRAPERS[site]
+        arguments = {"base_url": scraper.base_url, **kwargs, **site_options.get(site, {})}
+        arguments["limiter"] = budgets.limiter(arguments["base_url"])
+        arguments["report"] = site_reports[site]
+        if run_id and journal_dir:
+            arguments["journal_file"] = journal_path(run_id, journal_dir, scraper.name)
+        try:
+            async for cable in scraper.stream(**_accepted(scraper.stream, arguments)):
+                await queue.put((rank, cable))
+        except Exception as e:
+            await queue.put((rank, e))
+        else:
+            await queue.put((rank, _DONE))
+
+    tasks = [asyncio.create_task(run(rank, site)) for rank, site in enumerate(sites)]
+    running = set(range(len(sites)))
+    held = [[] for site in sites]
+    seen = set()
+    duplicates = 0
+    try:
+        while running:
+            rank, item = await queue.get()
+            if item is _DONE:
+                running.discard(rank)
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                held[rank].append(item)
+
+            # Every site before the first one still running has finished,
+            # so its cables, and theirs, can't be displaced any more.
+            first_running = min(running, default=len(sites) - 1)
+            for r in range(first_running + 1):
+                cables, held[r] = held[r], []
+                for cable_name, cable_data in cables:
+                    if cable_name in seen:
+                        duplicates += 1
+                        continue
+                    seen.add(cable_name)
+                    yield cable_name, cable_data
+    finally:
+        # Stop the other sites if the consumer stops early or one failed,
+        # and let their streams close their clients and journals.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        _merge_reports(run_report, site_reports, duplicates)
+
+
+def scrape_sites(sites=DEFAULT_SITES, **kwargs):
+    """Scrape sites at the same time (see scrape_stream()) and return {cable name: cable data}."""
+    cables = {}
+
+    async def collect():
+        async for cable_name, cable_data in scrape_stream(sites, **kwargs):
+            cables[cable_name] = cable_data
+
+    asyncio.run(collect())
+    return cables
@@ -18,22 +18,45 @@ from https://submarinecablemap.com.
 Some cables lack complete data, most often in length and url categories.
 """
 import asyncio
-import aiometer
-import functools
+import atexit
 import httpx
-import requests
+import importlib.util
 import logging
+import queue
 import time
 import datetime
+import os
 import sys
+from contextlib import nullcontext
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from uuid import uuid4
-from json import dump
+from json import dump, load
+
+# Support both running this file directly and importing it as scrapers.scm_scraper.
+if __package__:
+    from .journal import ScrapeJournal, journal_path
+    from .rate_control import AdaptiveLimiter, RETRYABLE_STATUS, backoff_delay, parse_retry_after
+else:
+    from journal import ScrapeJournal, journal_path
+    from rate_control import AdaptiveLimiter, RETRYABLE_STATUS, backoff_delay, parse_retry_after
 
 
 SCM_BASE_URL = "https://www.submarinecablemap.com"
 SCM_API = "/api/v3/"
 SCRAPER_VERSION = 2.0
+SCM_CACHE_PATH = "./update/cache/scm_cache.json"
+# Seconds between INFO progress summaries during the cable fan-out.
+PROGRESS_INTERVAL = 5.0
+# httpx speaks HTTP/2 only if the h2 package is installed (httpx[http2]).
+HTTP2 = importlib.util.find_spec("h2") is not None
+# Seconds to wait for a connection, a pooled connection and a response.
+SCM_TIMEOUT = httpx.Timeout(30.0, connect=10.0, pool=60.0)
+# Seconds an idle keep-alive connection stays in the pool.
+KEEPALIVE_EXPIRY = 30.0
+
+# Background writers of the loggers made by init_logger(), by logger name.
+_log_listeners = {}
 
 
 def init_logger(date, scraper_name, uuid):
@@ -41,21 +64,31 @@ def init_logger(date, scraper_name, uuid):
 
     Writes levels >= INFO to stdout and all levels (levels >= DEBUG) to log_path.
 
+    The logger only puts records on a queue; a background thread formats
+    them and does the terminal and file writes, so logging never blocks the
+    event loop. Calling init_logger() again for the same name (the next run
+    in the same process) replaces the previous run's handlers rather than
+    adding to them. close_logger() flushes and closes them.
+
     Borrows some code from https://rb.gy/kao10.
     """
     # Create the path and parent directories for the log files
     log_path = Path("./update/logs/" + scraper_name + "_" + date + "_" + uuid + ".log")
     log_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Make a logger
+    # Make a logger, dropping any handlers left from an earlier run.
     logger = logging.getLogger(scraper_name)
-    logger.setLevel(logging.INFO)
+    close_logger(logger)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
 
     # Create console handler
     stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(logging.INFO)
 
     # Create file handler
     file_handler = logging.FileHandler(filename=log_path, encoding="utf-8")
+    file_handler.setLevel(logging.DEBUG)
 
     # Create formatter
     formatter = logging.Formatter('%(asctime)s - %(relativeCreated)d - %(name)s - %(levelname)s - %(message)s')
@@ -66,31 +99,493 @@ def init_logger(date, scraper_name, uuid):
     stream_handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
 
-    # Add Handlers to logger
-    logger.addHandler(stream_handler)
-    logger.addHandler(file_handler)
+    # The handlers run on the listener's thread; the logger only enqueues.
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, stream_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    _log_listeners[scraper_name] = listener
+    logger.addHandler(QueueHandler(log_queue))
 
     return logger
 
 
-def make_json_url(cable):
+def close_logger(logger):
+    """Write out everything queued for logger and close its handlers."""
+    listener = _log_listeners.pop(logger.name, None)
+    if listener:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+
+@atexit.register
+def _close_loggers():
+    for name in list(_log_listeners):
+        close_logger(logging.getLogger(name))
+
+
+def make_json_url(cable, base_url=SCM_BASE_URL, api=SCM_API):
     """Transform a cable name into a URL for requesting that cable's data.
     """
     # Transform cable into request for the cable's json-formatted data.
-    json_url = SCM_BASE_URL + SCM_API + "cable/" + cable['id'] + ".json"
+    json_url = base_url + api + "cable/" + cable['id'] + ".json"
     return json_url
 
 
+def load_cache(cache_path=SCM_CACHE_PATH):
+    """Load the validator cache written by a previous incremental scrape.
+
+    The cache looks like
+        {"creation_time": str, "cables": {url: {"etag", "last_modified", "body"}}}
+    Returns an empty cache if the file is missing or unreadable.
+    """
+    cache_path = Path(cache_path).absolute()
+    try:
+        with open(cache_path, "rt", encoding="utf-8") as f:
+            cache = load(f)
+        cache.setdefault("creation_time", None)
+        cache.setdefault("cables", {})
+        return cache
+    except (FileNotFoundError, ValueError):
+        return {"creation_time": None, "cables": {}}
+
+
+def save_cache(cache, cache_path=SCM_CACHE_PATH):
+    """Write the validator cache to cache_path.
+
+    Writes to a temporary file first and renames it into place so that a
+    crash mid-write never leaves a truncated cache behind.
+    """
+    cache_path = Path(cache_path).absolute()
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with open(tmp_path, "wt", encoding="utf-8") as f:
+        dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+
+
+def conditional_headers(entry):
+    """Build If-None-Match/If-Modified-Since headers from a cache entry."""
+    headers = {}
+    if entry.get("etag"):
+        headers["if-none-match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["if-modified-since"] = entry["last_modified"]
+    return headers
+
+
+# Set custom headers
+SCM_HEADERS = {
+    "accept": "*/*",
+    "accept-language":"en-GB,en-US;q=0.9,en;q=0.8,es;q=0.7",
+    "cache-control": "no-cache",
+    "referer": "https://www.submarinecablemap.com/",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
+    "content-type": "application/json"
+}
+
+
+def make_client(max_connections=250):
+    """The one AsyncClient a scrape uses for config.json, all.json and every cable.
+
+    Sends SCM_HEADERS on every request and negotiates compression
+    (httpx adds Accept-Encoding for gzip and deflate, plus br and zstd if
+    brotli or zstandard is installed). Uses HTTP/2 when h2 is installed, so
+    the fan-out multiplexes over a few connections instead of opening one per
+    in-flight request; otherwise up to max_connections HTTP/1.1 connections
+    are opened and kept alive between requests.
+    """
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        headers=SCM_HEADERS,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=SCM_TIMEOUT,
+        # requests.get followed redirects; keep doing so.
+        follow_redirects=True,
+    )
+
+
+class CableFetchError(Exception):
+    """A cable request that failed and should not be retried."""
+
+
+async def scm_stream(
+    base_url=SCM_BASE_URL,
+    api=SCM_API,
+    logger=None,
+    incremental=False,
+    cache_path=SCM_CACHE_PATH,
+    max_concurrency=250,
+    max_rate=250,
+    target_latency=2.0,
+    retry_budget=120,
+    report=None,
+    metrics=None,
+    journal_file=None,
+    geo=None,
+    limiter=None,):
+    """Async iterator over (cable_name, cable_data) pairs, in arrival order.
+
+    This is the scraper's fan-out. scm_scraper() collects it into a dict,
+    and the streaming pipeline consumes it cable by cable.
+    If journal_file is given, fetched cables are journaled there as they
+    arrive (see scrapers/journal.py), and cables already in it from an
+    interrupted run are yielded first instead of being requested again.
+    If geo is a dict, the landing point and cable GeoJSON are fetched into
+    it during the fan-out (see fetch_geo below).
+    Cable requests go through limiter (a rate_control.AdaptiveLimiter) if
+    one is given, e.g. one shared with other scrapers through a HostBudgets,
+    and through a limiter of their own otherwise.
+    All requests go through a single client from make_client(), which is
+    closed when the iterator finishes. See scm_scraper() for the arguments.
+    """
+    # Per-run delivery counts. Callers can pass their own dict as report.
+    fetch_report = report if report is not None else {}
+    fetch_report.update({
+        "requested": 0,
+        "fetched": 0,
+        "not_modified": 0,
+        "resumed": 0,
+        "retried": 0,
+        "retries": 0,
+        "lost": 0,
+        "errors": [],
+    })
+
+    async with make_client(max_concurrency) as client:
+        ##############################
+        #### CHECK FOR NEW DATA ####
+        ##############################
+        if incremental:
+            cache = load_cache(cache_path)
+
+        def record_response(endpoint, status, latency, size):
+            if metrics:
+                metrics.observe("http_request_duration_seconds", latency, endpoint=endpoint)
+                metrics.count("http_responses_total", endpoint=endpoint, status=status)
+                metrics.count("http_response_bytes_total", size, endpoint=endpoint)
+
+        async def get_json(endpoint, url):
+            # config.json and all.json are fetched once each, without retries.
+            sent_at = time.perf_counter()
+            response = await client.get(url)
+            record_response(endpoint, response.status_code, time.perf_counter() - sent_at,
+                            response.num_bytes_downloaded)
+            fetch_report["http_version"] = response.http_version
+            response.raise_for_status()
+            return response.json()
+
+        async def fetch_geo():
+            # The map's geometry, fetched alongside the cables. It is optional:
+            # if it fails, geo stays empty and the database keeps the old one.
+            try:
+                with metrics.span("geo_fetch") if metrics else nullcontext():
+                    landing_points, cables = await asyncio.gather(
+                        get_json("landing_point_geo", base_url + api + "landing-point/landing-point-geo.json"),
+                        get_json("cable_geo", base_url + api + "cable/cable-geo.json"),
+                    )
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Couldn't fetch the map geometry: {e!r}")
+                if logger:
+                    logger.warning("Couldn't fetch the map geometry: %r", e)
+                return
+            geo.update(landing_points=landing_points, cables=cables)
+            if logger:
+                logger.info(msg=f"Got geometry for {len(landing_points.get('features', []))} landing points "
+                            + f"and {len(cables.get('features', []))} cable features.")
+
+        data_creation_time = None
+        if logger or incremental or metrics or journal_file:
+            # data_creation_time is when the data was last updated by Telegeography (I think?)
+            with metrics.span("list_fetch", endpoint="config") if metrics else nullcontext():
+                config = await get_json("config", base_url + api + "config.json")
+            data_creation_time = config["creation_time"]
+            fetch_report["creation_time"] = data_creation_time
+            if logger:
+                logger.info(msg=f"Data creation time is {data_creation_time}")
+                logger.info(msg=f"Connected over {fetch_report['http_version']}.")
+
+        if incremental and cache["cables"] and cache["creation_time"] == data_creation_time:
+            # Nothing changed upstream since the last run, so skip the fan-out
+            # and hand back the cached cables.
+            fetch_report["requested"] = len(cache["cables"])
+            if logger:
+                logger.info(msg=f"Data unchanged since {data_creation_time}. "
+                            + f"Reusing {len(cache['cables'])} cached cables without sending requests.")
+            for entry in cache["cables"].values():
+                body = dict(entry["body"])
+                fetch_report["not_modified"] += 1
+                fetch_report["fetched"] += 1
+                yield body.pop("name"), body
+            # Write the cache back, like the fan-out does, so it is rewritten
+            # in the current format and its creation_time stays confirmed.
+            save_cache({"creation_time": data_creation_time, "cables": cache["cables"]}, cache_path)
+            return
+
+        ##################################
+        #### PREPARE TO SEND REQUESTS ####
+        ##################################
+        # Get urls to all cables on the site.
+        with metrics.span("list_fetch", endpoint="all") if metrics else nullcontext():
+            all_cables = await get_json("all", base_url + api + "cable/all.json")
+
+        if logger:
+            logger.info(msg=f"Got list of cables. Example: {all_cables[0]['name']}")
+
+        # Build request URLs.
+        json_urls = [make_json_url(c, base_url, api) for c in all_cables]
+        fetch_report["requested"] = len(json_urls)
+        if logger:
+            logger.info(msg=f"Made json urls. Example: {json_urls[0]}")
+
+        #######################
+        #### SEND REQUESTS ####
+        #######################
+        # Validators and bodies for the next incremental run, keyed by url.
+        new_cache_entries = {}
+
+        request_start_time = time.perf_counter()
+        retry_deadline = request_start_time + retry_budget
+        if logger:
+            logger.info(msg="Requesting list of cable urls")
+
+        async def fetch(client, limiter, url):
+            # The client already sends SCM_HEADERS; add the validators, if any.
+            entry = cache["cables"].get(url) if incremental else None
+            request_headers = conditional_headers(entry) if entry else None
+
+            # Retry retryable failures with jittered backoff until the
+            # shared retry budget runs out.
+            attempt = 0
+            while True:
+                status = None
+                retry_after = None
+                error = None
+                await limiter.acquire()
+                sent_at = time.perf_counter()
+                try:
+                    response = await client.get(url, headers=request_headers)
+                    status = response.status_code
+                    record_response("cable", status, time.perf_counter() - sent_at,
+                                    response.num_bytes_downloaded)
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+                    if entry and status == 304:
+                        # Unchanged since the last run, reuse the stored body.
+                        fetch_report["not_modified"] += 1
+                        new_cache_entries[url] = entry
+                        if journal:
+                            journal.record(url, entry)
+                        return dict(entry["body"])
+                    if status in RETRYABLE_STATUS:
+                        error = f"HTTP {status}"
+                    elif status != 200:
+                        raise CableFetchError(f"HTTP {status} for {url}")
+                    else:
+                        # A truncated or non-JSON body is worth another try.
+                        body = response.json()
+                except httpx.TransportError as e:
+                    error = repr(e)
+                    record_response("cable", type(e).__name__, time.perf_counter() - sent_at, 0)
+                except ValueError as e:
+                    error = f"Invalid JSON: {e}"
+                finally:
+                    await limiter.release(status, time.perf_counter() - sent_at, retry_after)
+
+                if error is None:
+                    if incremental or journal:
+                        fetched = {
+                            "etag": response.headers.get("etag"),
+                            "last_modified": response.headers.get("last-modified"),
+                            "body": dict(body),
+                        }
+                        if incremental:
+                            new_cache_entries[url] = fetched
+                        if journal:
+                            journal.record(url, fetched)
+                    return body
+
+                delay = max(retry_after or 0.0, backoff_delay(attempt))
+                if time.perf_counter() + delay > retry_deadline:
+                    raise CableFetchError(f"{error} for {url}; retry budget exhausted after {attempt + 1} attempts")
+                if attempt == 0:
+                    fetch_report["retried"] += 1
+                fetch_report["retries"] += 1
+                if logger:
+                    logger.debug("%s for %s. Retrying in %.2f seconds.", error, url, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+        # The old fixed settings were max_at_once=250, max_per_second=125,
+        # hand-halved from 500/250 after the server rate limited us.
+        # The limiter now finds that ceiling itself and backs off on 429/5xx.
+        if limiter is None:
+            limiter = AdaptiveLimiter(
+                max_concurrency=max_concurrency,
+                max_rate=max_rate,
+                target_latency=target_latency,
+            )
+        def log_progress():
+            elapsed = time.perf_counter() - request_start_time
+            done = fetch_report["fetched"] + fetch_report["lost"]
+            logger.info(
+                "Progress: %d of %d cables done (%.0f%%), %d lost, %d retries, "
+                "%.1f cables/s, concurrency %d, rate %.1f/s.",
+                done, len(json_urls), 100.0 * done / max(1, len(json_urls)),
+                fetch_report["lost"], fetch_report["retries"],
+                done / elapsed if elapsed else 0.0, limiter.concurrency, limiter.rate)
+
+        # Cables an interrupted run with this journal already fetched.
+        journal = None
+        resumed = {}
+        if journal_file:
+            journal = ScrapeJournal(journal_file, data_creation_time)
+            resumed = {url: journal.entries[url] for url in json_urls if url in journal.entries}
+            fetch_report["resumed"] = len(resumed)
+            if logger and journal.stale:
+                logger.info(msg=f"Data changed since {journal_file} was written. Starting it over.")
+            elif logger and resumed:
+                logger.info(msg=f"Resuming from {journal_file}: "
+                            + f"{len(resumed)} of {len(json_urls)} cables already fetched.")
+
+        next_progress = request_start_time + PROGRESS_INTERVAL
+        tasks = [asyncio.create_task(fetch(client, limiter, url))
+                 for url in json_urls if url not in resumed]
+        geo_task = asyncio.create_task(fetch_geo()) if geo is not None else None
+        try:
+            for url, entry in resumed.items():
+                body = dict(entry["body"])
+                if incremental:
+                    new_cache_entries[url] = entry
+                fetch_report["fetched"] += 1
+                yield body.pop("name"), body
+
+            for task in asyncio.as_completed(tasks):
+                #########################
+                #### STORE RESPONSES ####
+                #########################
+                try:
+                    r = await task
+                    cable_request_time = time.perf_counter() - request_start_time
+                    cable_name = r.pop("name")
+                    fetch_report["fetched"] += 1
+                except Exception as e:
+                    fetch_report["lost"] += 1
+                    fetch_report["errors"].append(str(e))
+                    if logger:
+                        logger.error(e, exc_info=True)
+                    continue
+
+                if logger:
+                    # Per-cable detail goes to the log file only.
+                    logger.debug("Collected data for %s in %.3f seconds.", cable_name, cable_request_time)
+                    if time.perf_counter() >= next_progress:
+                        log_progress()
+                        next_progress = time.perf_counter() + PROGRESS_INTERVAL
+                yield cable_name, r
+        finally:
+            # Stop outstanding requests if the consumer stops early.
+            for task in tasks:
+                task.cancel()
+            if journal:
+                journal.close()
+            if geo_task and not geo_task.done():
+                if sys.exc_info()[0] is None:
+                    await geo_task
+                else:
+                    geo_task.cancel()
+
+        fetch_report["cable_request_time"] = time.perf_counter() - request_start_time
+        if metrics:
+            metrics.add_span("cable_fanout", request_start_time, time.perf_counter(),
+                             cables=len(json_urls))
+        fetch_report["final_concurrency"] = int(limiter.concurrency)
+        fetch_report["peak_concurrency"] = limiter.peak_concurrency
+        fetch_report["final_rate"] = round(limiter.rate, 1)
+        fetch_report["rate_decreases"] = limiter.decreases
+
+        summary = (f"Fetched {fetch_report['fetched']} of {fetch_report['requested']} cables, "
+                   + f"{fetch_report['retried']} needed retries ({fetch_report['retries']} retries total), "
+                   + f"{fetch_report['lost']} lost.")
+        if logger:
+            logger.info(msg=summary)
+        elif fetch_report["lost"]:
+            print(summary)
+
+        if incremental:
+            # Only trust creation_time for skipping the next fan-out if every
+            # cable made it into the cache; otherwise the next run revalidates.
+            complete = len(new_cache_entries) == len(json_urls)
+            save_cache(
+                {"creation_time": data_creation_time if complete else None,
+                 "cables": new_cache_entries},
+                cache_path
+            )
+            if logger:
+                logger.info(msg=f"{fetch_report['not_modified']} of {len(json_urls)} cables were not modified.")
+
+
 def scm_scraper(
     base_url=SCM_BASE_URL,
     api=SCM_API,
     scraper_name="scm_scraper",
     start_datetime=datetime.datetime.utcnow().isoformat(timespec="milliseconds"),
-    write_log=False,):
+    write_log=False,
+    incremental=False,
+    cache_path=SCM_CACHE_PATH,
+    max_concurrency=250,
+    max_rate=250,
+    target_latency=2.0,
+    retry_budget=120,
+    report=None,
+    metrics=None,
+    run_id=None,
+    journal_dir=None,
+    geo=None,):
     """Scrapes data for all cables on submarinecablemap.com.
 
     Returns a dict of cable names mapped to its data.
+
+    If incremental is True, the scraper keeps a validator cache at cache_path.
+    When config.json's creation_time matches the cached one, the cached cables
+    are returned without requesting any cable. Otherwise each cable request
+    carries If-None-Match/If-Modified-Since and a 304 reuses the cached body.
+
+    Every request shares one pooled HTTP client (see make_client()).
+    Cable requests go through an AdaptiveLimiter that grows concurrency and
+    rate up to max_concurrency/max_rate and halves them on 429s, 5xx
+    responses, transport errors and responses slower than target_latency.
+    Failed cables are retried with jittered backoff for up to retry_budget
+    seconds. Counts of fetched, retried and lost cables are written into the
+    report dict, if one is given.
+
+    If metrics (a run_metrics.RunMetrics) is given, the list fetch and the
+    cable fan-out are recorded as spans, along with each request's latency,
+    status and response size.
+
+    run_id (a "<start datetime>_<uuid>") replaces the generated one. If
+    journal_dir is given, fetched cables are journaled there under the run
+    id as they arrive, and a run given the run id of an interrupted one
+    only requests the cables its journal is missing. The journal is left in
+    place; remove it with scrapers.journal.remove_journal() once the data
+    is safely stored.
+
+    If geo is a dict, the map's landing point and cable GeoJSON
+    (landing-point-geo.json and cable-geo.json) are fetched into it as
+    {"landing_points": ..., "cables": ...}. It stays empty if they can't
+    be fetched or the incremental scrape finds nothing changed.
+
+    Errors (the cable list can't be fetched, say) are logged and raised.
     """
+    logger = None
+    journal_file = None
     try:
         func_start_time = time.perf_counter()
         ###############
@@ -98,7 +593,12 @@ def scm_scraper(
         ###############
         # Uniq ID for this run of the scraper. 
         # Currently only using the first 8 characters.
-        uuid = str(uuid4().hex)[:8]
+        if run_id:
+            start_datetime, uuid = run_id.rsplit("_", 1)
+        else:
+            uuid = str(uuid4().hex)[:8]
+        if journal_dir:
+            journal_file = journal_path(start_datetime + "_" + uuid, journal_dir)
 
         # Set up the logger.
         if write_log:
@@ -107,84 +607,31 @@ def scm_scraper(
             # log the start of the process.
             logger.info(msg=f"RUNNING SCM_SCRAPER_V{SCRAPER_VERSION} INSTANCE {uuid}.")
 
-        ##################################
-        #### PREPARE TO SEND REQUESTS ####
-        ##################################
-        # Get urls to all cables on the site.
-        all_cables = requests.get(url=base_url + api + "cable/all.json")
-        all_cables = all_cables.json()
-
-        if write_log:
-            logger.info(msg=f"Got list of cables. Example: {all_cables[0]['name']}")
-            # data_creation_time is when the data was last updated by Telegeography (I think?)
-            data_creation_time = requests.get(url=base_url + api + "config.json").json()["creation_time"]
-            logger.info(msg=f"Data creation time is {data_creation_time}")
-
-        # Build request URLs.
-        json_urls = [make_json_url(c) for c in all_cables]
-        if write_log:
-            logger.info(msg=f"Made json urls. Example: {json_urls[0]}")
-
-        # Set custom headers
-        headers = { 
-            "accept": "*/*",
-            "accept-language":"en-GB,en-US;q=0.9,en;q=0.8,es;q=0.7",
-            "cache-control": "no-cache",
-            "referer": "https://www.submarinecablemap.com/",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36",
-            "content-type": "application/json"
-        }
-
-        #######################
-        #### SEND REQUESTS ####
-        #######################
         # Collect cable data in one dictionary.
         cables = {}
-
-        if write_log:
-            logger.info(msg="Requesting list of cable urls".format(request_start_time:=time.perf_counter()))
-
-        async def fetch(client, url):
-            response = await client.get(url, headers=headers)
-            return response.json()
-
-        async def send_requests(urls):
-            async with httpx.AsyncClient() as client:
-                async with aiometer.amap(
-                    functools.partial(fetch,client),
-                    urls,
-                    # The below settings got me the fastest time's I've had!
-                    # max_at_once=500, max_per_second=250
-                    # 0:00:03.478834
-                    # 0:00:03.512974
-                    # 0:00:03.648152
-                    # 0:00:03.891524
-                    # I've halved the above settings bc server rate limiting.
-                    max_at_once=250,
-                    max_per_second=125
-                ) as responses:
-                    async for r in responses:
-                        #########################
-                        #### STORE RESPONSES ####
-                        #########################
-                        try:
-                            cable_request_time = format((time.perf_counter() - request_start_time), ".3f")
-                            cable_name = r.pop("name")
-                            cables[cable_name] = r
-
-                            if write_log:
-                                logger.info(msg=f"Collected data for {cable_name} in {cable_request_time} seconds.")
-
-                        except Exception as e:
-                            # TODO: Better exception handling for cable response errors.
-                            print(e)
-                            if write_log:
-                                logger.error(e, exc_info=True)
-                            continue
+        fetch_report = report if report is not None else {}
+
+        async def collect():
+            async for cable_name, cable_data in scm_stream(
+                base_url=base_url,
+                api=api,
+                logger=logger,
+                incremental=incremental,
+                cache_path=cache_path,
+                max_concurrency=max_concurrency,
+                max_rate=max_rate,
+                target_latency=target_latency,
+                retry_budget=retry_budget,
+                report=fetch_report,
+                metrics=metrics,
+                journal_file=journal_file,
+                geo=geo,
+            ):
+                cables[cable_name] = cable_data
 
         # Send the requests.
-        asyncio.run(send_requests(json_urls))
-        cable_total_time = format((time.perf_counter() - request_start_time), ".3f")
+        asyncio.run(collect())
+        cable_total_time = format(fetch_report.get("cable_request_time", 0.0), ".3f")
 
         ###########################
         #### FINISH AND RETURN ####
@@ -205,12 +652,24 @@ def scm_scraper(
         return cables
 
     except Exception as e:
-        print(e)
-        if write_log:
+        if logger:
             logger.error(e, exc_info=True)
+        if journal_file and journal_file.exists():
+            print(f"Cables fetched so far are journaled in {journal_file}.")
+        raise
 
+    finally:
+        # Flush the log before handing back the data.
+        if logger:
+            close_logger(logger)
 
-def main():
+
+def main(snapshot_format="json"):
+    """Scrape and write the cables to ./update/data/.
+
+    snapshot_format is "json" (sorted, indented) or "ndjson" (compact gzip
+    NDJSON with an offset index; see update/snapshot_format.py).
+    """
     # Datetime of run in UTC, formatted like '2025-04-27T14:31:11.854'
     start_datetime = datetime.datetime.utcnow().isoformat(timespec="milliseconds")
     # For tracking scraper function performance.
@@ -228,6 +687,14 @@ def main():
     # Build the path and name of the output file.
     # Log file name has the format "scm_scraper_" + date + "_" + uuid + ".log"
     # SCM data file has the format "scm_data_" + date + "_" + uuid + ".json"
+    # (or ".ndjson.gz" for the compact format)
+    if snapshot_format == "ndjson":
+        from snapshot_format import NDJSON_SUFFIX, write_snapshot
+        scm_data_path = Path("./update/data/scm_data_" + scraper_date_uuid + NDJSON_SUFFIX)
+        write_snapshot(scm_data, scm_data_path)
+        print(f"Wrote scm cable data to {scm_data_path}.")
+        return
+
     scm_data_path = Path("./update/data/scm_data_" + scraper_date_uuid + ".json")
     scm_data_path.parent.mkdir(parents=True, exist_ok=True)
 
@@ -239,9 +706,15 @@ def main():
         except (TypeError, Exception) as exc:
             print(exc)
             print("Could not write scm cable data.")
-            print(f"Log Number: {num}\n")
+            print(f"Log: {scraper_date_uuid}\n")
             print(f"Cables:\n\n {scm_data}")
 
 
 if __name__ == '__main__':
-    main()
+    import argparse
+    # Make update/ importable (for snapshot_format) when run as a script.
+    sys.path.append(str(Path(__file__).absolute().parent.parent))
+    parser = argparse.ArgumentParser(description="Scrape cable data from submarinecablemap.com.")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                        help="snapshot format to write (default: json)")
+    main(snapshot_format=parser.parse_args().format)
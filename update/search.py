@@ -0,0 +1,102 @@
+"""Full-text search index over the cables, kept in the database by write_db().
+
+cable_fts is an FTS5 table with one row per cable (rowid = cable.id):
+
+    name, code            the cable's own
+    owners, suppliers     comma-separated names
+    landing_points        comma-separated landing point names
+    countries             comma-separated names of the countries it lands in
+    notes
+
+Text is tokenized with unicode61, folding case and diacritics ("Sao"
+matches "São"), and prefix indexes make the prefix queries match_query()
+builds as cheap as whole-word ones. Bulk loads index every cable at the
+end (index_cables(cur)); incremental writes reindex just the cables they
+touched (index_cables(cur, cable_ids)). See query.search_cables() for the
+ranked search.
+"""
+
+
+# Searchable columns, in table order, with their bm25 weights.
+SEARCH_FIELDS = {
+    "name": 10.0,
+    "code": 8.0,
+    "owners": 4.0,
+    "suppliers": 3.0,
+    "landing_points": 2.0,
+    "countries": 2.0,
+    "notes": 1.0,
+}
+
+SEARCH_TABLE_SQL = f"""CREATE VIRTUAL TABLE IF NOT EXISTS cable_fts USING fts5(
+                {", ".join(SEARCH_FIELDS)},
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
+                )"""
+
+
+def _names(link_table, entity_table, entity_id):
+    """Comma-separated names of a cable's (c) linked entities, in name order."""
+    return f"""(SELECT group_concat(name, ', ') FROM (
+                SELECT DISTINCT e.name FROM {link_table} x
+                JOIN {entity_table} e ON e.id = x.{entity_id}
+                WHERE x.cable_id = c.id ORDER BY e.name))"""
+
+
+INDEX_CABLES_SQL = f"""
+    INSERT INTO cable_fts (rowid, {", ".join(SEARCH_FIELDS)})
+    SELECT c.id, c.name, c.code,
+        {_names("cable_owner", "owner", "owner_id")},
+        {_names("cable_supplier", "supplier", "supplier_id")},
+        {_names("cable_point", "point", "point_id")},
+        (SELECT group_concat(name, ', ') FROM (
+            SELECT DISTINCT k.name FROM cable_point x
+            JOIN point p ON p.id = x.point_id JOIN country k ON k.id = p.country_id
+            WHERE x.cable_id = c.id ORDER BY k.name)),
+        c.notes
+    FROM cable c"""
+
+
+def create_search_tables(cur):
+    cur.execute(SEARCH_TABLE_SQL)
+
+
+def index_cables(cur, cable_ids=None):
+    """(Re)index the cables with cable_ids, or every cable if None.
+
+    Ids of cables that no longer exist just drop out of the index. Needs
+    the intersection tables' cable_id indexes to be fast.
+    """
+    if cable_ids is None:
+        cur.execute("DELETE FROM cable_fts")
+        cur.execute(INDEX_CABLES_SQL)
+        return
+    ids = [[c_id] for c_id in cable_ids]
+    cur.executemany("DELETE FROM cable_fts WHERE rowid = ?", ids)
+    cur.executemany(INDEX_CABLES_SQL + " WHERE c.id = ?", ids)
+
+
+def ensure_indexed(cur):
+    """Index every cable if the index is missing some (a database from before it existed)."""
+    missing, = cur.execute(
+        "SELECT (SELECT count(*) FROM cable) > (SELECT count(*) FROM cable_fts)").fetchone()
+    if missing:
+        index_cables(cur)
+
+
+def match_query(text, fields=None):
+    """An FTS5 query matching every word of text as a prefix, optionally in fields only.
+
+    Words are quoted, so FTS5 operators and punctuation in text are taken
+    literally. Returns None if text has no words.
+    """
+    words = text.split()
+    if not words:
+        return None
+    query = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+    if fields:
+        unknown = set(fields) - set(SEARCH_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown search fields: {', '.join(sorted(unknown))}")
+        query = "{" + " ".join(fields) + "} : (" + query + ")"
+    return query
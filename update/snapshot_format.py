@@ -0,0 +1,149 @@
+"""Compact, streamable snapshot format: gzip-compressed NDJSON with an offset index.
+
+A snapshot is written as
+
+    scm_data_<date_uuid>.ndjson.gz       one gzip member per cable, each
+                                         holding one line [name, data]
+    scm_data_<date_uuid>.ndjson.gz.idx   JSON {cable name: [offset, length]}
+
+Concatenated gzip members are still one valid gzip file, so the whole
+snapshot streams with gzip.open(), while the index lets a reader seek
+straight to one cable and decompress only that member. Cables are
+appended as they arrive; the index is written when the file is closed.
+
+load_snapshot() reads either this format or the indented JSON format, so
+the other modules don't need to care which one a run used, and
+export_json() turns a compact snapshot back into the pretty JSON file.
+"""
+import gzip
+import os
+import zlib
+from json import dump, dumps, load, loads
+from pathlib import Path
+
+
+NDJSON_SUFFIX = ".ndjson.gz"
+INDEX_SUFFIX = ".idx"
+
+
+def snapshot_run_id(path):
+    """The <date>_<uuid> part of a scm_data_<date>_<uuid> snapshot file name."""
+    name = Path(path).name
+    for suffix in (NDJSON_SUFFIX, ".json"):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+            break
+    return "_".join(name.split("_")[-2:])
+
+
+def is_ndjson(path):
+    return str(path).endswith(NDJSON_SUFFIX)
+
+
+def index_path(path):
+    path = Path(path)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+class SnapshotWriter:
+    """Appends cables to a compact snapshot file as they arrive.
+
+        with SnapshotWriter(path) as writer:
+            for cable_name, cable_data in cables:
+                writer.write(cable_name, cable_data)
+    """
+    def __init__(self, path, compresslevel=6):
+        self.path = Path(path).absolute()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.compresslevel = compresslevel
+        self.file = open(self.path, "wb")
+        self.index = {}
+
+    def write(self, cable_name, cable_data):
+        line = dumps([cable_name, cable_data], ensure_ascii=False, sort_keys=True,
+                     separators=(",", ":")) + "\n"
+        member = gzip.compress(line.encode("utf-8"), compresslevel=self.compresslevel, mtime=0)
+        self.index[cable_name] = [self.file.tell(), len(member)]
+        self.file.write(member)
+
+    def close(self):
+        self.file.close()
+        # Write the index last and atomically; a snapshot without an index
+        # can still be streamed, just not seeked into.
+        idx_path = index_path(self.path)
+        tmp_path = idx_path.with_name(idx_path.name + ".tmp")
+        with open(tmp_path, "wt", encoding="utf-8") as f:
+            dump(self.index, f, ensure_ascii=False)
+        os.replace(tmp_path, idx_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_snapshot(cables, path, compresslevel=6):
+    """Write a snapshot dict ({cable name: cable data}) in the compact format."""
+    with SnapshotWriter(path, compresslevel) as writer:
+        for cable_name, cable_data in cables.items():
+            writer.write(cable_name, cable_data)
+    return Path(path).absolute()
+
+
+def iter_snapshot(path):
+    """Yield (cable name, cable data) from a snapshot file of either format."""
+    path = Path(path).absolute().resolve()
+    if is_ndjson(path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                cable_name, cable_data = loads(line)
+                yield cable_name, cable_data
+    else:
+        yield from load_snapshot(path).items()
+
+
+def load_index(path):
+    with open(index_path(Path(path).absolute().resolve()), "rt", encoding="utf-8") as f:
+        return load(f)
+
+
+def read_cable(path, cable_name, index=None):
+    """Read one cable from a compact snapshot without parsing the rest.
+
+    Returns None if the snapshot has no such cable. Pass index (from
+    load_index) when reading many cables from the same file.
+    """
+    path = Path(path).absolute().resolve()
+    if index is None:
+        index = load_index(path)
+    if cable_name not in index:
+        return None
+    offset, length = index[cable_name]
+    with open(path, "rb") as f:
+        f.seek(offset)
+        member = f.read(length)
+    # wbits=31: expect a gzip header and trailer.
+    return loads(zlib.decompress(member, wbits=31).decode("utf-8"))[1]
+
+
+def load_snapshot(path):
+    """Load a snapshot file of either format into {cable name: cable data}.
+
+    An empty file (the no_data.json placeholder) is an empty snapshot.
+    """
+    path = Path(path).absolute().resolve()
+    if is_ndjson(path):
+        return dict(iter_snapshot(path))
+    with open(path, "rt", encoding="utf-8") as f:
+        text = f.read()
+    return loads(text) if text.strip() else {}
+
+
+def export_json(path, json_path):
+    """Export a compact snapshot as the sorted, indented JSON snapshot format."""
+    json_path = Path(json_path).absolute()
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(json_path, "wt", encoding="utf-8") as f:
+        dump(load_snapshot(path), f, ensure_ascii=False, sort_keys=True, indent=4)
+    return json_path
@@ -0,0 +1,210 @@
+"""Content-addressed, deduplicated history of scraped snapshots.
+
+Instead of keeping a full JSON snapshot and a full copy of scn.db for every
+run, each run is stored as
+
+    objects/<hash[:2]>/<hash[2:]>   one zlib-compressed object per distinct
+                                    cable (canonical JSON of [name, data]),
+                                    plus one per distinct list of cable hashes
+    manifests/<run_id>.json         a few hundred bytes naming the run's
+                                    cable list object
+
+Objects are keyed by the same sha1 as clean_data.cable_hash(), so a cable
+that doesn't change is stored once no matter how many runs include it, and
+runs with identical data share their cable list too. Any stored run can be
+turned back into a snapshot dict (load_snapshot) or a database
+(reconstruct_db).
+"""
+import datetime
+import os
+import zlib
+from hashlib import sha1
+from json import dump, dumps, load, loads
+from pathlib import Path
+from clean_data import parse_data
+from history import HISTORY_TABLES, carry_history, record_history
+from snapshot_format import load_snapshot as load_snapshot_file, snapshot_run_id
+from write_db import (INSERT_SQL, build_db, bulk_insert, create_tables, open_db, previous_ids,
+                      scratch_path)
+
+
+STORE_DIR = "./update/data/store/"
+
+
+def canonical_json(value):
+    return dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def _object_path(store_dir, digest):
+    return store_dir / "objects" / digest[:2] / digest[2:]
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def put_object(store_dir, value):
+    """Store value's canonical JSON if it isn't stored already. Returns its hash.
+    """
+    data = canonical_json(value).encode("utf-8")
+    digest = sha1(data).hexdigest()
+    path = _object_path(store_dir, digest)
+    if not path.exists():
+        _write_atomic(path, zlib.compress(data, 9))
+    return digest
+
+
+def get_object(store_dir, digest):
+    with open(_object_path(store_dir, digest), "rb") as f:
+        return loads(zlib.decompress(f.read()).decode("utf-8"))
+
+
+class ManifestWriter:
+    """Adds one run's cables to the store as they arrive.
+
+        manifest = ManifestWriter(run_id)
+        for cable_name, cable_data in cables:
+            manifest.add(cable_name, cable_data)
+        manifest.close()
+    """
+    def __init__(self, run_id, store_dir=STORE_DIR):
+        self.run_id = run_id
+        self.store_dir = Path(store_dir).absolute()
+        self.hashes = []
+
+    def add(self, cable_name, cable_data):
+        self.hashes.append(put_object(self.store_dir, [cable_name, cable_data]))
+
+    def close(self, **metadata):
+        """Write the run's manifest. metadata (e.g. creation_time) is stored with it.
+        """
+        manifest = {
+            "run_id": self.run_id,
+            "stored_at": datetime.datetime.utcnow().isoformat(timespec="milliseconds"),
+            "cables": len(self.hashes),
+            "index": put_object(self.store_dir, sorted(self.hashes)),
+            **metadata,
+        }
+        manifest_path = self.store_dir / "manifests" / (self.run_id + ".json")
+        _write_atomic(manifest_path, dumps(manifest, ensure_ascii=False, indent=4).encode("utf-8"))
+        return manifest_path
+
+
+def store_snapshot(cables, run_id, store_dir=STORE_DIR, **metadata):
+    """Store a snapshot dict ({cable name: cable data}) as run run_id.
+    """
+    manifest = ManifestWriter(run_id, store_dir)
+    for cable_name, cable_data in cables.items():
+        manifest.add(cable_name, cable_data)
+    return manifest.close(**metadata)
+
+
+def list_snapshots(store_dir=STORE_DIR):
+    """Run ids of all stored snapshots, oldest first."""
+    manifests_dir = Path(store_dir).absolute() / "manifests"
+    if not manifests_dir.exists():
+        return []
+    return sorted(p.stem for p in manifests_dir.glob("*.json"))
+
+
+def has_snapshot(run_id, store_dir=STORE_DIR):
+    return (Path(store_dir).absolute() / "manifests" / (run_id + ".json")).exists()
+
+
+def load_manifest(run_id, store_dir=STORE_DIR):
+    with open(Path(store_dir).absolute() / "manifests" / (run_id + ".json"), "rt", encoding="utf-8") as f:
+        return load(f)
+
+
+def iter_snapshot(run_id, store_dir=STORE_DIR):
+    """Yield (cable name, cable data) for every cable of a stored run."""
+    store_dir = Path(store_dir).absolute()
+    for digest in get_object(store_dir, load_manifest(run_id, store_dir)["index"]):
+        cable_name, cable_data = get_object(store_dir, digest)
+        yield cable_name, cable_data
+
+
+def load_snapshot(run_id, store_dir=STORE_DIR):
+    """Rebuild the snapshot dict ({cable name: cable data}) of a stored run."""
+    return dict(iter_snapshot(run_id, store_dir))
+
+
+def export_snapshot(run_id, path, store_dir=STORE_DIR):
+    """Write a stored run back out as the usual indented JSON snapshot file."""
+    path = Path(path).absolute()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wt", encoding="utf-8") as f:
+        dump(load_snapshot(run_id, store_dir), f, ensure_ascii=False, sort_keys=True, indent=4)
+    return path
+
+
+def run_datetime(run_id):
+    """The start datetime part of a <date>_<uuid> run id."""
+    return run_id.rsplit("_", 1)[0]
+
+
+def reconstruct_db(run_id, db_path, store_dir=STORE_DIR, resolver=None):
+    """Build the database a stored run would have produced at db_path.
+
+    Pass update_db()'s entities.EntityResolver as resolver to get its
+    canonical owner and supplier names. Cables and entities the database
+    already at db_path has keep their ids.
+    """
+    cleaned_data = parse_data(load_snapshot(run_id, store_dir), resolver, previous_ids(db_path))
+    build_db(db_path, cleaned_data, run_datetime(run_id),
+             creation_time=load_manifest(run_id, store_dir).get("creation_time"))
+    return Path(db_path).absolute()
+
+
+def rebuild_history(db_path, store_dir=STORE_DIR, resolver=None):
+    """Replace the history tables of the database at db_path with every stored run's.
+
+    Replays the stored runs oldest first through a scratch database, so a
+    database can get the history of runs made before it kept one. As in
+    reconstruct_db(), resolver canonicalizes owners and suppliers.
+    """
+    db_path = Path(db_path).absolute()
+    tmp_path = scratch_path(db_path)
+    scratch = open_db(tmp_path)
+    try:
+        cur = scratch.cursor()
+        create_tables(cur)
+        for run_id in list_snapshots(store_dir):
+            for table in INSERT_SQL:
+                cur.execute(f"DELETE FROM {table}")
+            bulk_insert(cur, parse_data(load_snapshot(run_id, store_dir), resolver))
+            scratch.commit()
+            record_history(scratch, run_datetime(run_id))
+        scratch.close()
+
+        db = open_db(db_path)
+        create_tables(db.cursor())
+        with db:
+            for table in HISTORY_TABLES:
+                db.execute(f"DELETE FROM {table}")
+        carry_history(db, tmp_path)
+        db.close()
+    finally:
+        scratch.close()
+        tmp_path.unlink(missing_ok=True)
+    return db_path
+
+
+def import_snapshot_file(path, run_id=None, store_dir=STORE_DIR):
+    """Add an existing snapshot file (JSON or compact) to the store.
+
+    run_id defaults to the file's date_uuid (scm_data_<date>_<uuid>.json).
+    Returns the run id, or None if the file is empty.
+    """
+    path = Path(path).absolute().resolve()
+    if run_id is None:
+        run_id = snapshot_run_id(path)
+    cables = load_snapshot_file(path)
+    if not cables:
+        return None
+    store_snapshot(cables, run_id, store_dir)
+    return run_id
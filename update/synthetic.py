@@ -0,0 +1,198 @@
+"""Generates synthetic snapshots shaped like the scraped submarinecablemap.com data.
+
+    from synthetic import make_snapshot, churn_snapshot
+
+    previous = make_snapshot(scale=10)        # ~10x today's cable count
+    current = churn_snapshot(previous, 0.05)  # 5% of cables added/removed/changed
+    geo = make_geo(current)                   # matching landing point and cable GeoJSON
+
+Snapshots are dicts of {cable name: cable data}, exactly what scm_scraper()
+returns, so they can go anywhere real data goes (parse_data, write_db,
+diff_snapshots, the snapshot store, ...). Output is deterministic for a
+given seed.
+"""
+import copy
+import hashlib
+import random
+
+
+# Vertices per leg between two landing points in make_geo()'s cable lines.
+LEG_VERTICES = 4
+
+# Roughly today's submarinecablemap.com counts (scale=1).
+CABLES = 700
+LANDING_POINTS = 1400
+COUNTRIES = 180
+OWNERS = 1100
+SUPPLIERS = 40
+
+WORDS = ["Atlantic", "Pacific", "Indian", "Arctic", "Express", "Gateway", "Link",
+         "Ring", "Crossing", "Bridge", "North", "South", "East", "West", "Blue",
+         "Coral", "Pearl", "Dragon", "Falcon", "Orca", "Horizon", "Meridian"]
+
+
+def _name(rng, words=2):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _pick(rng, names, most, alpha=1.5):
+    """1 to most distinct names, favouring the first ("most popular") ones."""
+    count = min(len(names), most, int(rng.paretovariate(alpha)))
+    picked = set()
+    while len(picked) < count:
+        picked.add(names[min(int(rng.expovariate(4.0 / len(names))), len(names) - 1)])
+    return sorted(picked)
+
+
+class Universe:
+    """The landing points, owners and suppliers cables are built from."""
+    def __init__(self, points, owners, suppliers):
+        self.points = points
+        self.owners = owners
+        self.suppliers = suppliers
+
+    @classmethod
+    def generate(cls, rng, scale):
+        countries = [f"{_name(rng, 1)}land {i}" for i in range(COUNTRIES)]
+        points = []
+        for i in range(max(2, int(LANDING_POINTS * scale))):
+            country = rng.choice(countries)
+            points.append({"id": f"landing-point-{i}",
+                           "name": f"{_name(rng, 1)} Bay {i}, {country}",
+                           "country": country})
+        owners = [f"{_name(rng)} Telecom {i}" for i in range(max(1, int(OWNERS * scale)))]
+        suppliers = [f"{_name(rng, 1)} Networks {i}" for i in range(SUPPLIERS)]
+        return cls(points, owners, suppliers)
+
+    @classmethod
+    def of(cls, snapshot):
+        """The landing points, owners and suppliers an existing snapshot uses."""
+        points = {}
+        owners = set()
+        suppliers = set()
+        for data in snapshot.values():
+            for point in data["landing_points"]:
+                points[point["id"]] = point
+            owners.update(data["owners"].split(", "))
+            if data["suppliers"]:
+                suppliers.update(data["suppliers"].split(", "))
+        return cls([points[code] for code in sorted(points)], sorted(owners),
+                   sorted(suppliers) or ["Synthetic Networks"])
+
+
+def make_cable(rng, universe, number):
+    """One cable's (name, data), with SCM's field names and value types."""
+    cable_id = f"synthetic-cable-{number}"
+    name = f"{_name(rng)} {number}"
+    rfs_year = rng.choice([None] + list(range(1990, 2031)))
+    point_count = min(len(universe.points), 1 + int(rng.paretovariate(1.2)), 40)
+    suppliers = _pick(rng, universe.suppliers, 3) if rng.random() < 0.7 else None
+    return name, {
+        "id": cable_id,
+        "is_planned": rfs_year is not None and rfs_year > 2025,
+        "landing_points": [dict(p) for p in rng.sample(universe.points, point_count)],
+        "length": rng.choice([None, f"{rng.randint(10, 45000):,} km"]),
+        "notes": rng.choice([None, None, None, "Synthetic cable used for benchmarking."]),
+        "owners": ", ".join(_pick(rng, universe.owners, 12, alpha=1.2)),
+        "rfs": None if rfs_year is None else f"{rng.choice(['January', 'June', 'Q3'])} {rfs_year}",
+        "rfs_year": rfs_year,
+        "suppliers": ", ".join(suppliers) if suppliers else None,
+        "url": rng.choice([None, f"https://example.com/{cable_id}"]),
+    }
+
+
+def make_snapshot(scale=1, seed=0):
+    """A snapshot with about scale times today's cables and landing points."""
+    rng = random.Random(seed)
+    universe = Universe.generate(rng, scale)
+    snapshot = {}
+    for number in range(max(1, int(CABLES * scale))):
+        name, data = make_cable(rng, universe, number)
+        snapshot[name] = data
+    return snapshot
+
+
+def churn_snapshot(snapshot, churn=0.05, seed=1):
+    """A copy of snapshot with about churn of its cables added, removed or changed.
+
+    The churned cables are split evenly between the three. A change edits
+    the notes, the length, the owners or the landing points; new cables use
+    the snapshot's existing landing points, owners and suppliers.
+    """
+    rng = random.Random(seed)
+    churned = copy.deepcopy(snapshot)
+    universe = Universe.of(snapshot)
+    names = sorted(churned)
+    count = int(len(names) * churn)
+    added = removed = count // 3
+    changed = count - added - removed
+
+    victims = rng.sample(names, removed + changed)
+    for name in victims[:removed]:
+        del churned[name]
+
+    for name in victims[removed:]:
+        data = churned[name]
+        change = rng.randrange(4)
+        if change == 0:
+            data["notes"] = f"Changed by churn_snapshot (seed {seed})."
+        elif change == 1:
+            data["length"] = f"{rng.randint(10, 45000):,} km"
+        elif change == 2:
+            owners = set(data["owners"].split(", ")) | {rng.choice(universe.owners)}
+            data["owners"] = ", ".join(sorted(owners))
+        else:
+            data["landing_points"].append(dict(rng.choice(universe.points)))
+
+    for number in range(added):
+        name, data = make_cable(rng, universe, f"{seed}-{number}")
+        churned[name] = data
+    return churned
+
+
+def point_location(code):
+    """A landing point's (longitude, latitude), made up from its code so it never changes."""
+    digest = hashlib.sha1(code.encode("utf-8")).digest()
+    lon = int.from_bytes(digest[:4], "big") / 2**32 * 360 - 180
+    lat = int.from_bytes(digest[4:8], "big") / 2**32 * 130 - 60
+    return round(lon, 5), round(lat, 5)
+
+
+def make_geo(snapshot):
+    """The landing-point-geo.json and cable-geo.json GeoJSON for a snapshot.
+
+    Returns {"landing_points": ..., "cables": ...}, what scm_scraper() fetches
+    into its geo dict. Each cable is a line through its landing points, with
+    LEG_VERTICES vertices per leg, split into a MultiLineString where a leg
+    would cross the antimeridian, as the real map does.
+    """
+    points = {}
+    cable_features = []
+    for data in snapshot.values():
+        lines = [[]]
+        for point in data["landing_points"]:
+            points[point["id"]] = point
+            lon, lat = point_location(point["id"])
+            line = lines[-1]
+            if line:
+                (start_lon, start_lat), steps = line[-1], LEG_VERTICES
+                if abs(lon - start_lon) > 180:
+                    lines.append([])
+                else:
+                    line.extend([round(start_lon + (lon - start_lon) * i / steps, 5),
+                                 round(start_lat + (lat - start_lat) * i / steps, 5)]
+                                for i in range(1, steps))
+            lines[-1].append([lon, lat])
+        cable_features.append({
+            "type": "Feature",
+            "properties": {"id": data["id"], "feature_id": data["id"] + "-0"},
+            "geometry": {"type": "MultiLineString", "coordinates": [line for line in lines if len(line) > 1]},
+        })
+
+    point_features = [{
+        "type": "Feature",
+        "properties": {"id": code, "name": point["name"]},
+        "geometry": {"type": "Point", "coordinates": list(point_location(code))},
+    } for code, point in sorted(points.items())]
+    return {"landing_points": {"type": "FeatureCollection", "features": point_features},
+            "cables": {"type": "FeatureCollection", "features": cable_features}}
@@ -0,0 +1,42 @@
+"""Shared fixtures. The modules under update/ import each other by plain name, so
+update/ goes on sys.path the way running a script from it would put it there.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import query  # noqa: E402
+
+
+@pytest.fixture
+def cable():
+    """Build one (cable name, cable data) pair in submarinecablemap.com's format.
+
+    points are (point code, country) pairs; owners and suppliers are
+    comma-separated, as the site has them.
+    """
+    def make(code, name=None, points=(), owners="Owner A", suppliers=None, length=None):
+        return (name or f"Cable {code}", {
+            "id": code,
+            "is_planned": False,
+            "landing_points": [{"id": p_code, "name": f"{p_code}, {country}", "country": country}
+                               for p_code, country in points],
+            "length": length,
+            "notes": None,
+            "owners": owners,
+            "rfs": None,
+            "rfs_year": None,
+            "suppliers": suppliers,
+            "url": None,
+        })
+    return make
+
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    """Close query.py's pooled connections, so each test's databases can be removed."""
+    yield
+    query.clear_cache()
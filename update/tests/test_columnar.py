@@ -0,0 +1,44 @@
+import numpy as np
+
+from clean_data import parse_data
+from columnar import export_db, load_export, load_manifest, publish_export
+from write_db import write_db
+
+
+def test_export_round_trip(tmp_path, cable):
+    write_db(parse_data(dict([
+        cable("a", points=[("p1", "Xland"), ("p2", "Yland")], length="1,200 km"),
+        cable("b", points=[("p2", "Yland")]),
+    ])), db_dir=tmp_path)
+
+    export_dir = export_db(tmp_path / "scn.db", tmp_path / "export", run_id="r1")
+    tables = load_export(export_dir)
+
+    cable_table = tables["cable"]
+    assert cable_table["code"].decode().tolist() == ["a", "b"]
+    assert cable_table["length"].values[cable_table["length"].valid].tolist() == [1200]
+    assert cable_table["length"].valid.tolist() == [True, False]
+    assert cable_table["url"].decode().tolist() == [None, None]
+    # The intersection tables join on the entity ids.
+    points = dict(zip(tables["point"]["id"].values.tolist(), tables["point"]["code"].decode()))
+    cable_ids = cable_table["id"].values
+    a_points = tables["cable_point"]["point_id"].values[
+        tables["cable_point"]["cable_id"].values == cable_ids[0]]
+    assert sorted(points[p] for p in a_points.tolist()) == ["p1", "p2"]
+    assert tables["country"]["name"].code("Yland") >= 0
+    assert tables["country"]["name"].code("Atlantis") == -1
+    assert load_manifest(export_dir)["run_id"] == "r1"
+    assert set(load_export(export_dir, tables=["owner"])) == {"owner"}
+    assert isinstance(cable_table["id"].values, np.ndarray)
+
+
+def test_publish_export_keeps_latest_only(tmp_path, cable):
+    write_db(parse_data(dict([cable("a")])), db_dir=tmp_path)
+    columnar_dir = tmp_path / "columnar"
+
+    publish_export(tmp_path / "scn.db", "r1", columnar_dir)
+    publish_export(tmp_path / "scn.db", "r2", columnar_dir)
+
+    assert (columnar_dir / "latest").resolve() == columnar_dir / "r2"
+    assert not (columnar_dir / "r1").exists()
+    assert load_export(columnar_dir / "latest")["cable"]["code"].decode().tolist() == ["a"]
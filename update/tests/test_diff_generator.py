@@ -0,0 +1,34 @@
+from diff_generator import diff_snapshots
+
+
+def test_diff_snapshots(cable):
+    kept = cable("kept", points=[("p1", "Xland")])
+    renamed = cable("renamed", points=[("p2", "Yland")])
+    moved = cable("moved", points=[("p3", "Zland"), ("p4", "Wland")], length="100 km")
+    gone = cable("gone")
+    previous = dict([kept, renamed, moved, gone])
+
+    new = cable("new")
+    # Landing points are matched by id, so reordering them isn't a change.
+    moved_now = cable("moved", points=[("p4", "Wland"), ("p5", "Vland")], length="120 km")
+    current = dict([kept, cable("renamed", name="Renamed Cable", points=[("p2", "Yland")]),
+                    moved_now, new])
+
+    diff = diff_snapshots(previous, current)
+
+    assert diff["summary"] == {"added": 1, "removed": 1, "changed": 2, "unchanged": 1}
+    assert diff["added"] == {"new": {"name": new[0], "data": new[1]}}
+    assert diff["removed"] == {"gone": {"name": gone[0], "data": gone[1]}}
+    assert diff["changed"]["renamed"]["changes"] == {
+        "name": {"old": "Cable renamed", "new": "Renamed Cable"}}
+    changes = diff["changed"]["moved"]["changes"]
+    assert changes["length"] == {"old": "100 km", "new": "120 km"}
+    assert [p["id"] for p in changes["landing_points"]["added"]] == ["p5"]
+    assert [p["id"] for p in changes["landing_points"]["removed"]] == ["p3"]
+    assert "changed" not in changes["landing_points"]
+
+
+def test_diff_snapshots_identical(cable):
+    snapshot = dict([cable("a"), cable("b")])
+    diff = diff_snapshots(snapshot, dict(snapshot))
+    assert diff["summary"] == {"added": 0, "removed": 0, "changed": 0, "unchanged": 2}
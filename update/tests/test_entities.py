@@ -0,0 +1,50 @@
+from entities import EntityResolver, load_resolver, name_key, save_resolver, split_names
+
+
+def test_variants_resolve_to_first_name():
+    resolver = EntityResolver()
+    assert resolver.canonical("owner", "Telefónica S.A.") == "Telefónica S.A."
+    assert resolver.canonical("owner", "Telefonica") == "Telefónica S.A."
+    assert resolver.canonical("owner", "Tata Communications Ltd.") == "Tata Communications Ltd."
+    assert resolver.canonical("owner", "Tata Communication") == "Tata Communications Ltd."
+    # Owners and suppliers are resolved separately.
+    assert resolver.canonical("supplier", "Telefonica") == "Telefonica"
+
+
+def test_numbered_names_stay_apart():
+    resolver = EntityResolver()
+    assert resolver.canonical("owner", "Cable Consortium 2") == "Cable Consortium 2"
+    assert resolver.canonical("owner", "Cable Consortium 3") == "Cable Consortium 3"
+
+
+def test_acronyms_are_not_matched():
+    resolver = EntityResolver()
+    assert resolver.canonical("owner", "NTT") == "NTT"
+    assert resolver.canonical("owner", "National Taiwan Telecom") == "National Taiwan Telecom"
+    assert resolver.canonical("owner", "Nippon Telegraph and Telephone") == "Nippon Telegraph and Telephone"
+
+
+def test_pinned_alias():
+    resolver = EntityResolver(pinned={name_key("NTT"): "Nippon Telegraph and Telephone"})
+    assert resolver.canonical("owner", "Nippon Telegraph and Telephone") == "Nippon Telegraph and Telephone"
+    assert resolver.canonical("owner", "NTT") == "Nippon Telegraph and Telephone"
+
+
+def test_old_index_drops_acronym_aliases(tmp_path):
+    # What a version 1 index saved after seeing "NTT" and then two other names.
+    state = {"version": 1, "owner": {
+        "entities": ["NTT", "Orange"],
+        "aliases": {"NTT": 0, "N.T.T.": 0, "National Taiwan Telecom": 0, "Orange": 1}}}
+    resolver = EntityResolver(state)
+    assert resolver.canonical("owner", "National Taiwan Telecom") == "National Taiwan Telecom"
+    assert resolver.canonical("owner", "NTT") == "NTT"
+    assert resolver.canonical("owner", "Orange") == "Orange"
+
+    index_path = tmp_path / "entity_index.json"
+    save_resolver(resolver, index_path)
+    reloaded = load_resolver(index_path, tmp_path / "no-aliases.txt")
+    assert reloaded.canonical("owner", "National Taiwan Telecom") == "National Taiwan Telecom"
+
+
+def test_split_names_keeps_legal_suffixes():
+    assert split_names("Foo, Inc., Bar Ltd") == ["Foo, Inc.", "Bar Ltd"]
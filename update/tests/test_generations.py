@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+from generations import (collect_garbage, current_generation, hold_generation, list_generations,
+                         publish_generation)
+
+
+def publish(db_path, value):
+    """Publish a database holding value as db_path's next generation."""
+    built_path = db_path.with_name("built.db")
+    db = sqlite3.connect(built_path)
+    db.execute("CREATE TABLE t (x)")
+    db.execute("INSERT INTO t VALUES (?)", [value])
+    db.commit()
+    db.close()
+    return publish_generation(db_path, built_path)
+
+
+def read(db_path):
+    db = sqlite3.connect(db_path)
+    try:
+        return db.execute("SELECT x FROM t").fetchone()[0]
+    finally:
+        db.close()
+
+
+def test_publish_points_at_newest(tmp_path):
+    db_path = tmp_path / "scn.db"
+    first = publish(db_path, 1)
+    second = publish(db_path, 2)
+
+    assert current_generation(db_path) == second
+    assert [path for number, path in list_generations(db_path)] == [first, second]
+    assert read(db_path) == 2
+
+
+def test_collect_garbage_skips_held_generations(tmp_path):
+    db_path = tmp_path / "scn.db"
+    first = publish(db_path, 1)
+    held_path, lock = hold_generation(db_path)
+    second = publish(db_path, 2)
+    third = publish(db_path, 3)
+
+    assert held_path == first
+    # first is still being read, and third is current.
+    assert collect_garbage(db_path, keep=1) == [second]
+    assert first.exists() and not second.exists()
+    assert read(held_path) == 1
+
+    lock.close()
+    assert collect_garbage(db_path, keep=1) == [first]
+    assert [path for number, path in list_generations(db_path)] == [third]
+    assert read(db_path) == 3
+
+
+def test_hold_generation_without_database(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        hold_generation(tmp_path / "scn.db")
@@ -0,0 +1,58 @@
+import pytest
+
+from clean_data import parse_data
+from graph import (components, country_path, critical_cables, critical_points, failure_impact,
+                   min_cable_cut)
+from write_db import write_db
+
+
+@pytest.fixture
+def db_path(tmp_path, cable):
+    # Xland -a-, -b- Yland -c- Zland, and Wland on its own.
+    write_db(parse_data(dict([
+        cable("a", points=[("p1", "Xland"), ("p2", "Yland")]),
+        cable("b", points=[("p1", "Xland"), ("p3", "Yland")]),
+        cable("c", points=[("p3", "Yland"), ("p4", "Zland")]),
+        cable("d", points=[("p5", "Wland")]),
+    ])), db_dir=tmp_path)
+    return tmp_path / "scn.db"
+
+
+def test_components(db_path):
+    assert [(c.points, c.cables) for c in components(db_path)] == [
+        (("p1", "p2", "p3", "p4"), ("a", "b", "c")),
+        (("p5",), ("d",)),
+    ]
+
+
+def test_critical_cables_and_points(db_path):
+    # b splits the network in half; a and c each strand one point.
+    assert [(c.code, c.stranded_points, c.pieces) for c in critical_cables(db_path)] == [
+        ("b", 2, (2, 2)), ("a", 1, (3, 1)), ("c", 1, (3, 1))]
+    assert [c.code for c in critical_points(db_path)] == ["p1", "p3"]
+
+
+def test_failure_impact(db_path):
+    impact = failure_impact(cable_codes=["b"], db_path=db_path)
+    assert impact.cut_off_points == ("p3", "p4")
+    # Yland is still reached through a.
+    assert impact.disconnected_countries == (("Xland", "Zland"),)
+
+
+def test_country_path(db_path):
+    assert [(hop.country, hop.cable) for hop in country_path("Xland", "Zland", db_path)] == [
+        ("Xland", None), ("Yland", "a"), ("Zland", "c")]
+    assert country_path("Xland", "Wland", db_path) is None
+
+
+def test_min_cable_cut(db_path):
+    assert min_cable_cut("Xland", "Yland", db_path) == (2, ("a", "b"))
+    assert min_cable_cut("Xland", "Zland", db_path) == (1, ("b",))
+    assert min_cable_cut("Xland", "Wland", db_path) == (0, ())
+
+
+def test_min_cable_cut_rejects_same_or_unknown_country(db_path):
+    with pytest.raises(ValueError, match="itself"):
+        min_cable_cut("Xland", "Xland", db_path)
+    with pytest.raises(ValueError, match="Atlantis"):
+        min_cable_cut("Xland", "Atlantis", db_path)
@@ -0,0 +1,78 @@
+import sqlite3
+
+from clean_data import parse_data
+from history import OPEN_ENDED, carry_tables, record_history
+from write_db import open_db, write_db
+
+
+T1 = "2025-01-01T00:00:00.000"
+T2 = "2025-02-01T00:00:00.000"
+T3 = "2025-03-01T00:00:00.000"
+
+
+def history(db_path, sql):
+    db = sqlite3.connect(db_path)
+    try:
+        return sorted(db.execute(sql))
+    finally:
+        db.close()
+
+
+def test_record_history_closes_changed_and_removed_rows(tmp_path, cable):
+    a = cable("a", points=[("p1", "Xland")])
+    b = cable("b", points=[("p2", "Yland")], length="100 km")
+    write_db(parse_data(dict([a, b])), db_dir=tmp_path, as_of=T1)
+    b2 = cable("b", points=[("p2", "Yland"), ("p3", "Zland")], length="200 km")
+    write_db(parse_data(dict([b2])), db_dir=tmp_path, as_of=T2)
+    db_path = tmp_path / "scn.db"
+
+    assert history(db_path, "SELECT code, length, valid_from, valid_to FROM cable_history") == [
+        ("a", None, T1, T2),
+        ("b", 100, T1, T2),
+        ("b", 200, T2, OPEN_ENDED),
+    ]
+    assert history(db_path, "SELECT cable_code, point_code, valid_from, valid_to "
+                            + "FROM cable_point_history") == [
+        ("a", "p1", T1, T2),
+        ("b", "p2", T1, OPEN_ENDED),
+        ("b", "p3", T2, OPEN_ENDED),
+    ]
+    # No cable lands at p1 any more, so it left the point table too.
+    assert history(db_path, "SELECT code, valid_from, valid_to FROM point_history") == [
+        ("p1", T1, T2),
+        ("p2", T1, OPEN_ENDED),
+        ("p3", T2, OPEN_ENDED),
+    ]
+
+
+def test_record_history_without_changes(tmp_path, cable):
+    write_db(parse_data(dict([cable("a", points=[("p1", "Xland")])])), db_dir=tmp_path, as_of=T1)
+
+    db = open_db(tmp_path / "scn.db")
+    counts = record_history(db, T3)
+    db.close()
+
+    assert all(count == (0, 0) for count in counts.values())
+
+
+def test_carry_tables(tmp_path):
+    previous_path = tmp_path / "previous.db"
+    previous = sqlite3.connect(previous_path)
+    previous.execute("CREATE TABLE kept (x)")
+    previous.executemany("INSERT INTO kept VALUES (?)", [(1,), (2,)])
+    previous.commit()
+    previous.close()
+
+    db = sqlite3.connect(tmp_path / "new.db")
+    db.execute("CREATE TABLE kept (x)")
+    db.execute("CREATE TABLE added (x)")
+    db.commit()
+    # added isn't in the previous database yet, so it's skipped.
+    carry_tables(db, previous_path, ("kept", "added"))
+    carry_tables(db, tmp_path / "missing.db", ("kept",))
+    carry_tables(db, None, ("kept",))
+
+    assert db.execute("SELECT x FROM kept ORDER BY x").fetchall() == [(1,), (2,)]
+    assert db.execute("SELECT COUNT(*) FROM added").fetchone() == (0,)
+    assert db.execute("PRAGMA database_list").fetchall()[-1][1] == "main"
+    db.close()
@@ -0,0 +1,48 @@
+from scrapers.journal import ScrapeJournal, journal_path, remove_journal, run_journals
+
+
+def entry(body):
+    return {"etag": None, "last_modified": None, "body": body}
+
+
+def test_journal_resumes_after_torn_line(tmp_path):
+    path = journal_path("run1", tmp_path)
+    journal = ScrapeJournal(path, "ct1")
+    journal.record("https://x/a.json", entry("a"))
+    journal.record("https://x/b.json", entry("b"))
+    journal.close()
+    # A crash mid-write leaves a line without its newline.
+    with open(path, "ab") as f:
+        f.write(b'["https://x/c.json", {"etag"')
+
+    resumed = ScrapeJournal(path, "ct1")
+    assert not resumed.stale
+    assert resumed.entries == {"https://x/a.json": entry("a"), "https://x/b.json": entry("b")}
+    resumed.record("https://x/c.json", entry("c"))
+    resumed.close()
+
+    assert set(ScrapeJournal(path, "ct1").entries) == {
+        "https://x/a.json", "https://x/b.json", "https://x/c.json"}
+
+
+def test_journal_starts_over_when_data_changed(tmp_path):
+    path = journal_path("run1", tmp_path)
+    journal = ScrapeJournal(path, "ct1")
+    journal.record("https://x/a.json", entry("a"))
+    journal.close()
+
+    restarted = ScrapeJournal(path, "ct2")
+    restarted.close()
+    assert restarted.stale and restarted.entries == {}
+    assert ScrapeJournal(path, "ct2").entries == {}
+
+
+def test_remove_journal(tmp_path):
+    for name in ("scm_scraper", "other"):
+        ScrapeJournal(journal_path("run1", tmp_path, name)).close()
+    ScrapeJournal(journal_path("run2", tmp_path)).close()
+
+    assert len(run_journals("run1", tmp_path)) == 2
+    remove_journal("run1", tmp_path)
+    assert run_journals("run1", tmp_path) == []
+    assert len(run_journals("run2", tmp_path)) == 1
@@ -0,0 +1,46 @@
+import pytest
+
+import query
+from generations import list_generations
+from pipeline import stream_update
+from scm_stub_server import start_stub_server
+from scrapers.registry import IncompleteScrapeError
+from synthetic import make_snapshot
+
+
+SITE = "submarinecablemap.com"
+
+
+@pytest.fixture
+def snapshot():
+    return make_snapshot(0.05, seed=1)
+
+
+def run(db_path, server, **kwargs):
+    return stream_update(db_path, sites=[SITE], site_options={SITE: {
+        "base_url": server.base_url, "retry_budget": 0}}, **kwargs)
+
+
+def test_stream_update_publishes_every_cable(tmp_path, snapshot):
+    server = start_stub_server(snapshot)
+    try:
+        stats = run(tmp_path / "scn.db", server)
+    finally:
+        server.shutdown()
+
+    assert stats["cables"] == len(snapshot)
+    assert {c.name for c in query.all_cables(tmp_path / "scn.db")} == set(snapshot)
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_stream_update_publishes_nothing_when_cables_are_lost(tmp_path, snapshot):
+    # Without retries, some 503s are bound to lose cables.
+    server = start_stub_server(snapshot, p503=0.3, retry_after=0, seed=1)
+    try:
+        with pytest.raises(IncompleteScrapeError):
+            run(tmp_path / "scn.db", server)
+    finally:
+        server.shutdown()
+
+    assert list_generations(tmp_path / "scn.db") == []
+    assert not list(tmp_path.glob(".*.tmp"))
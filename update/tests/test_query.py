@@ -0,0 +1,26 @@
+import query
+from clean_data import parse_data
+from write_db import open_db, write_db, write_meta
+
+
+def test_cached_results_follow_in_place_writes(tmp_path, cable):
+    write_db(parse_data(dict([cable("a")])), db_dir=tmp_path, creation_time="v1")
+    db_path = tmp_path / "scn.db"
+    assert query.db_info(db_path).creation_time == "v1"
+
+    # Kept open, so the write stays in the -wal file, not checkpointed.
+    writer = open_db(db_path)
+    write_meta(writer, creation_time="v2")
+    try:
+        assert query.db_info(db_path).creation_time == "v2"
+    finally:
+        writer.close()
+
+
+def test_new_generation_replaces_cached_results(tmp_path, cable):
+    write_db(parse_data(dict([cable("a")])), db_dir=tmp_path)
+    db_path = tmp_path / "scn.db"
+    assert [c.code for c in query.all_cables(db_path)] == ["a"]
+
+    write_db(parse_data(dict([cable("a"), cable("b")])), db_dir=tmp_path)
+    assert [c.code for c in query.all_cables(db_path)] == ["a", "b"]
@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+import pytest
+
+from clean_data import parse_data
+from query_server import QueryServer
+from write_db import write_db
+
+
+@pytest.fixture
+def db_path(tmp_path, cable):
+    write_db(parse_data(dict([
+        cable("a", points=[("p1", "Xland")], owners="Owner One"),
+        cable("b", points=[("p2", "Yland")], owners="Owner Two"),
+    ])), db_dir=tmp_path, creation_time="v1")
+    return tmp_path / "scn.db"
+
+
+def serve(db_path, requests):
+    """Run requests(client, server) against a QueryServer for db_path."""
+    async def run():
+        server = QueryServer(db_path)
+        await server.start(port=0)
+        try:
+            async with httpx.AsyncClient(base_url=server.base_url) as client:
+                return await requests(client, server)
+        finally:
+            server.server.close()
+            await server.server.wait_closed()
+    return asyncio.run(run())
+
+
+def test_routes(db_path):
+    async def requests(client, server):
+        info = (await client.get("/")).json()
+        assert info["creation_time"] == "v1"
+        cables = (await client.get("/cables")).json()
+        assert [c["code"] for c in cables] == ["a", "b"]
+        assert (await client.get("/cables/a")).json()["name"] == "Cable a"
+        assert [c["code"] for c in (await client.get("/cables?country=Yland")).json()] == ["b"]
+        assert (await client.get("/cables/nope")).status_code == 404
+        assert (await client.get("/nope")).status_code == 404
+        assert (await client.get("/cables?q=cable&limit=x")).status_code == 400
+        assert (await client.post("/cables")).status_code == 405
+    serve(db_path, requests)
+
+
+def test_not_modified_only_for_found_targets(db_path):
+    async def requests(client, server):
+        etag = (await client.get("/cables")).headers["etag"]
+        headers = {"if-none-match": etag}
+        response = await client.get("/cables", headers=headers)
+        assert response.status_code == 304 and response.content == b""
+        queries = server.stats["queries"]
+        assert (await client.get("/cables", headers=headers)).status_code == 304
+        # Answered from the cache, without a query.
+        assert server.stats["queries"] == queries
+        response = await client.get("/cables/nope", headers=headers)
+        assert response.status_code == 404 and response.json()["error"]
+        assert (await client.get("/cables?q=x&limit=x", headers=headers)).status_code == 400
+    serve(db_path, requests)
+
+
+def test_new_generation_changes_etag(db_path, cable):
+    async def requests(client, server):
+        etag = (await client.get("/cables")).headers["etag"]
+        write_db(parse_data(dict([cable("a"), cable("c")])), db_dir=db_path.parent)
+        response = await client.get("/cables", headers={"if-none-match": etag})
+        assert response.status_code == 200 and response.headers["etag"] != etag
+        assert [c["code"] for c in response.json()] == ["a", "c"]
+    serve(db_path, requests)
+
+
+def test_bad_requests_get_a_response(db_path, monkeypatch):
+    def broken(db_path):
+        raise KeyError("owner")
+    monkeypatch.setattr("query.all_owners", broken)
+
+    async def requests(client, server):
+        response = await client.get("/cables?q=cable&limit=-1")
+        assert response.status_code == 400 and "limit" in response.json()["error"]
+        response = await client.get("/owners")
+        assert response.status_code == 500 and "KeyError" in response.json()["error"]
+        # The connection is still usable.
+        assert (await client.get("/cables/a")).status_code == 200
+    serve(db_path, requests)
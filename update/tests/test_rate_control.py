@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from scrapers.rate_control import AdaptiveLimiter, HostBudgets, parse_retry_after
+
+
+def release_all(limiter, count, status=200, latency=0.01, retry_after=None):
+    async def run():
+        for _ in range(count):
+            await limiter.acquire()
+            await limiter.release(status, latency, retry_after)
+    asyncio.run(run())
+
+
+def test_slow_start_doubles_each_window():
+    limiter = AdaptiveLimiter(initial_concurrency=2, initial_rate=1000.0, max_rate=10000.0)
+    release_all(limiter, 2)
+    assert (limiter.concurrency, limiter.rate) == (4, 2000.0)
+    release_all(limiter, 4)
+    assert (limiter.concurrency, limiter.rate) == (8, 4000.0)
+
+
+def test_congestion_halves_once_then_increases_additively():
+    limiter = AdaptiveLimiter(initial_concurrency=16, initial_rate=200.0, rate_step=5.0)
+    # A burst of failures is one decrease, not one per response.
+    release_all(limiter, 3, status=503)
+    assert (limiter.concurrency, limiter.rate, limiter.decreases) == (8, 100.0, 1)
+    release_all(limiter, 8)
+    assert (limiter.concurrency, limiter.rate) == (9, 105.0)
+    # Slow responses count as congestion too.
+    limiter.last_decrease = 0.0
+    release_all(limiter, 1, latency=limiter.target_latency + 1)
+    assert limiter.concurrency == 4.5
+
+
+def test_retry_after_pauses_for_at_most_one_window():
+    limiter = AdaptiveLimiter(initial_concurrency=8, initial_rate=100.0)
+    before = time.monotonic()
+    release_all(limiter, 1, status=429, retry_after=30.0)
+    window = limiter.concurrency / limiter.rate
+    assert before < limiter.paused_until <= time.monotonic() + window
+
+
+def test_cancelled_acquire_frees_its_slot():
+    limiter = AdaptiveLimiter(initial_concurrency=1)
+    limiter.paused_until = time.monotonic() + 60
+
+    async def run():
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert limiter.in_flight == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+    asyncio.run(run())
+
+    assert limiter.in_flight == 0
+
+
+def test_host_budgets_share_a_limiter_per_host():
+    budgets = HostBudgets({"a.test": {"max_concurrency": 3}})
+    assert budgets.limiter("https://a.test/x") is budgets.limiter("a.test")
+    assert budgets.limiter("https://a.test/").max_concurrency == 3
+    assert budgets.limiter("https://b.test/") is not budgets.limiter("https://a.test/")
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from scrapers import registry
+from scrapers.registry import (IncompleteScrapeError, Scraper, check_complete, scrape_sites,
+                               select_sites)
+
+
+def register(monkeypatch, site, cables, delay=0.0, error=None):
+    async def stream(base_url, report):
+        await asyncio.sleep(delay)
+        for cable_name, cable_data in cables:
+            yield cable_name, cable_data
+        report["requested"] = report["fetched"] = len(cables)
+        if error:
+            raise error
+    monkeypatch.setitem(registry.SCRAPERS, site, Scraper(site, site, f"https://{site}/", stream))
+
+
+def test_first_site_listed_wins_duplicates(monkeypatch):
+    # The first site is the slower one, so its copy arrives second.
+    register(monkeypatch, "a.test", [("X", {"site": "a"})], delay=0.05)
+    register(monkeypatch, "b.test", [("X", {"site": "b"}), ("Y", {"site": "b"})])
+    report = {}
+
+    cables = scrape_sites(["a.test", "b.test"], report=report)
+
+    assert cables == {"X": {"site": "a"}, "Y": {"site": "b"}}
+    assert report["duplicates"] == 1
+    assert report["requested"] == 3
+    assert set(report["sites"]) == {"a.test", "b.test"}
+
+
+def test_failing_site_fails_the_scrape(monkeypatch):
+    register(monkeypatch, "a.test", [("X", {})], error=RuntimeError("site down"))
+    register(monkeypatch, "b.test", [("Y", {})], delay=1.0)
+    with pytest.raises(RuntimeError, match="site down"):
+        scrape_sites(["a.test", "b.test"])
+
+
+def test_check_complete():
+    check_complete({"requested": 3, "lost": 0})
+    with pytest.raises(IncompleteScrapeError, match="1 of 3"):
+        check_complete({"requested": 3, "lost": 1})
+
+
+def test_select_sites(tmp_path):
+    sites_path = tmp_path / "cable-sites.txt"
+    assert select_sites(sites_path=sites_path) == list(registry.DEFAULT_SITES)
+    sites_path.write_text("# comment\nhttps://www.submarinecablemap.com/\n\n")
+    assert select_sites(sites_path=sites_path) == ["submarinecablemap.com"]
+    with pytest.raises(ValueError, match="nowhere.test"):
+        select_sites(["nowhere.test"], sites_path=sites_path)
@@ -0,0 +1,30 @@
+import httpx
+import pytest
+
+from scm_stub_server import start_stub_server
+from scrapers.scm_scraper import scm_scraper
+from synthetic import make_snapshot
+
+
+def test_scrapes_every_cable():
+    snapshot = make_snapshot(0.05, seed=2)
+    server = start_stub_server(snapshot)
+    report = {}
+    try:
+        cables = scm_scraper(base_url=server.base_url, report=report)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert cables == snapshot
+    assert report["lost"] == 0 and report["fetched"] == len(snapshot)
+
+
+def test_unreachable_site_raises():
+    server = start_stub_server({})
+    base_url = server.base_url
+    server.shutdown()
+    server.server_close()
+
+    with pytest.raises(httpx.HTTPError):
+        scm_scraper(base_url=base_url, retry_budget=0)
@@ -0,0 +1,40 @@
+import json
+
+from snapshot_format import (export_json, index_path, iter_snapshot, load_index, load_snapshot,
+                             read_cable, snapshot_run_id, write_snapshot)
+
+
+def test_round_trip_and_seek(tmp_path, cable):
+    cables = dict([cable("a"), cable("b", name="Câble Ñ"), cable("c", length="1,000 km")])
+    path = write_snapshot(cables, tmp_path / "scm_data_2025-01-01T00:00:00.000_1234abcd.ndjson.gz")
+
+    assert index_path(path).exists()
+    assert load_snapshot(path) == cables
+    assert [name for name, data in iter_snapshot(path)] == list(cables)
+    index = load_index(path)
+    for name, data in reversed(cables.items()):
+        assert read_cable(path, name, index) == data
+    assert read_cable(path, "Cable z") is None
+
+
+def test_export_json_matches_json_snapshot(tmp_path, cable):
+    cables = dict([cable("a"), cable("b")])
+    path = write_snapshot(cables, tmp_path / "snapshot.ndjson.gz")
+
+    json_path = export_json(path, tmp_path / "snapshot.json")
+
+    with open(json_path, "rt", encoding="utf-8") as f:
+        assert json.load(f) == cables
+    assert load_snapshot(json_path) == cables
+
+
+def test_empty_placeholder_is_empty_snapshot(tmp_path):
+    placeholder = tmp_path / "no_data.json"
+    placeholder.touch()
+    assert load_snapshot(placeholder) == {}
+
+
+def test_snapshot_run_id():
+    run_id = "2025-01-01T00:00:00.000_1234abcd"
+    assert snapshot_run_id(f"/x/scm_data_{run_id}.ndjson.gz") == run_id
+    assert snapshot_run_id(f"scm_data_{run_id}.json") == run_id
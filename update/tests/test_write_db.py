@@ -0,0 +1,90 @@
+import sqlite3
+
+from clean_data import parse_data
+from query import search_cables
+from write_db import previous_ids, write_db
+
+
+def ids(db_path, table, key="code"):
+    db = sqlite3.connect(db_path)
+    try:
+        return dict(db.execute(f"SELECT {key}, id FROM {table}"))
+    finally:
+        db.close()
+
+
+def test_upsert_keeps_ids_and_removes_orphans(tmp_path, cable):
+    a = cable("a", points=[("p1", "Xland"), ("p2", "Yland")], owners="Owner One, Owner Two")
+    b = cable("b", points=[("p2", "Yland"), ("p3", "Zland")], owners="Owner Three")
+    c = cable("c", points=[("p4", "Wland")], owners="Owner Four")
+    write_db(parse_data(dict([a, b])), db_dir=tmp_path)
+    db_path = tmp_path / "scn.db"
+    before = ids(db_path, "cable"), ids(db_path, "point")
+
+    counts = write_db(parse_data(dict([b, c])), db_dir=tmp_path, mode="incremental")
+
+    assert counts == {"inserted": 1, "updated": 0, "deleted": 1, "unchanged": 1}
+    cables, points = ids(db_path, "cable"), ids(db_path, "point")
+    assert cables == {"b": before[0]["b"], "c": max(before[0].values()) + 1}
+    assert points["p2"] == before[1]["p2"] and points["p3"] == before[1]["p3"]
+    assert points["p4"] == max(before[1].values()) + 1
+    # Only a referred to p1, Xland and its owners.
+    assert "p1" not in points
+    assert set(ids(db_path, "country", "name")) == {"Yland", "Zland", "Wland"}
+    assert set(ids(db_path, "owner", "name")) == {"Owner Three", "Owner Four"}
+
+
+def test_upsert_rewrites_changed_cable_in_place(tmp_path, cable):
+    a = cable("a", points=[("p1", "Xland")], length="100 km")
+    write_db(parse_data(dict([a])), db_dir=tmp_path)
+    db_path = tmp_path / "scn.db"
+    before = ids(db_path, "cable")
+
+    changed = cable("a", points=[("p1", "Xland"), ("p2", "Yland")], length="200 km")
+    counts = write_db(parse_data(dict([changed])), db_dir=tmp_path, mode="incremental")
+
+    assert counts["updated"] == 1
+    assert ids(db_path, "cable") == before
+    db = sqlite3.connect(db_path)
+    assert db.execute("SELECT length FROM cable").fetchall() == [(200,)]
+    assert db.execute("SELECT COUNT(*) FROM cable_point").fetchone() == (2,)
+    db.close()
+
+
+def test_upsert_reindexes_unchanged_cables_at_changed_point(tmp_path, cable):
+    b = cable("b", points=[("p1", "Xland")])
+    write_db(parse_data(dict([cable("a", points=[("p1", "Xland")]), b])), db_dir=tmp_path)
+    db_path = tmp_path / "scn.db"
+
+    moved = cable("a", points=[("p1", "Newland")])
+    counts = write_db(parse_data(dict([moved, b])), db_dir=tmp_path, mode="incremental")
+
+    assert counts["unchanged"] == 1
+    hits = search_cables("Newland", ["countries"], db_path=db_path)
+    assert sorted(hit.cable.code for hit in hits) == ["a", "b"]
+    assert search_cables("Xland", ["countries"], db_path=db_path) == ()
+
+
+def test_rebuild_keeps_previous_ids(tmp_path, cable):
+    a = cable("a", points=[("p1", "Xland")], owners="Owner One")
+    b = cable("b", points=[("p2", "Yland")], owners="Owner Two")
+    c = cable("c", points=[("p3", "Zland")], owners="Owner Three")
+    write_db(parse_data(dict([a, b])), db_dir=tmp_path)
+    db_path = tmp_path / "scn.db"
+    before = ids(db_path, "cable"), ids(db_path, "owner", "name")
+
+    # c comes first this time, and would take id 0 if the ids weren't reused.
+    write_db(parse_data(dict([c, b]), ids=previous_ids(db_path)), db_dir=tmp_path)
+
+    cables, owners = ids(db_path, "cable"), ids(db_path, "owner", "name")
+    assert cables == {"b": before[0]["b"], "c": max(before[0].values()) + 1}
+    assert owners["Owner Two"] == before[1]["Owner Two"]
+    db = sqlite3.connect(db_path)
+    linked = db.execute("""SELECT c.code, o.name FROM cable_owner x
+                           JOIN cable c ON c.id = x.cable_id JOIN owner o ON o.id = x.owner_id""")
+    assert sorted(linked) == [("b", "Owner Two"), ("c", "Owner Three")]
+    db.close()
+
+
+def test_previous_ids_without_database(tmp_path):
+    assert previous_ids(tmp_path / "missing.db") is None
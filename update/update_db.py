@@ -1,99 +1,191 @@
 """
 Run this to update the cable database with most recent information.
 
-# TODO IMPLEMENT THE BELOW
 If database name specified with optional argument -d, updates that database only.
-If no database name specified, updates {main database here} by default. 
-
-If list of websites specified using optional argument -w, calls update-with.py
-    to scrape only the specified sites for new data.
-If list of websites specified using optional argument --plus, calls update-with.py
-    to scrape both the default websites in cable-sites.txt (if it exists; fails if
-    this file doesn't exist) AND the list of websites specified.
-If no websites specified with -w or --plus, calls update-with.py to scrape
-    sites listed in cable-sites.txt for new data.
+If no database name specified, updates update/db/scn.db by default.
+
+If list of websites specified using optional argument -w, scrapes only the
+    specified sites for new data.
+If list of websites specified using optional argument --plus, scrapes both the
+    default websites in update/cable-sites.txt (if it exists; fails if this file
+    doesn't exist) AND the list of websites specified.
+If no websites specified with -w or --plus, scrapes the sites listed in
+    update/cable-sites.txt for new data (submarinecablemap.com if there's no such file).
+
+The sites are scraped at the same time and their cables merged
+(see scrapers/registry.py).
 """
-# import os, tempfile
+import datetime
 import time
 from pathlib import Path
 from shutil import copy2
+from uuid import uuid4
 from json import dump, dumps
 from clean_data import parse_data
+from columnar import COLUMNAR_DIR, publish_export
 from diff_generator import generate_diff
-from scrapers.scm_scraper import scm_scraper
-from write_db import write_db
-
-
-# def symlink(target, link_name, overwrite=False):
-#     '''
-#     Create a symbolic link named link_name pointing to target.
-#     If link_name exists then FileExistsError is raised, unless overwrite=True.
-#     When trying to overwrite a directory, IsADirectoryError is raised.
-
-#     NOTE: I think the path to target must be specified relative to the
-#     directory holding link_name, but double check for me and fix this message! 
-
-#     CREDIT TO: This answer https://stackoverflow.com/a/55742015
-#     by Tom Hale https://stackoverflow.com/users/5353461/tom-hale
-#     '''
-
-#     if not overwrite:
-#         os.symlink(target, link_name)
-#         return
-
-#     # os.replace() may fail if files are on different filesystems
-#     link_dir = os.path.dirname(link_name)
-
-#     # Create link to target with temporary filename
-#     while True:
-#         temp_link_name = tempfile.mktemp(dir=link_dir)
-
-#         # os.* functions mimic as closely as possible system functions
-#         # The POSIX symlink() returns EEXIST if link_name already exists
-#         # https://pubs.opengroup.org/onlinepubs/9699919799/functions/symlink.html
-#         try:
-#             os.symlink(target, temp_link_name)
-#             break
-#         except FileExistsError:
-#             pass
-
-#     # Replace link_name with temp_link_name
-#     try:
-#         # Pre-empt os.replace on a directory with a nicer message
-#         if not os.path.islink(link_name) and os.path.isdir(link_name):
-#             raise IsADirectoryError(f"Cannot symlink over existing directory: '{link_name}'")
-#         os.replace(temp_link_name, link_name)
-#     except:
-#         if os.path.islink(temp_link_name):
-#             os.remove(temp_link_name)
-#         raise
+from entities import ENTITY_INDEX_PATH, load_resolver, save_resolver
+from generations import KEEP_GENERATIONS, collect_garbage, run_lock
+from pipeline import stream_update
+from run_metrics import RunMetrics
+from scrapers.journal import JOURNAL_DIR, remove_journal, run_journals
+from scrapers.registry import check_complete, scrape_sites, select_sites
+from scrapers.scm_scraper import close_logger, init_logger
+from snapshot_format import NDJSON_SUFFIX, index_path, snapshot_run_id, write_snapshot
+from snapshot_store import ManifestWriter, has_snapshot, import_snapshot_file, store_snapshot
+from write_db import previous_ids, row_counts, write_db
+
+
+def new_run_id():
+    """A run id: the UTC start time and a short random suffix ("2025-04-28T16:16:07.382_1bf7efba")."""
+    return datetime.datetime.utcnow().isoformat(timespec="milliseconds") + "_" + str(uuid4().hex)[:8]
+
+
+def prune_old_data(old_data_path, old_data_dir, store_dir):
+    """Delete a superseded snapshot file from old_data_dir once it is in the store.
+
+    Snapshots written before the store existed are imported first, so no
+    history is lost; load_snapshot() or export_snapshot() bring any of them back.
+    """
+    old_data_path = old_data_path.absolute()
+    if old_data_path.parent != old_data_dir or not old_data_path.exists():
+        return
+
+    run_id = snapshot_run_id(old_data_path)
+    if not has_snapshot(run_id, store_dir):
+        # Returns None for the empty no_data.json placeholder.
+        run_id = import_snapshot_file(old_data_path, run_id, store_dir)
+    old_data_path.unlink()
+    index_path(old_data_path).unlink(missing_ok=True)
+    if run_id:
+        print(f"Pruned {old_data_path.name} (kept as snapshot {run_id} in {store_dir})")
+
+
+def write_run_metrics(metrics, metrics_dir, exit_status, scrape_report=None):
+    """Write metrics' JSON run report and Prometheus textfile to metrics_dir; return the report's path.
+
+    exit_status (0 for success) is recorded as the run_exit_status gauge,
+    and scrape_report's cable counts as the cables gauges. Failed runs write
+    their metrics too, so they replace the last good run's and can be
+    alerted on.
+    """
+    if scrape_report is not None:
+        for state in ("requested", "fetched", "not_modified", "resumed", "retried", "lost"):
+            metrics.gauge("cables", scrape_report.get(state, 0), state=state)
+        metrics.gauge("cable_retries", scrape_report.get("retries", 0))
+    metrics.gauge("run_exit_status", exit_status)
+    metrics.finish()
+    report_path = metrics.write_json(metrics_dir / ("run_" + metrics.run_id + ".json"))
+    metrics.write_prometheus(metrics_dir / "scn_update.prom")
+    return report_path
 
 
 def update_db(
     # TODO: Add paths to distinguish between scm_data and tel_eg_data
     old_data_dir="./update/data/old_data/",
-    old_db_dir="./update/db/old_db/",
+    store_dir="./update/data/store/",
     new_data_dir="./update/data/",
     new_db_dir="./update/db/",
     prev_symlink_dir="./update/data/",
-    initial_run=False
+    initial_run=False,
+    incremental_scrape=False,
+    streaming=False,
+    db_mode="rebuild",
+    snapshot_format="json",
+    metrics_dir="./update/data/metrics/",
+    journal_dir=JOURNAL_DIR,
+    resume=None,
+    db_name="scn.db",
+    sites=None,
+    site_options=None,
+    columnar_export=False,
+    columnar_dir=COLUMNAR_DIR,
+    entity_index=ENTITY_INDEX_PATH,
+    keep_generations=KEEP_GENERATIONS
     ):
+    """Scrape new cable data, then rebuild the database and diff against the last run.
+
+    If streaming is True, cables go straight from the scraper into the
+    database as they arrive (see pipeline.stream_update) instead of being
+    collected, dumped to JSON and re-parsed first.
+
+    db_mode is passed on to write_db(): "rebuild" or "incremental". Either
+    way (and when streaming) cables, points, countries, owners and suppliers
+    keep the ids the previous database gave them, and the database keeps the
+    history of every run in its history tables (see history.py), with the
+    run's start datetime as the time of change.
+
+    snapshot_format is "json" for the sorted, indented JSON snapshot or
+    "ndjson" for the compact gzip NDJSON format in snapshot_format.py.
+
+    Every run's snapshot is added to the deduplicated snapshot store in
+    store_dir instead of keeping full copies of old data files and
+    databases. Use snapshot_store.load_snapshot()/reconstruct_db() to get
+    any past run back.
+
+    Each run's phases (list fetch, cable fan-out, snapshot write, parse,
+    database load, diff), request latencies and status codes, bytes
+    transferred, rows written and peak RSS are written to metrics_dir as a
+    JSON run report (run_<run id>.json) and as a Prometheus textfile
+    (scn_update.prom). Runs that exit early write them too, with their exit
+    status in the run_exit_status gauge.
+
+    Cables are journaled in journal_dir as they are fetched. If a run is
+    interrupted, call update_db(resume=<its run id>) (or run this file with
+    --resume <run id>) to fetch only the cables it didn't get and carry on
+    with the rest of the update. The journal is deleted when a run finishes.
+    A run that can't fetch every cable stores and publishes nothing: it
+    exits with status 4 and prints the --resume command to finish it.
+
+    The database updated is new_db_dir/db_name. sites are the sites to
+    scrape (see scrapers.registry.select_sites(); by default those in
+    cable-sites.txt), all at the same time. site_options are per-site
+    scraper arguments (see scrapers.registry.scrape_stream()).
+
+    If columnar_export is True, the updated database is also exported as
+    memory-mappable NumPy columns to columnar_dir/<run id>/, with
+    columnar_dir/latest pointing at it (see columnar.py).
+
+    Owners and suppliers are written under their canonical names, resolved
+    with the alias index at entity_index, which is saved again once the
+    database is written so the next run reuses its matches (see entities.py).
+
+    The database is published as a new generation behind the
+    new_db_dir/db_name symlink, and generations beyond the newest
+    keep_generations are deleted once nothing reads them (see
+    generations.py). Only one update runs at a time: if another holds
+    new_data_dir/update.lock, this one exits with status 5.
+    """
+    metrics = RunMetrics()
+
     #####################################
     #### SETUP DIRECTORIES AND FILES ####
     #####################################
     old_data_dir = Path(old_data_dir).absolute()
-    old_db_dir = Path(old_db_dir).absolute()
+    store_dir = Path(store_dir).absolute()
+    metrics_dir = Path(metrics_dir).absolute()
     new_data_dir = Path(new_data_dir).absolute()
     new_db_dir = Path(new_db_dir).absolute()
     prev_symlink_dir = Path(prev_symlink_dir).absolute()
     # Make the necessary directories, even if this is the initial run of update_db()
     # (we need them and it won't overwrite them if they already exist).
     old_data_dir.mkdir(parents=True, exist_ok=True)
-    old_db_dir.mkdir(parents=True, exist_ok=True)
+    store_dir.mkdir(parents=True, exist_ok=True)
     new_data_dir.mkdir(parents=True, exist_ok=True)
     new_db_dir.mkdir(parents=True, exist_ok=True)
     prev_symlink_dir.mkdir(parents=True, exist_ok=True)
 
+    # Overlapping runs would fight over the data symlinks below and the
+    # database generations, so only one runs at a time. The lock is a
+    # flock, so a run that crashes can't leave it behind.
+    lock_path = new_data_dir / "update.lock"
+    update_lock = run_lock(lock_path)
+    if update_lock is None:
+        print(f"Another update is running (it holds {lock_path}).")
+        metrics.run_id = resume or new_run_id()
+        write_run_metrics(metrics, metrics_dir, 5)
+        exit(5)
+
     # Symlinks to the data files for the current and previous scraper data files
     current_data_symlink = (new_data_dir / "current_data").absolute()
     previous_data_symlink = (prev_symlink_dir / "previous_data").absolute()
@@ -134,14 +226,99 @@ def update_db(
     ## SUBMARINECABLEMAP.COM
     # scm_data = data (dict), scraper_date_uuid = run_date + uuid (str)
     # scraper_date_uuid like "2025-04-28T16:16:07.382_1bf7efba.json"
-    scm_data, scraper_date_uuid = scm_scraper(write_log=True)
-    scm_file_name = "scm_data_" + scraper_date_uuid + ".json"
-    new_scm_data_path = (new_data_dir / scm_file_name).absolute()
+    # With incremental_scrape, unchanged cables are revalidated with
+    # conditional requests instead of re-downloaded.
+    scrape_report = {}
+    new_db_path = (new_db_dir / db_name).absolute()
+    if sites is None:
+        sites = select_sites()
+    print(f"Scraping {', '.join(sites)}")
+    data_suffix = NDJSON_SUFFIX if snapshot_format == "ndjson" else ".json"
+
+    # The run id names the log, the snapshot, the journal and the run report.
+    if resume:
+        scraper_date_uuid = resume
+        if not run_journals(resume, journal_dir):
+            print(f"No journal for run {resume} in {journal_dir}; scraping everything again.")
+    else:
+        scraper_date_uuid = new_run_id()
+    start_datetime, uuid = scraper_date_uuid.rsplit("_", 1)
+    metrics.run_id = scraper_date_uuid
+    resume_hint = f"Resume this run with: python3 update/update_db.py --resume {scraper_date_uuid}"
+    print(f"Run {scraper_date_uuid}")
+    # Landing point and cable GeoJSON, filled in by the scraper (see geo.py).
+    geo = {}
+    # Scraper arguments shared by both paths below.
+    scrape_kwargs = dict(
+        sites=sites,
+        site_options=site_options,
+        incremental=incremental_scrape,
+        report=scrape_report,
+        metrics=metrics,
+        run_id=scraper_date_uuid,
+        journal_dir=journal_dir,
+        geo=geo
+        )
+    logger = init_logger(date=start_datetime, scraper_name="scm_scraper", uuid=uuid)
+    # Canonical owner and supplier names, as resolved by earlier runs.
+    resolver = load_resolver(entity_index)
+
+    if streaming:
+        new_scm_data_path = (new_data_dir / ("scm_data_" + scraper_date_uuid + data_suffix)).absolute()
 
-    # Write scraped SCM cable data to json file
-    with open(new_scm_data_path.resolve(), "wt", encoding="utf-8") as f:
+        # Scraping, parsing, the database load and the snapshot write all
+        # overlap here, so they share one span.
         try:
-            dump(scm_data, f, ensure_ascii=False, sort_keys=True, indent=4)
+            with metrics.span("stream_update"):
+                stats = stream_update(
+                    db_path=new_db_path,
+                    snapshot_path=new_scm_data_path,
+                    logger=logger,
+                    manifest=ManifestWriter(scraper_date_uuid, store_dir),
+                    as_of=start_datetime,
+                    resolver=resolver,
+                    **scrape_kwargs
+                    )
+        except Exception as e:
+            print(e)
+            logger.error(e, exc_info=True)
+            print(resume_hint)
+            write_run_metrics(metrics, metrics_dir, 4, scrape_report)
+            exit(4)
+        finally:
+            close_logger(logger)
+        for table, rows in stats["rows"].items():
+            metrics.count("rows_written_total", rows, table=table)
+        print(f"Old data: {current_data_symlink.resolve()}")
+        print(f"New data: {new_scm_data_path.resolve()}")
+        print(f"Streamed {stats['cables']} cables into {new_db_path} in {stats['elapsed']:.3f} seconds.")
+        print(f"Log: {scraper_date_uuid}\n")
+    else:
+        try:
+            with metrics.span("scrape"):
+                scm_data = scrape_sites(logger=logger, **scrape_kwargs)
+            # Lost cables would be recorded as removed; stop before storing
+            # anything, so the run can be resumed to fetch them.
+            check_complete(scrape_report)
+        except Exception as e:
+            print(e)
+            logger.error(e, exc_info=True)
+            print(resume_hint)
+            write_run_metrics(metrics, metrics_dir, 4, scrape_report)
+            exit(4)
+        finally:
+            close_logger(logger)
+        scm_file_name = "scm_data_" + scraper_date_uuid + data_suffix
+        new_scm_data_path = (new_data_dir / scm_file_name).absolute()
+
+        # Write scraped SCM cable data to the snapshot file
+        try:
+            with metrics.span("snapshot_write"):
+                if snapshot_format == "ndjson":
+                    write_snapshot(scm_data, new_scm_data_path)
+                else:
+                    with open(new_scm_data_path.resolve(), "wt", encoding="utf-8") as f:
+                        dump(scm_data, f, ensure_ascii=False, sort_keys=True, indent=4)
             print(f"Old data: {current_data_symlink.resolve()}")
             print(f"New data: {new_scm_data_path.resolve()}")
             print(f"Log: {scraper_date_uuid}\n")
@@ -149,9 +326,19 @@ def update_db(
             print(e)
             print("Could not write scm cable data.")
             print(f"Log: {scraper_date_uuid}\n")
-            print(f"Cables:\n\n {dumps(scm_data.keys(),ensure_ascii=False, sort_keys=True)}")
+            print(f"Cables:\n\n {dumps(list(scm_data.keys()),ensure_ascii=False, sort_keys=True)}")
+            write_run_metrics(metrics, metrics_dir, 3, scrape_report)
             exit(3)
 
+        # Add the new snapshot to the history store.
+        with metrics.span("snapshot_store"):
+            store_snapshot(scm_data, scraper_date_uuid, store_dir,
+                           creation_time=scrape_report.get("creation_time"))
+
+    if scrape_report.get("duplicates"):
+        print(f"{scrape_report['duplicates']} cables were found on more than one site; "
+              + "kept the copy from the first site listed.")
+
     #############################
     #### UPDATE CURR SYMLINK ####
     #############################
@@ -162,74 +349,104 @@ def update_db(
     # save 
     old_curr_data_path = current_data_symlink.resolve().absolute()
 
-    # Overwrite current_data symlink to new data file
-    current_data_symlink.unlink(missing_ok=True)
-    current_data_symlink.symlink_to(new_scm_data_path.absolute())
-
-    # Copy the now old data file to old_data_dir (moving the file)
-    try:
+    if old_curr_data_path == new_scm_data_path.resolve():
+        # A resumed run that got this far before it stopped: the symlinks
+        # already point at this run's snapshot and the one before it.
+        print(f"Previous data still at: {previous_data_symlink.absolute().resolve()}")
+    else:
+        # Copy the now old data file (and its index, for compact snapshots)
+        # to old_data_dir (moving the file). Done first, so if it fails the
+        # symlinks are untouched and the old file isn't deleted.
         copy2(old_curr_data_path, old_data_dir)
-    except Exception as e:
-        pass
-
-    # Now,
-    # current_data_symlink = (new_data_dir / "current_data").absolute()
-    # current_data_symlink.symlink_to(new_scm_data_path.absolute())
-    # so, 
-    # current_data_symlink.resolve() = new_scm_data_path.absolute()
-
-    #############################
-    #### UPDATE PREV SYMLINK ####
-    #############################
-    # As of right now,
-    # previous_data_symlink = (prev_symlink_dir / "previous_data").absolute()
-    # previous_data_symlink.symlink_to(data_placeholder.absolute())
-    previous_data_file_name = old_curr_data_path.name
-
-    # Delete the "old" data file from the new_data_dir directory
-    old_curr_data_path.unlink(missing_ok=True)
-
-    # Unlink previous_data_symlink from the 
-    # previous previous_data_symlink.resolve() in old_data_dir
-    # (Deletes the symlink because unlinking symlinks deletes them)
-    previous_data_symlink.unlink(missing_ok=True)
-
-    # Link symlink to the moved file in old_data_dir
-    previous_data_symlink.symlink_to((old_data_dir / previous_data_file_name).absolute())
-
-    print(f"Previous data now at: {previous_data_symlink.absolute().resolve()}")
-
-    # Now, 
-    # previous_data_symlink = (prev_symlink_dir / "previous_data").absolute() # same as before
-    # previous_data_symlink.symlink_to((old_data_dir / previous_data_file_name).absolute()) # new
+        if index_path(old_curr_data_path).exists():
+            copy2(index_path(old_curr_data_path), old_data_dir)
+
+        # Overwrite current_data symlink to new data file
+        current_data_symlink.unlink(missing_ok=True)
+        current_data_symlink.symlink_to(new_scm_data_path.absolute())
+
+        # Now,
+        # current_data_symlink = (new_data_dir / "current_data").absolute()
+        # current_data_symlink.symlink_to(new_scm_data_path.absolute())
+        # so, 
+        # current_data_symlink.resolve() = new_scm_data_path.absolute()
+
+        #############################
+        #### UPDATE PREV SYMLINK ####
+        #############################
+        # As of right now,
+        # previous_data_symlink = (prev_symlink_dir / "previous_data").absolute()
+        # previous_data_symlink.symlink_to(data_placeholder.absolute())
+        previous_data_file_name = old_curr_data_path.name
+        # The snapshot previous_data pointed to until now; it's superseded below.
+        superseded_data_path = previous_data_symlink.resolve().absolute()
+
+        # Delete the "old" data file from the new_data_dir directory
+        old_curr_data_path.unlink(missing_ok=True)
+        index_path(old_curr_data_path).unlink(missing_ok=True)
+
+        # Unlink previous_data_symlink from the 
+        # previous previous_data_symlink.resolve() in old_data_dir
+        # (Deletes the symlink because unlinking symlinks deletes them)
+        previous_data_symlink.unlink(missing_ok=True)
+
+        # Link symlink to the moved file in old_data_dir
+        previous_data_symlink.symlink_to((old_data_dir / previous_data_file_name).absolute())
+
+        print(f"Previous data now at: {previous_data_symlink.absolute().resolve()}")
+
+        # Only the previous snapshot is kept as a file (for the diff below);
+        # older ones live in the snapshot store.
+        if superseded_data_path != previous_data_symlink.resolve().absolute():
+            prune_old_data(superseded_data_path, old_data_dir, store_dir)
+
+        # Now, 
+        # previous_data_symlink = (prev_symlink_dir / "previous_data").absolute() # same as before
+        # previous_data_symlink.symlink_to((old_data_dir / previous_data_file_name).absolute()) # new
 
     #########################
     #### UPDATE DATABASE ####
     #########################
-    # Get the previous_data_symlink.absolute().resolve()'s date_uuid
-    prev_date_uuid = "_".join(
-        previous_data_symlink.absolute().resolve().stem.split("_")[-2:]
-        )
-
-    # Copy the old database to old_db_dir/scn_prev_date_uuid.db
-    new_db_dir = (new_db_dir / "scn.db").absolute()
-    old_db_path = (old_db_dir / f"scn_{prev_date_uuid}.db").absolute()
-    copy2(
-        new_db_dir,
-        old_db_path
-        )
-    print(f"Old database: {old_db_path}")
-
-    # Write cleaned, updated data to new_db_dir/scn.db database
-    write_db(
-        cleaned_data = parse_data(scm_data),
-        data_file=current_data_symlink,
-        db_dir=new_db_dir
-        )
+    if not streaming:
+        # The database for any earlier run can be rebuilt from the snapshot
+        # store with snapshot_store.reconstruct_db(), so no copy is kept.
+        # Write cleaned, updated data to new_db_dir/scn.db database.
+        # The scraped data is parsed in memory; the snapshot file isn't re-read.
+        with metrics.span("parse"):
+            # Cables and entities the current database has keep their ids.
+            cleaned_data = parse_data(scm_data, resolver, previous_ids(new_db_path))
+        with metrics.span("db_load", mode=db_mode):
+            counts = write_db(
+                cleaned_data = cleaned_data,
+                db_dir=new_db_dir,
+                db_name=db_name,
+                mode=db_mode,
+                as_of=start_datetime,
+                geo=geo,
+                creation_time=scrape_report.get("creation_time")
+                )
+        if db_mode == "incremental":
+            for change, cables in counts.items():
+                metrics.gauge("db_cables", cables, change=change)
+        else:
+            for table, rows in row_counts(cleaned_data).items():
+                metrics.count("rows_written_total", rows, table=table)
+    save_resolver(resolver, entity_index)
     if initial_run:
-        print(f"New database: {new_db_dir}")
+        print(f"New database: {new_db_path}")
     else:
-        print(f"Updated {new_db_dir}")
+        print(f"Updated {new_db_path}")
+
+    if columnar_export:
+        with metrics.span("columnar_export"):
+            export_dir = publish_export(new_db_path, scraper_date_uuid, columnar_dir,
+                                        creation_time=scrape_report.get("creation_time"))
+        print(f"Columnar export: {export_dir}")
+
+    # Old generations of the database whose readers are done with them.
+    removed = collect_garbage(new_db_path, keep_generations)
+    if removed:
+        print(f"Removed old database generations: {', '.join(path.name for path in removed)}")
 
     #######################
     #### GENERATE DIFF ####
@@ -237,18 +454,69 @@ def update_db(
     # Generate a difference between the newly scraped data and the previous data
     # Difference file stored in default output_dir="update/data/diffs/"
     # Difference file name ends in scraper_date_uuid
-    diff_name = "diffs_after_" +  "_".join(current_data_symlink.resolve().name.split("_")[-2:])
-    generate_diff(
-        diff_name=diff_name,
-        prev_path=previous_data_symlink,
-        curr_path=current_data_symlink,
-    )
+    diff_name = "diffs_after_" + snapshot_run_id(current_data_symlink.resolve()) + ".json"
+    with metrics.span("diff"):
+        generate_diff(
+            diff_name=diff_name,
+            prev_path=previous_data_symlink,
+            curr_path=current_data_symlink,
+        )
+
+    #######################
+    #### WRITE METRICS ####
+    #######################
+    report_path = write_run_metrics(metrics, metrics_dir, 0, scrape_report)
+    print("Phases: " + ", ".join(f"{phase} {seconds:.3f}s"
+                                 for phase, seconds in metrics.phase_seconds().items()))
+    print(f"Run report: {report_path}")
+
+    # Everything the journal held is stored now.
+    remove_journal(scraper_date_uuid, journal_dir)
+    update_lock.close()
 
     return
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Update the cable database.")
+    parser.add_argument("-d", dest="db_name", metavar="DB_NAME", default="scn.db",
+                        help="database in update/db/ to update (default: scn.db)")
+    site_args = parser.add_mutually_exclusive_group()
+    site_args.add_argument("-w", dest="sites", nargs="+", metavar="SITE",
+                           help="scrape only these sites")
+    site_args.add_argument("--plus", nargs="+", metavar="SITE",
+                           help="scrape these sites as well as those in update/cable-sites.txt")
+    parser.add_argument("--columnar", action="store_true",
+                        help="also export the database as NumPy columns to update/data/columnar/")
+    parser.add_argument("--incremental-scrape", action="store_true",
+                        help="revalidate cables cached by the last run with conditional requests "
+                             + "instead of downloading them all again")
+    parser.add_argument("--stream", action="store_true",
+                        help="write cables into the database as they arrive instead of after the scrape")
+    parser.add_argument("--db-mode", choices=["rebuild", "incremental"], default="rebuild",
+                        help="rebuild the database, or update a copy of it in place, rewriting "
+                             + "only the cables that changed (default: rebuild)")
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json",
+                        help="snapshot format to write (default: json)")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="finish an interrupted run, fetching only the cables its journal is missing")
+    args = parser.parse_args()
+    try:
+        sites = select_sites(args.sites, args.plus)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
     start_update = time.perf_counter()
-    update_db()
+    update_db(
+        incremental_scrape=args.incremental_scrape,
+        streaming=args.stream,
+        db_mode=args.db_mode,
+        snapshot_format=args.format,
+        resume=args.resume,
+        db_name=args.db_name,
+        sites=sites,
+        columnar_export=args.columnar
+        )
     update_done = format((time.perf_counter() - start_update), ".3f")
     print(update_done)
@@ -2,59 +2,55 @@
 """
 import sqlite3
 from pathlib import Path
-from json import load
+from uuid import uuid4
 from clean_data import parse_data
+from generations import publish_generation
+from geo import GEO_INDEX_SQL, carry_geo, create_geo_tables, write_geo
+from history import HISTORY_INDEX_SQL, carry_history, create_history_tables, record_history
+from search import create_search_tables, ensure_indexed, index_cables
+from snapshot_format import load_snapshot
 
 
-def write_db(
-    cleaned_data=None,
-    data_file="./update/data/current_data",
-    db_dir="./update/db/",
-    db_name ="scn.db"
-    ):
-    """
-    Invariant: If given data directly (and not given a file), 
-    the data must already be cleaned and properly formatted.
+# Insert statements for the rows CableParser.parse_cable() returns, by table.
+INSERT_SQL = {
+    "cable": """INSERT INTO cable (
+                id, name, code, url, length, rfs_year, rfs_text, planned, notes)
+                VALUES (?,?,?,?,?,?,?,?,?)""",
+    "country": """INSERT INTO country (id, name) VALUES (?,?)""",
+    "point": """INSERT INTO point (id, code, name, country_id) VALUES (?,?,?,?)""",
+    "owner": """INSERT INTO owner (id, name) VALUES (?,?)""",
+    "supplier": """INSERT INTO supplier (id, name) VALUES (?,?)""",
+    "owner_alias": """INSERT OR REPLACE INTO owner_alias (alias, name) VALUES (?,?)""",
+    "supplier_alias": """INSERT OR REPLACE INTO supplier_alias (alias, name) VALUES (?,?)""",
+    "cable_point": """INSERT INTO cable_point (point_id, cable_id) VALUES (?,?)""",
+    "cable_owner": """INSERT INTO cable_owner (owner_id, cable_id) VALUES (?,?)""",
+    "cable_supplier": """INSERT INTO cable_supplier (supplier_id, cable_id) VALUES (?,?)""",
+    "cable_hash": """INSERT INTO cable_hash (cable_id, hash) VALUES (?,?)""",
+}
 
-    THIS FUNCTION ASSUMES IT'S OKAY TO DELETE THE DATABASE AT THE PATH 
-    (db_dir/db_name).absolute().resolve()
-    """
-    data_file = Path(data_file).absolute()
-    db_dir = Path(db_dir).absolute()
-
-    # Load the data
-    if (not cleaned_data) and data_file.resolve().exists():
-        with open(data_file.resolve(), "r") as f:
-            data = load(f)
-        cleaned_data = parse_data(data)
-    else:
-        # TODO: Return something to indicate a problem!
-        return
-
-    # Build path for database file
-    db_path = (db_dir / db_name).absolute()
 
-    # Delete existing database if it exists
-    # THIS FUNCTION ASSUMES IT'S OKAY TO DELETE THE PROVIDED DATABSE 
-    # (db_dir/db_name).absolute().resolve()!
-    if db_path.resolve().exists():
-        db_path.resolve().unlink(missing_ok=True)
+def open_db(db_path, check_same_thread=True):
+    """Connect to the database at db_path, creating its directory if needed.
+    """
+    db_path = Path(db_path).absolute()
+    db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # Create database directory
-    db_path.mkdir(parents=True, exist_ok=True)
+    # Handling storage of boolean types from https://stackoverflow.com/a/16936992.
+    sqlite3.register_adapter(bool, int)
+    # Converters are given bytes, so compare against b'0'.
+    sqlite3.register_converter("BOOLEAN", lambda v: v != b'0')
 
     # Connect to database (sqlite3 creates the database file if not exists)
-    db = sqlite3.connect(
-        db_path.resolve(),
-        detect_types=sqlite3.PARSE_DECLTYPES
+    return sqlite3.connect(
+        db_path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=check_same_thread
         )
 
-    # Handling storage of boolean types from https://stackoverflow.com/a/16936992.
-    sqlite3.register_adapter(bool, int)
-    sqlite3.register_converter("BOOLEAN", lambda v: v != '0')
-    cur = db.cursor()
 
-    ## Create the tables (if they don't exist)
+def create_tables(cur):
+    """Create the cable database tables (if they don't exist).
+    """
     # Primary tables
     cur.execute("""CREATE TABLE IF NOT EXISTS cable(
                 id INTEGER NOT NULL PRIMARY KEY,
@@ -86,7 +82,16 @@ def write_db(
                 id INTEGER NOT NULL PRIMARY KEY,
                 name TEXT NOT NULL
                 )""")
-    db.commit()
+
+    # Other names of the owners and suppliers, by canonical name (see entities.py).
+    cur.execute("""CREATE TABLE IF NOT EXISTS owner_alias(
+                alias TEXT NOT NULL PRIMARY KEY,
+                name TEXT NOT NULL
+                )""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS supplier_alias(
+                alias TEXT NOT NULL PRIMARY KEY,
+                name TEXT NOT NULL
+                )""")
 
     # Intersection tables
     cur.execute("""CREATE TABLE IF NOT EXISTS cable_point(
@@ -110,46 +115,445 @@ def write_db(
                 FOREIGN KEY(cable_id) REFERENCES cable(id),
                 FOREIGN KEY(supplier_id) REFERENCES supplier(id)
                 )""")
+
+    # Hash of each cable's scraped data, used by incremental writes
+    # to find the cables that changed since the last write.
+    cur.execute("""CREATE TABLE IF NOT EXISTS cable_hash(
+                cable_id INTEGER NOT NULL PRIMARY KEY,
+                hash TEXT NOT NULL,
+                FOREIGN KEY(cable_id) REFERENCES cable(id)
+                )""")
+
+    # Facts about the data as a whole, like its upstream creation_time.
+    cur.execute("""CREATE TABLE IF NOT EXISTS db_meta(
+                key TEXT NOT NULL PRIMARY KEY,
+                value TEXT
+                )""")
+
+    # Versioned history of the tables above (see history.py).
+    create_history_tables(cur)
+
+    # Landing point and cable geometry, with their R*Trees (see geo.py).
+    create_geo_tables(cur)
+
+    # Full-text search index over the cables (see search.py).
+    create_search_tables(cur)
+
+
+# Indexes for the join columns of the intersection tables and the
+# natural-key lookups. Created after bulk loads, since building an index
+# once over sorted data is much cheaper than maintaining it row by row.
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS cable_code_idx ON cable(code)",
+    "CREATE INDEX IF NOT EXISTS point_code_idx ON point(code)",
+    "CREATE INDEX IF NOT EXISTS point_country_idx ON point(country_id)",
+    "CREATE INDEX IF NOT EXISTS cable_point_cable_idx ON cable_point(cable_id, point_id)",
+    "CREATE INDEX IF NOT EXISTS cable_point_point_idx ON cable_point(point_id, cable_id)",
+    "CREATE INDEX IF NOT EXISTS cable_owner_cable_idx ON cable_owner(cable_id, owner_id)",
+    "CREATE INDEX IF NOT EXISTS cable_owner_owner_idx ON cable_owner(owner_id, cable_id)",
+    "CREATE INDEX IF NOT EXISTS cable_supplier_cable_idx ON cable_supplier(cable_id, supplier_id)",
+    "CREATE INDEX IF NOT EXISTS cable_supplier_supplier_idx ON cable_supplier(supplier_id, cable_id)",
+    # Name lookups for the query API (see query.py).
+    "CREATE INDEX IF NOT EXISTS country_name_idx ON country(name)",
+    "CREATE INDEX IF NOT EXISTS owner_name_idx ON owner(name)",
+    "CREATE INDEX IF NOT EXISTS supplier_name_idx ON supplier(name)",
+    "CREATE INDEX IF NOT EXISTS owner_alias_name_idx ON owner_alias(name)",
+    "CREATE INDEX IF NOT EXISTS supplier_alias_name_idx ON supplier_alias(name)",
+] + HISTORY_INDEX_SQL + GEO_INDEX_SQL
+
+
+def create_indexes(cur):
+    """Create the indexes in INDEX_SQL (if they don't exist).
+    """
+    for sql in INDEX_SQL:
+        cur.execute(sql)
+
+
+def set_bulk_load_pragmas(db):
+    """Tune a connection to a scratch database for one big load.
+
+    No rollback journal and no fsyncs: the file is only renamed into place
+    after the load succeeds, so a crash can only lose the scratch file.
+    """
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("PRAGMA locking_mode = EXCLUSIVE")
+    db.execute("PRAGMA temp_store = MEMORY")
+    # Negative cache_size is in KiB.
+    db.execute("PRAGMA cache_size = -65536")
+
+
+def finish_bulk_load(db):
+    """Index and analyze a freshly loaded database and make it safe to publish.
+    """
+    cur = db.cursor()
+    create_indexes(cur)
+    cur.execute("ANALYZE")
     db.commit()
+    # Published databases are in WAL mode (see generations.py); the
+    # exclusive lock is released on close.
+    db.execute("PRAGMA locking_mode = NORMAL")
+    db.execute("PRAGMA journal_mode = WAL")
+
+
+def update_history(db, previous_db_path, as_of=None):
+    """Carry the history of the database a rebuild replaces into db and record db's data.
+
+    The indexes are built first, so the history diff can use them.
+    """
+    carry_history(db, previous_db_path)
+    create_indexes(db.cursor())
+    record_history(db, as_of)
+
+
+def update_geo(db, previous_db_path, geo=None):
+    """Write the scraped geometry in geo to db, or carry over the replaced database's.
+
+    geo is {"landing_points": ..., "cables": ...} as scm_scraper() fetched it;
+    an empty one (the geometry couldn't be fetched) keeps the old geometry.
+    """
+    if geo:
+        write_geo(db, geo)
+    else:
+        carry_geo(db, previous_db_path)
+
+
+def write_meta(db, **values):
+    """Set db_meta's keys to values, skipping None values.
+
+    creation_time is the upstream data version the scraper saw (config.json's
+    creation_time); query.db_info() reads it back.
+    """
+    with db:
+        db.executemany("INSERT OR REPLACE INTO db_meta (key, value) VALUES (?,?)",
+                       [(key, value) for key, value in values.items() if value is not None])
+
+
+def previous_ids(db_path):
+    """The ids of the database at db_path, for CableParser to keep them stable across a rebuild.
+
+    Returns {table: ({natural key: id}, next id)} for the cable and point
+    tables (keyed on code) and the country, owner and supplier tables
+    (keyed on name), with next id one past the table's largest, as
+    upsert_db() allocates them. Returns None if there's no database there.
+    """
+    db_path = Path(db_path).absolute()
+    if not db_path.exists():
+        return None
+    db = sqlite3.connect(f"{db_path.as_uri()}?mode=ro", uri=True)
+    try:
+        ids = {}
+        for table, key in (("cable", "code"), ("point", "code"), ("country", "name"),
+                           ("owner", "name"), ("supplier", "name")):
+            known = dict(db.execute(f"SELECT {key}, id FROM {table}"))
+            ids[table] = (known, max(known.values(), default=-1) + 1)
+        return ids
+    except sqlite3.DatabaseError as e:
+        print(f"Not reusing the ids of {db_path}: {e}")
+        return None
+    finally:
+        db.close()
+
 
-    # Table insertions
+def scratch_path(db_path):
+    """Path for building a database next to db_path before renaming it over db_path.
+    """
+    return db_path.with_name(f".{db_path.name}.{uuid4().hex[:8]}.tmp")
+
+
+def bulk_insert(cur, cleaned_data):
+    """Insert all of cleaned_data, streaming each table through executemany.
+    """
+    cur.executemany(INSERT_SQL["cable"], cleaned_data["cable"])
+    cur.executemany(INSERT_SQL["cable_hash"], cleaned_data.get("cable_hash", []))
+    cur.executemany(INSERT_SQL["country"],
+                    ((c_id, name) for name, c_id in cleaned_data["country"].items()))
+    cur.executemany(INSERT_SQL["point"],
+                    ((p.id, p.code, p.name, p.country_id) for p in cleaned_data["point"].values()))
+    cur.executemany(INSERT_SQL["owner"],
+                    ((o_id, name) for name, o_id in cleaned_data["owner"].items()))
+    cur.executemany(INSERT_SQL["supplier"],
+                    ((s_id, name) for name, s_id in cleaned_data["supplier"].items()))
+    for table in ("owner_alias", "supplier_alias"):
+        cur.executemany(INSERT_SQL[table], cleaned_data.get(table, {}).items())
+    # The links iterate as (entity id, cable id) pairs.
+    for table in ("cable_point", "cable_owner", "cable_supplier"):
+        cur.executemany(INSERT_SQL[table], cleaned_data[table])
+
+
+def row_counts(cleaned_data):
+    """Number of rows bulk_insert() writes to each table."""
+    return {table: len(cleaned_data.get(table, [])) for table in INSERT_SQL}
+
+
+def insert_rows(cur, rows):
+    """Insert a batch of rows shaped like CableParser.parse_cable()'s output.
+
+    Entity rows go in before the intersection rows that reference them.
+    """
+    for table in INSERT_SQL:
+        if rows.get(table):
+            cur.executemany(INSERT_SQL[table], rows[table])
+
+
+def cable_records(cleaned_data):
+    """Group cleaned_data by cable, keyed on the natural codes and names.
+
+    Returns {cable code: (cable_vals, hash, points, owners, suppliers)}, where
+    points is a list of (point code, point name, country name) and owners and
+    suppliers are lists of names. cable_vals[0] is the parser's cable id.
+    """
+    country_names = {c_id: name for name, c_id in cleaned_data["country"].items()}
+    point_values = {p.id: (p.code, p.name, country_names[p.country_id])
+                    for p in cleaned_data["point"].values()}
+    owner_names = {o_id: name for name, o_id in cleaned_data["owner"].items()}
+    supplier_names = {s_id: name for name, s_id in cleaned_data["supplier"].items()}
+    hashes = dict(cleaned_data.get("cable_hash", []))
+    by_cable_id = {}
     for cable_vals in cleaned_data["cable"]:
-        cur.execute("""INSERT INTO cable (
-                    id, name, code, url, length, rfs_year, rfs_text, planned, notes)
-                    VALUES (?,?,?,?,?,?,?,?,?)""", cable_vals)
-    db.commit()
+        by_cable_id[cable_vals[0]] = (cable_vals, hashes.get(cable_vals[0]), [], [], [])
 
-    for country in cleaned_data["country"]:
-        country_id = cleaned_data["country"][country]
-        cur.execute("""INSERT INTO country (id, name) VALUES (?,?)""",
-                    [country_id, country])
-    db.commit()
+    for p_id, cable_id in cleaned_data["cable_point"]:
+        by_cable_id[cable_id][2].append(point_values[p_id])
+    for o_id, cable_id in cleaned_data["cable_owner"]:
+        by_cable_id[cable_id][3].append(owner_names[o_id])
+    for s_id, cable_id in cleaned_data["cable_supplier"]:
+        by_cable_id[cable_id][4].append(supplier_names[s_id])
 
-    for p in cleaned_data["point"]:
-        point = cleaned_data["point"][p]
-        cur.execute("""INSERT INTO point (id, code, name, country_id) 
-                    VALUES (?,?,?,?)""",
-                    [point.id, point.code, point.name, point.country_id])
-        # Intersection table
-        for cable_id in point.cables:
-            cur.execute("""INSERT INTO cable_point (point_id, cable_id)
-                        VALUES (?,?)""", [point.id, cable_id])
-    db.commit()
+    return {record[0][2]: record for record in by_cable_id.values()}
 
-    for o in cleaned_data["owner"]:
-        o_id = cleaned_data["owner"][o][0]
-        cur.execute("""INSERT INTO owner (id, name) VALUES (?,?)""",
-                    [o_id, o])
-        for cable_id in cleaned_data["owner"][o][1]:
-            cur.execute("""INSERT INTO cable_owner (owner_id, cable_id) VALUES (?,?)""",
-                        [o_id, cable_id])
-    db.commit()
 
-    for s in cleaned_data["supplier"]:
-        s_id = cleaned_data["supplier"][s][0]
-        cur.execute("""INSERT INTO supplier (id, name) VALUES (?,?)""",
-                    [s_id, s])
-        for cable_id in cleaned_data["supplier"][s][1]:
-            cur.execute("""INSERT INTO cable_supplier (supplier_id, cable_id) VALUES (?,?)""",
-                        [s_id, cable_id])
-    db.commit()
+def upsert_db(db, cleaned_data):
+    """Apply cleaned_data to an existing database, touching only changed cables.
+
+    Ids are kept stable across runs: cables and points are matched on their
+    code, countries, owners and suppliers on their name, and only new
+    entities get new ids (one past the current maximum). A cable is rewritten
+    only if its hash differs from the one stored in cable_hash. Entities no
+    cable refers to any more are removed, and the alias tables are replaced
+    with cleaned_data's. The rewritten and removed cables are reindexed for
+    search, and so are unchanged cables landing at a point whose name or
+    country changed. Everything happens in a single transaction.
+
+    Returns counts of inserted, updated, deleted and unchanged cables.
+    """
+    cur = db.cursor()
+    counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+
+    def id_map(sql):
+        return {key: row_id for key, row_id in cur.execute(sql)}
+
+    def next_id(table):
+        return cur.execute(f"SELECT COALESCE(MAX(id), -1) + 1 FROM {table}").fetchone()[0]
+
+    with db:
+        # Existing ids, keyed on the natural codes and names.
+        cable_ids = id_map("SELECT code, id FROM cable")
+        stored_hashes = id_map("SELECT cable_id, hash FROM cable_hash")
+        countries = id_map("SELECT name, id FROM country")
+        owners = id_map("SELECT name, id FROM owner")
+        suppliers = id_map("SELECT name, id FROM supplier")
+        points = {code: (p_id, name, country_id) for code, p_id, name, country_id
+                  in cur.execute("SELECT code, id, name, country_id FROM point")}
+        next_ids = {table: next_id(table)
+                    for table in ("cable", "country", "point", "owner", "supplier")}
+
+        def entity_id(table, ids, name):
+            if name not in ids:
+                ids[name] = next_ids[table]
+                next_ids[table] += 1
+                cur.execute(INSERT_SQL[table], [ids[name], name])
+            return ids[name]
+
+        def point_id(code, name, country):
+            country_id = entity_id("country", countries, country)
+            if code not in points:
+                points[code] = (next_ids["point"], name, country_id)
+                next_ids["point"] += 1
+                cur.execute(INSERT_SQL["point"], [points[code][0], code, name, country_id])
+            elif points[code][1:] != (name, country_id):
+                points[code] = (points[code][0], name, country_id)
+                changed_points.append(points[code][0])
+                cur.execute("UPDATE point SET name = ?, country_id = ? WHERE id = ?",
+                            [name, country_id, points[code][0]])
+            return points[code][0]
+
+        records = cable_records(cleaned_data)
+        touched = []
+        changed_points = []
+        for code, (cable_vals, new_hash, c_points, c_owners, c_suppliers) in records.items():
+            c_id = cable_ids.get(code)
+            if c_id is not None and new_hash is not None and stored_hashes.get(c_id) == new_hash:
+                counts["unchanged"] += 1
+                continue
+
+            if c_id is None:
+                c_id = cable_ids[code] = next_ids["cable"]
+                next_ids["cable"] += 1
+                cur.execute(INSERT_SQL["cable"], [c_id] + list(cable_vals[1:]))
+                counts["inserted"] += 1
+            else:
+                cur.execute("""UPDATE cable SET name = ?, code = ?, url = ?, length = ?,
+                            rfs_year = ?, rfs_text = ?, planned = ?, notes = ?
+                            WHERE id = ?""", list(cable_vals[1:]) + [c_id])
+                for table in ("cable_point", "cable_owner", "cable_supplier", "cable_hash"):
+                    cur.execute(f"DELETE FROM {table} WHERE cable_id = ?", [c_id])
+                counts["updated"] += 1
+
+            touched.append(c_id)
+            cur.executemany(INSERT_SQL["cable_point"],
+                            [[point_id(*p), c_id] for p in c_points])
+            cur.executemany(INSERT_SQL["cable_owner"],
+                            [[entity_id("owner", owners, o), c_id] for o in c_owners])
+            cur.executemany(INSERT_SQL["cable_supplier"],
+                            [[entity_id("supplier", suppliers, s), c_id] for s in c_suppliers])
+            if new_hash is not None:
+                cur.execute(INSERT_SQL["cable_hash"], [c_id, new_hash])
+
+        # Cables that are gone from the new data.
+        removed = [[c_id] for code, c_id in cable_ids.items() if code not in records]
+        for table in ("cable_point", "cable_owner", "cable_supplier", "cable_hash"):
+            cur.executemany(f"DELETE FROM {table} WHERE cable_id = ?", removed)
+        cur.executemany("DELETE FROM cable WHERE id = ?", removed)
+        counts["deleted"] = len(removed)
+        # Other cables landing at a changed point show its old name in the index.
+        linked = {c_id for p_id in changed_points for c_id, in cur.execute(
+            "SELECT cable_id FROM cable_point WHERE point_id = ?", [p_id])}
+        index_cables(cur, set(touched) | linked | {c_id for c_id, in removed})
+
+        # The alias tables are small enough to rewrite whole.
+        for table in ("owner_alias", "supplier_alias"):
+            cur.execute(f"DELETE FROM {table}")
+            cur.executemany(INSERT_SQL[table], cleaned_data.get(table, {}).items())
+
+        # Entities no remaining cable refers to.
+        if counts["updated"] or counts["deleted"]:
+            cur.execute("DELETE FROM point WHERE id NOT IN (SELECT point_id FROM cable_point)")
+            cur.execute("DELETE FROM owner WHERE id NOT IN (SELECT owner_id FROM cable_owner)")
+            cur.execute("DELETE FROM supplier WHERE id NOT IN (SELECT supplier_id FROM cable_supplier)")
+            cur.execute("DELETE FROM country WHERE id NOT IN (SELECT country_id FROM point)")
+
+    return counts
+
+
+def build_db(db_path, cleaned_data, as_of=None, geo=None, creation_time=None):
+    """Bulk load cleaned_data into a new database and publish it as db_path's next generation.
+
+    The history tables of the database being replaced are carried over,
+    and cleaned_data is recorded in them as valid from as_of (an ISO
+    timestamp, default now). So is its geometry, unless geo has new
+    geometry (see update_geo()). Every cable is indexed for search, and
+    creation_time is stored in db_meta.
+    """
+    db_path = Path(db_path).absolute()
+
+    # Build the new database in a scratch file with loading-friendly
+    # settings, then publish it as db_path's next generation (see
+    # generations.py). Readers see either the old database or the new one,
+    # never a partial one.
+    tmp_path = scratch_path(db_path)
+    db = open_db(tmp_path)
+    try:
+        set_bulk_load_pragmas(db)
+        cur = db.cursor()
+
+        ## Create the tables, load everything in one transaction, then index.
+        create_tables(cur)
+        bulk_insert(cur, cleaned_data)
+        db.commit()
+        update_history(db, db_path, as_of)
+        update_geo(db, db_path, geo)
+        with db:
+            index_cables(db.cursor())
+        write_meta(db, creation_time=creation_time)
+        finish_bulk_load(db)
+        db.close()
+    except BaseException:
+        db.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    publish_generation(db_path, tmp_path)
+
+
+def write_db(
+    cleaned_data=None,
+    data_file="./update/data/current_data",
+    db_dir="./update/db/",
+    db_name ="scn.db",
+    mode="rebuild",
+    as_of=None,
+    geo=None,
+    creation_time=None
+    ):
+    """
+    Invariant: If given data directly (and not given a file), 
+    the data must already be cleaned and properly formatted
+    (i.e. parse_data()'s output); data_file is then not read.
+
+    mode is "rebuild" or "incremental".
+
+    In "rebuild" mode, THIS FUNCTION ASSUMES IT'S OKAY TO REPLACE THE DATABASE
+    AT THE PATH (db_dir/db_name).absolute(). The new database is bulk loaded
+    into a scratch file next to it and published as the next generation.
+    Rebuilds keep the replaced database's ids if cleaned_data was parsed
+    with its previous_ids() (data_file is).
+
+    In "incremental" mode a copy of the current database is updated by
+    upsert_db(), which keeps ids stable and only rewrites changed cables,
+    and published as the next generation. Returns upsert_db()'s counts.
+
+    Either way the database being replaced isn't modified, so its readers
+    are undisturbed (see generations.py).
+
+    Either way, what changed is recorded in the history tables as of as_of
+    (an ISO timestamp, default now); see history.py.
+
+    geo is the scraped landing point and cable geometry, if any; without
+    it the database keeps the geometry it has. creation_time, the
+    upstream data version, is stored in db_meta (see write_meta()).
+    """
+    data_file = Path(data_file).absolute()
+    db_dir = Path(db_dir).absolute()
+
+    # Build path for database file
+    db_path = (db_dir / db_name).absolute()
+
+    # Load the data, unless it was handed over already parsed.
+    if cleaned_data is None:
+        if not data_file.resolve().exists():
+            print(f"No data to write: {data_file} does not exist.")
+            return
+        cleaned_data = parse_data(load_snapshot(data_file), ids=previous_ids(db_path))
+
+    if mode == "incremental":
+        tmp_path = scratch_path(db_path)
+        db = open_db(tmp_path)
+        try:
+            if db_path.exists():
+                current = open_db(db_path)
+                current.backup(db)
+                current.close()
+            create_tables(db.cursor())
+            create_indexes(db.cursor())
+            with db:
+                ensure_indexed(db.cursor())
+            counts = upsert_db(db, cleaned_data)
+            record_history(db, as_of)
+            if geo:
+                write_geo(db, geo)
+            write_meta(db, creation_time=creation_time)
+            db.execute("PRAGMA journal_mode = WAL")
+            db.close()
+        except BaseException:
+            db.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        publish_generation(db_path, tmp_path)
+        return counts
+    elif mode != "rebuild":
+        raise ValueError(f"Unknown write_db mode: {mode}")
+
+    # THIS FUNCTION ASSUMES IT'S OKAY TO REPLACE THE PROVIDED DATABSE 
+    # (db_dir/db_name).absolute()!
+    build_db(db_path, cleaned_data, as_of, geo, creation_time)